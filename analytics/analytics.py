@@ -1,112 +1,148 @@
-from db.storage_saver import load_habits
+from db.storage_saver import habit_summaries, habit_summary, habit_names_by_periodicity
 from datetime import datetime, date, timedelta
+import instrumentation
+from models.periodicity import streaks_of_days
+from models.streak_memo import streak_memo
 
 """
 This file contains the code to analyze the habits. Gives all of the habits, then returns them by periodicity, then
 if called returns the longest streak for a habit, considering past history and answer the question which habit has 
-most streaks. It takes arguments from the "main.py" manu(), specifically the "Analytics menu" section and it uses
-the function load.habits() in db.storage_saver.py to load the habits, so that later they can be analyzed. 
+most streaks. It takes arguments from the "main.py" manu(), specifically the "Analytics menu" section. The answers come
+from the summary index of the storage ("db/summary_index.py"), which is kept up to date on every check-off and delete,
+so the log ins are not read again for every question.
 """
 
-def all_habits():
+
+def all_habits(user_id=None):
     """
-    Loads the habits from the "habits.json" file using the load.habits() function in "storage_saver.py".
+    Lists the habits of the catalog, from the summary index.
+    Args:
+        user_id (str): The user, None for the single-user store.
     Returns:
         list: A list of the habits' names.
     """
 
-    habits = load_habits()
-    if not habits:
+    names = [name for name, _ in habit_summaries(user_id)]
+    if not names:
         print("No habits found.")
         return []
     print("\nCurrently tracked habits:")
-    for h in habits:
-        print(f"- {h['name']}")
-    return [h["name"] for h in habits]
+    for name in names:
+        print(f"- {name}")
+    return names
 
-def habits_by_periodicity(periodicity):
+def habits_by_periodicity(periodicity, user_id=None):
     """
-    Once again, with the help of load.habits(), loads the habits and based on their periodicity returns a list of names
-    only with the habits that correspond to the said periodicity.
+    Based on their periodicity returns a list of names only with the habits that correspond to the said periodicity.
+    The SQLite backend answers this with its index on the periodicity and the JSON store with the summary index
+    (see habit_names_by_periodicity() in "storage_saver.py"), so the habits are not all loaded.
     Args:
-        periodicity (str) : One of "daily", "weekly" or "monthly".
+        periodicity (str) : The periodicity, for example "daily", "weekly" or "monthly" (see "periodicity.py").
+        user_id (str): The user, None for the single-user store.
     Returns:
         list: A list of the habits' names filtered by the given periodicity.
     """
-    habits = load_habits()
-    return [h["name"] for h in habits if h["periodicity"] == periodicity]
+    return habit_names_by_periodicity(periodicity, user_id)
 
-def _calculate_longest_streak(habit):
+@instrumentation.instrumented
+def _calculate_longest_streak(habit, user_id=None):
     """
-    Returns the longest streak for a habit.
+    Returns the longest streak for a habit, from its whole history. The summary index keeps the same value up to date
+    with the same streak engine ("periodicity.py"). The result is remembered until the history of the habit
+    changes (see "streak_memo.py").
     Args:
         habit(dict): A dictionary of the habit.
+        user_id (str): The user the habit belongs to, None for the single-user store.
     Returns:
         int: The longest streak.
     """
     if not habit.get("days_list"):
         return 0
 
-    # Convert all days to date objects.
-    days = [datetime.fromisoformat(d).date() if isinstance(d, str) else d for d in habit["days_list"]]
-    days = sorted(days)
-    # Converting saved days into date objects (strings → datetime.date).
+    def calculate():
+        # Convert all days to day numbers.
+        days = [datetime.fromisoformat(d).date() if isinstance(d, str) else d for d in habit["days_list"]]
+        days = sorted(d.toordinal() for d in days)
+        # Converting saved days into date objects (strings → datetime.date).
 
-    max_streak = 0
-    current_streak = 1
-    periodicity = habit.get("periodicity", "daily")
-    # Track the maximum streak found so far.
-
-    for i in range(1, len(days)):
-        diff = (days[i] - days[i-1]).days
-        if (periodicity == "daily" and diff == 1) or (periodicity == "weekly" and diff <= 7):
-            current_streak += 1
-        else:
-            current_streak = 1
-        if current_streak > max_streak:
-            max_streak = current_streak
-    return max_streak
-
-def longest_streak_all():
+        return longest_streak_of_days(days, habit.get("periodicity", "daily"))
+
+    if "name" not in habit:
+        return calculate()
+    key = (user_id, habit["name"], habit.get("time of creation"))
+    # The user is part of the key, so two users' habits with the same name are remembered apart.
+    return streak_memo.longest_streak(key, habit, calculate)
+
+def longest_streak_of_days(days, periodicity):
     """
-    Compares and analyzes the streaks for all existing habits. Gives the longest current streak from the habits.
+    Returns the longest streak of sorted day numbers (date.toordinal()): the longest run of consecutive periods (days,
+    weeks, months, ...) with a check-off, found by the streak engine of "periodicity.py" in one pass. Like the
+    longest_streak of the Habit class, a single check-off is a streak of 1.
+    Args:
+        days (list): Sorted day numbers.
+        periodicity (str): The periodicity of the habit.
     Returns:
-        tuple: A pair (habit_name, max_streak).
+        int: The longest streak.
     """
+    return streaks_of_days(days, periodicity)[1]
 
-    habits = load_habits()
-    if not habits:
-        print("No habits found. Cannot calculate streaks.")
-        return None, 0
+@instrumentation.instrumented
+def longest_streak_all(user_id=None):
+    """
+    Compares and analyzes the streaks for all existing habits. Gives the longest current streak from the habits. The
+    longest streak of every habit is read from the summary index. Nothing is printed, the menu and the server report
+    the answer themselves.
+    Args:
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        tuple: A pair (habit_name, max_streak), (None, 0) if there are no habits or no streaks.
+    """
 
+    summaries = habit_summaries(user_id)
     max_streak = 0
     habit_name = None
-    for habit in habits:
-        streak = _calculate_longest_streak(habit)
-        if streak > max_streak:
-            max_streak = streak
-            habit_name = habit["name"]
-    if habit_name is None:
-        print("No streaks found for any habit.")
-        return None, 0
+    for name, summary in summaries:
+        if summary["longest_streak"] > max_streak:
+            max_streak = summary["longest_streak"]
+            habit_name = name
     return habit_name, max_streak
 
-def longest_streak_habit(habit_name):
+def longest_streak_habit(habit_name, user_id=None):
     """
     Returns the longest streak for a habit. The function analyzes previous records and returns the longest streak overall
-    for the whole past history of the habit.
+    for the whole past history of the habit. Nothing is printed, like longest_streak_all().
     Args:
         habit_name (str): The name of the habit.
+        user_id (str): The user, None for the single-user store.
     Returns:
-        streak (int): The longest streak.
+        streak (int): The longest streak, 0 if the habit does not exist.
     """
 
-    habits = load_habits()
-    habit = next((h for h in habits if h["name"] == habit_name), None)
-    if not habit:
-        print(f"Habit '{habit_name}' not found.")
+    summary = habit_summary(habit_name, user_id)
+    if not summary:
         return 0
-    streak = _calculate_longest_streak(habit)
-    if streak == 0:
-        print(f"No streaks found for habit '{habit_name}'.")
-    return streak
\ No newline at end of file
+    return summary["longest_streak"]
+
+def longest_streaks_columnar(path, names=None):
+    """
+    Returns the longest streak of habits stored in a columnar file ("db/columnar.py"), computed from their whole
+    history. The days are read straight from the memory-mapped day columns, so no date is parsed and only the habits
+    that are asked for are read. With NumPy the columns are used as arrays by "vectorized.py", otherwise they go
+    through the streak engine one day at a time.
+    Args:
+        path (str): The columnar file.
+        names (list): The habits, by default all of them.
+    Returns:
+        dict: habit name -> longest streak.
+    """
+
+    from analytics import vectorized
+    from db.columnar import ColumnarFile
+    # Imported here, so that NumPy is only loaded for the columnar analytics and not by the menu or the server.
+
+    with ColumnarFile(path) as columns:
+        if vectorized.HAS_NUMPY:
+            return {name: vectorized.longest_streak(columns.days_array(name), columns.periodicity(name))
+                    for name in (columns.names() if names is None else names)}
+        return {name: longest_streak_of_days(columns.days(name), columns.periodicity(name))
+                for name in (columns.names() if names is None else names)}
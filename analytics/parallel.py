@@ -0,0 +1,141 @@
+import argparse
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from analytics.analytics import _calculate_longest_streak, longest_streak_of_days
+import db.storage_saver as storage_saver
+
+"""
+This file contains the parallel analytics runner, for reports over many habits or many users' stores (for example a
+nightly report). The longest streak calculation is CPU-bound, so the work is spread over a pool of processes instead of
+one loop on one core:
+
+- longest_streaks() splits a list of habits into chunks. Each chunk is sent as one compact payload: the days of all its
+  habits packed into a single ASCII byte string (10 bytes per day) and an array of counts, so little has to be pickled
+  and the days are parsed by the workers, not by the main process.
+- longest_streak_report() gives every worker whole users (shards): the worker loads the user's habits itself and only
+  sends back the answer.
+
+The results are put back together in the order of the input, and ties are decided like in longest_streak_all(), so the
+output is the same as the serial path. With workers=1 everything runs in the calling process.
+
+    python -m analytics.parallel --workers 4 alice bob carol
+"""
+
+
+DAY_WIDTH = 10
+# An ISO day ("2025-07-01") is always ten characters.
+
+
+def pack_chunk(habits):
+    """
+    Packs the days of some habits into one payload.
+    Args:
+        habits (list): Habit dictionaries (the layout of "habits.json").
+    Returns:
+        tuple: (periodicities, counts as bytes of an int array, the days as one ASCII byte string).
+    """
+    periodicities = [h.get("periodicity", "daily") for h in habits]
+    counts = array('i', (len(h.get("days_list") or []) for h in habits))
+    days = "".join(str(d)[:DAY_WIDTH] for h in habits for d in (h.get("days_list") or []))
+    return periodicities, counts.tobytes(), days.encode("ascii")
+
+
+def longest_streaks_of_chunk(payload):
+    """
+    Unpacks a payload of pack_chunk() and calculates the longest streak of each of its habits. Runs in a worker.
+    Returns:
+        list: The longest streaks, in the order of the habits.
+    """
+    periodicities, counts_bytes, days = payload
+    counts = array('i')
+    counts.frombytes(counts_bytes)
+    text = days.decode("ascii")
+    results = []
+    position = 0
+    for periodicity, count in zip(periodicities, counts):
+        end = position + count * DAY_WIDTH
+        ordinals = sorted(date.fromisoformat(text[i:i + DAY_WIDTH]).toordinal()
+                          for i in range(position, end, DAY_WIDTH))
+        results.append(longest_streak_of_days(ordinals, periodicity))
+        position = end
+    return results
+
+
+def longest_streaks(habits, workers=None, chunk_size=None):
+    """
+    Calculates the longest streak of every habit, in parallel.
+    Args:
+        habits (list): Habit dictionaries.
+        workers (int): Number of processes, by default the number of cores.
+        chunk_size (int): Habits per payload, by default about four payloads per process.
+    Returns:
+        list: The longest streak of each habit, in the same order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(habits) // (workers * 4)))
+    payloads = [pack_chunk(habits[i:i + chunk_size]) for i in range(0, len(habits), chunk_size)]
+    if workers == 1 or len(payloads) < 2:
+        parts = map(longest_streaks_of_chunk, payloads)
+        return [streak for part in parts for streak in part]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() gives the results in the order of the payloads, whichever worker finished first.
+        return [streak for part in pool.map(longest_streaks_of_chunk, payloads) for streak in part]
+
+
+def best_habit(names, streaks):
+    """
+    Picks the habit with the longest streak, the first one on a tie, like longest_streak_all().
+    Returns:
+        tuple: (habit name, streak), (None, 0) if no habit has a streak.
+    """
+    habit_name, max_streak = None, 0
+    for name, streak in zip(names, streaks):
+        if streak > max_streak:
+            habit_name, max_streak = name, streak
+    return habit_name, max_streak
+
+
+def _user_longest_streak(user_id, users_dir):
+    # Runs in a worker: the worker reads the user's store itself.
+    storage_saver.users_dir = users_dir
+    habits = storage_saver.load_habits(user_id)
+    return best_habit([h["name"] for h in habits], [_calculate_longest_streak(h, user_id) for h in habits])
+
+
+def longest_streak_report(user_ids, workers=None):
+    """
+    Finds the habit with the longest streak of every user, computed from the full histories, one user per task.
+    Args:
+        user_ids (list): The users.
+        workers (int): Number of processes, by default the number of cores.
+    Returns:
+        dict: user id -> (habit name, streak), in the order of user_ids.
+    """
+    user_ids = list(user_ids)
+    for user_id in user_ids:
+        storage_saver.shard_folder(user_id)
+        # Invalid user ids are refused before any work is started.
+    workers = workers or os.cpu_count() or 1
+    users_dirs = [storage_saver.users_dir] * len(user_ids)
+    if workers == 1 or len(user_ids) < 2:
+        return dict(zip(user_ids, map(_user_longest_streak, user_ids, users_dirs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(user_ids, pool.map(_user_longest_streak, user_ids, users_dirs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Longest streak report over many users, in parallel.")
+    parser.add_argument("users", nargs="+", help="the users to report on")
+    parser.add_argument("--workers", type=int, help="number of processes (default: number of cores)")
+    args = parser.parse_args(argv)
+    for user_id, (name, streak) in longest_streak_report(args.users, args.workers).items():
+        print(f"{user_id}: {name} ({streak})" if name else f"{user_id}: no streaks")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
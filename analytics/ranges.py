@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+from db.storage_saver import find_habit, load_habits
+from models.habit import HabitView
+from models.periodicity import get_periodicity
+from analytics.analytics import longest_streak_of_days
+
+"""
+This file contains the analytics over a date window: the completion rate between two dates, the longest streak between
+two dates, the number of check-offs per week or per month, a report of all habits for a window and the habits that were
+missed in the last period. The days of a window are found with binary searches on the sorted stored days
+(HabitView.days_between()), so a question about the last few weeks does not read years of history.
+"""
+
+
+def _as_date(day):
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+
+def _view(habit_name, user_id):
+    habit_data = find_habit(habit_name, user_id)
+    return HabitView(habit_data) if habit_data else None
+
+
+def _rate(days, periodicity, first, last):
+    # Share of the periods (days, weeks, ...) of the window in which the habit was checked off.
+    try:
+        schedule = get_periodicity(periodicity)
+    except ValueError:
+        return 0.0
+    done = len({schedule.period(day) for day in days})
+    total = schedule.period(last) - schedule.period(first) + 1
+    return done / total if total > 0 else 0.0
+
+
+def completion_rate(habit_name, first, last, user_id=None):
+    """
+    Returns the share of the periods (days, or weeks for weekly habits, ...) between two dates in which the habit was
+    checked off.
+    Args:
+        habit_name (str): The name of the habit.
+        first (date): The first day of the window (a date or an ISO string).
+        last (date): The last day of the window.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        float: A number between 0 and 1, or None if the habit does not exist.
+    """
+    view = _view(habit_name, user_id)
+    if view is None:
+        return None
+    first, last = _as_date(first), _as_date(last)
+    return _rate(view.days_between(first, last), view.periodicity, first.toordinal(), last.toordinal())
+
+
+def longest_streak_between(habit_name, first, last, user_id=None):
+    """
+    Returns the longest streak that lies between two dates, with the same rules as longest_streak_habit().
+    Args:
+        habit_name (str): The name of the habit.
+        first (date): The first day of the window.
+        last (date): The last day of the window.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        int: The longest streak, or None if the habit does not exist.
+    """
+    view = _view(habit_name, user_id)
+    if view is None:
+        return None
+    return longest_streak_of_days(view.days_between(_as_date(first), _as_date(last)), view.periodicity)
+
+
+def counts_by_period(habit_name, first, last, period="week", user_id=None):
+    """
+    Counts the check-off days of a habit per calendar week (Monday to Sunday) or per month between two dates.
+    Args:
+        habit_name (str): The name of the habit.
+        first (date): The first day of the window.
+        last (date): The last day of the window.
+        period (str): "week" or "month".
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        dict: label ("2025-W27" or "2025-07") -> number of days, for every week or month of the window, or None if the
+        habit does not exist.
+    """
+    if period not in ("week", "month"):
+        raise ValueError("The period should be 'week' or 'month'.")
+    view = _view(habit_name, user_id)
+    if view is None:
+        return None
+    first, last = _as_date(first), _as_date(last)
+
+    def label(day):
+        if period == "week":
+            year, week, _ = day.isocalendar()
+            return f"{year}-W{week:02d}"
+        return f"{day.year}-{day.month:02d}"
+
+    counts = {}
+    day = first
+    while day <= last:
+        # Every week or month of the window is listed, also the ones without check-offs.
+        counts[label(day)] = 0
+        if period == "week":
+            day += timedelta(days=7 - day.weekday())
+        else:
+            day = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    for ordinal in view.days_between(first, last):
+        counts[label(date.fromordinal(ordinal))] += 1
+    return counts
+
+
+def window_report(first, last, user_id=None):
+    """
+    Summarizes every habit for a date window.
+    Args:
+        first (date): The first day of the window.
+        last (date): The last day of the window.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        list: One dictionary per habit with "name", "periodicity", "check_offs", "completion_rate" and
+        "longest_streak", in the order of the catalog.
+    """
+    first, last = _as_date(first), _as_date(last)
+    report = []
+    for habit_data in load_habits(user_id):
+        view = HabitView(habit_data)
+        days = view.days_between(first, last)
+        report.append({
+            "name": view.habit_name,
+            "periodicity": view.periodicity,
+            "check_offs": len(days),
+            "completion_rate": _rate(days, view.periodicity, first.toordinal(), last.toordinal()),
+            "longest_streak": longest_streak_of_days(days, view.periodicity)
+        })
+    return report
+
+
+def missed_last_period(today=None, user_id=None):
+    """
+    Returns the habits that were not checked off in their last complete period: yesterday for daily habits, last week
+    (Monday to Sunday) for weekly habits, last month for monthly ones and so on (see "periodicity.py"). Habits created
+    after that period, and habits with an unknown periodicity, are left out.
+    Args:
+        today (date): By default the real today.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        list: The names of the missed habits, in the order of the catalog.
+    """
+    today = (_as_date(today) or date.today()).toordinal()
+    missed = []
+    for habit_data in load_habits(user_id):
+        view = HabitView(habit_data)
+        try:
+            schedule = get_periodicity(view.periodicity)
+        except ValueError:
+            continue
+        previous = schedule.period(today) - 1
+        first = date.fromordinal(schedule.first_day(previous))
+        last = date.fromordinal(schedule.first_day(previous + 1) - 1)
+        if habit_data.get("time of creation", "")[:10] > last.isoformat():
+            continue
+        if not view.days_between(first, last):
+            missed.append(view.habit_name)
+    return missed
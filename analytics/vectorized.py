@@ -0,0 +1,75 @@
+from models.periodicity import day_number, get_periodicity
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+# NumPy is optional. Without it longest_streaks_columnar() in "analytics.py" uses the pure-Python streak engine.
+
+"""
+This file contains the vectorized analytics engine. Each habit's days are turned into a sorted integer NumPy array (day
+numbers from date.toordinal()), and the streak questions are answered with diff/cumsum style array operations instead of
+Python loops. The days are turned into period numbers by the same periodicities as everywhere else ("periodicity.py",
+whose integer arithmetic works on whole arrays), and a streak is a run of consecutive period numbers, so the results
+are the same as the pure-Python path. The analytics use it for the memory-mapped day columns of a columnar file (see
+longest_streaks_columnar() in "analytics.py"), which are NumPy arrays without a copy.
+"""
+
+
+HAS_NUMPY = np is not None
+
+
+def days_to_array(days_list):
+    """
+    Turns the days of a habit into a sorted NumPy array of day numbers.
+    Args:
+        days_list (list): ISO strings or date objects.
+    Returns:
+        numpy.ndarray: The sorted day numbers (int32).
+    """
+    days = np.fromiter((day_number(d) for d in days_list), dtype=np.int32, count=len(days_list))
+    days.sort()
+    return days
+
+
+def _periods(days, periodicity):
+    """
+    Returns the active periods of sorted day numbers, sorted and each once. An unknown periodicity has none.
+    """
+    try:
+        schedule = get_periodicity(periodicity)
+    except ValueError:
+        return np.zeros(0, dtype=np.int64)
+    periods = schedule.period(days.astype(np.int64))
+    # The periods of sorted days are sorted too, so the repeated ones are next to each other.
+    return periods[np.concatenate(([True], periods[1:] != periods[:-1]))] if len(periods) else periods
+
+
+def run_lengths(days, periodicity):
+    """
+    Returns the length of every streak (run of consecutive active periods) in the history.
+    Args:
+        days (numpy.ndarray): Sorted day numbers.
+        periodicity (str): The periodicity of the habit.
+    Returns:
+        numpy.ndarray: The run lengths, oldest run first.
+    """
+    periods = _periods(days, periodicity)
+    if len(periods) == 0:
+        return np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(periods) != 1) + 1
+    bounds = np.concatenate(([0], breaks, [len(periods)]))
+    return np.diff(bounds)
+
+
+def longest_streak(days, periodicity):
+    """
+    Returns the longest streak, exactly like _calculate_longest_streak().
+    Args:
+        days (numpy.ndarray): Sorted day numbers.
+        periodicity (str): The periodicity of the habit.
+    Returns:
+        int: The longest streak.
+    """
+    lengths = run_lengths(days, periodicity)
+    return int(lengths.max()) if len(lengths) else 0
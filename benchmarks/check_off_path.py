@@ -0,0 +1,101 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/check_off_path.py" from the project folder.
+
+from models.habit import Habit
+
+"""
+This file contains the micro-benchmark of the check-off path of a Habit object with a long history. For every history
+size and periodicity it builds a habit with that many check-offs (every tenth period skipped, so there are holes) and
+times, per check-off:
+
+- "new day": a check-off after the history followed by streaks(), with sort_days_only() once at the end;
+- "repeat": a second check-off of a day that is already logged;
+- "backfill": the holes of the history checked off in random order (an import from a tracker device), with the
+  streak calculated once at the end.
+
+    python benchmarks/check_off_path.py --history 1000 10000 20000
+"""
+
+
+def make_habit(periodicity, history):
+    """
+    Returns:
+        tuple: (Habit with the history, the first day after it, the days of its holes).
+    """
+    step = 7 if periodicity == "weekly" else 1
+    start = datetime(2000, 1, 3, 8)
+    moments = [start + timedelta(days=step * k) for k in range(history) if k % 10]
+    holes = [start + timedelta(days=step * k) for k in range(history) if not k % 10]
+    habit = Habit.from_dict({"name": "bench", "periodicity": periodicity,
+                             "days_list": [m.date().isoformat() for m in reversed(moments)],
+                             "log_ins": [m.isoformat() for m in moments]})
+    habit.sort_days_only()
+    habit.streaks()
+    return habit, start + timedelta(days=step * history), holes
+
+
+def run_check_offs(periodicity="daily", history=10000, events=500):
+    """
+    Times the three kinds of check-offs on a habit with a long history.
+    Args:
+        periodicity (str): Daily or weekly.
+        history (int): Number of periods in the history.
+        events (int): Number of check-offs timed for each kind (at most the number of holes for "backfill").
+    Returns:
+        dict: kind -> microseconds per check-off.
+    """
+    result = {}
+    step = 7 if periodicity == "weekly" else 1
+    habit, after, holes = make_habit(periodicity, history)
+    start = time.perf_counter()
+    for k in range(events):
+        habit.checked_off(after + timedelta(days=step * k))
+        habit.streaks()
+    habit.sort_days_only()
+    result["new day"] = (time.perf_counter() - start) / events * 1e6
+
+    start = time.perf_counter()
+    for k in range(events):
+        habit.checked_off(after + timedelta(days=step * k, hours=2))
+    result["repeat"] = (time.perf_counter() - start) / events * 1e6
+
+    habit, _, holes = make_habit(periodicity, history)
+    random.Random(0).shuffle(holes)
+    holes = holes[:events]
+    start = time.perf_counter()
+    for moment in holes:
+        habit.checked_off(moment)
+    habit.sort_days_only()
+    habit.streaks()
+    result["backfill"] = (time.perf_counter() - start) / len(holes) * 1e6
+    longest = habit.longest_streak
+    habit.rebuild()
+    if habit.longest_streak != longest:
+        raise AssertionError("The backfilled streak is wrong.")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the check-off path of a habit with a long history.")
+    parser.add_argument("--history", type=int, nargs="+", default=[1000, 10000], help="history sizes, in periods")
+    parser.add_argument("--events", type=int, default=500, help="check-offs timed for each kind")
+    args = parser.parse_args(argv)
+
+    print(f"{'periodicity':<13}{'history':>9}{'new day':>12}{'repeat':>12}{'backfill':>12}   (microseconds per "
+          f"check-off)")
+    for periodicity in ("daily", "weekly"):
+        for history in args.history:
+            r = run_check_offs(periodicity, history, args.events)
+            print(f"{periodicity:<13}{history:>9}{r['new day']:>12.1f}{r['repeat']:>12.1f}{r['backfill']:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
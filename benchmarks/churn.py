@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/churn.py" from the project folder.
+
+import db.storage_saver as storage_saver
+from db import compaction, durability
+from models.habit import Habit
+
+"""
+This file contains the benchmark of habit churn: adding and deleting habits in a user's shard that already has a large
+catalog. It creates the catalog in a temporary folder, then adds new habits one at a time (catalog and store, as the
+menu and the server do) and deletes them again, and reports the time and the bytes written per operation:
+
+    python benchmarks/churn.py --catalog 5000 --churn 200
+"""
+
+
+def run_churn(catalog_size=5000, churn=200, background=False):
+    """
+    Adds and then deletes "churn" habits in a shard that already has "catalog_size" habits.
+    Args:
+        catalog_size (int): Number of habits defined before the churn.
+        churn (int): Number of habits added and deleted.
+        background (bool): True to compact in the background (see "compaction.py").
+    Returns:
+        dict: "add_ms" and "delete_ms" per operation, and "bytes" written per operation.
+    """
+    saved = (storage_saver.users_dir, compaction.background)
+    with tempfile.TemporaryDirectory() as folder:
+        storage_saver.users_dir = folder
+        try:
+            for i in range(catalog_size):
+                storage_saver.add_habit_to_catalog(f"habit {i}", "daily", user_id="bench")
+            storage_saver.load_habits("bench")
+            storage_saver.compact("bench")
+            storage_saver.flush()
+            compaction.set_background(background)
+
+            before = durability.stats["bytes"]
+            names = [f"new habit {i}" for i in range(churn)]
+            start = time.perf_counter()
+            for name in names:
+                storage_saver.add_habit_to_catalog(name, "daily", user_id="bench")
+                storage_saver.append_habit_to_json(Habit(name, "daily"), user_id="bench")
+            added = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                # delete_habit() prints a line for every habit.
+                for name in names:
+                    storage_saver.delete_habit(name, user_id="bench")
+            deleted = time.perf_counter()
+            storage_saver.flush()
+            compaction.wait()
+            written = durability.stats["bytes"] - before
+
+            if len(storage_saver.get_catalog("bench")) != catalog_size:
+                raise AssertionError("The catalog lost or kept a habit.")
+        finally:
+            compaction.set_background(saved[1])
+            storage_saver.users_dir = saved[0]
+    return {"add_ms": (added - start) / churn * 1000, "delete_ms": (deleted - added) / churn * 1000,
+            "bytes": written / (2 * churn)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark adding and deleting habits in a large catalog.")
+    parser.add_argument("--catalog", type=int, default=5000, help="number of habits defined before the churn")
+    parser.add_argument("--churn", type=int, default=200, help="number of habits added and then deleted")
+    args = parser.parse_args(argv)
+
+    print(f"{'compaction':<13}{'add ms':>10}{'delete ms':>11}{'bytes':>12}   (per operation)")
+    for label, background in (("inline", False), ("background", True)):
+        r = run_churn(args.catalog, args.churn, background)
+        print(f"{label:<13}{r['add_ms']:>10.3f}{r['delete_ms']:>11.3f}{r['bytes']:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/hot_paths.py" from the project folder.
+
+import db.storage_saver as storage_saver
+import analytics.analytics as analytics
+from models.habit import Habit, HabitView
+
+"""
+This file contains the benchmark of the hot paths of the program: loading the habits, checking off, calculating the
+streaks, the longest streak analytics and deleting. It builds a synthetic store with a chosen number of habits and
+check-offs per habit in a temporary folder (the real files in db/ are never touched), times every operation several
+times and reports the latency percentiles and the peak memory. The results can be saved to a JSON file and compared
+with an earlier run, so that a slower change shows up:
+
+    python benchmarks/hot_paths.py --habits 50 --history 2000 --output bench.json
+    python benchmarks/hot_paths.py --habits 50 --history 2000 --baseline bench.json
+"""
+
+
+def make_store(folder, habit_count, history):
+    """
+    Writes a synthetic catalog and "habits.json" into the folder and points storage_saver to them.
+    Args:
+        folder (str): The temporary folder.
+        habit_count (int): Number of habits.
+        history (int): Number of check-offs per habit.
+    Returns:
+        list: The names of the habits.
+    """
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    names = [f"habit {i}" for i in range(habit_count)]
+    habits = []
+    for i, name in enumerate(names):
+        periodicity = "weekly" if i % 3 == 2 else "daily"
+        step = 7 if periodicity == "weekly" else 1
+        # Every tenth period is skipped, so the histories have several streaks.
+        moments = [today - timedelta(days=step * k) for k in range(1, history + 1) if k % 10]
+        moments.reverse()
+        habits.append({
+            "name": name,
+            "periodicity": periodicity,
+            "time of creation": moments[0].isoformat() if moments else today.isoformat(),
+            "streak": 0,
+            "days_list": [m.date().isoformat() for m in moments],
+            "log_ins": [m.isoformat() for m in moments]
+        })
+
+    storage_saver.file_name = os.path.join(folder, "habits.json")
+    storage_saver.event_log_file = os.path.join(folder, "habits.events.jsonl")
+    storage_saver.catalog_file = os.path.join(folder, "habit_catalog.json")
+    with open(storage_saver.catalog_file, "w") as f:
+        json.dump([{"name": h["name"], "periodicity": h["periodicity"]} for h in habits], f)
+    storage_saver.save_habits(habits)
+    return names
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of the (sorted) values lies.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(function, arguments):
+    """
+    Calls the function once for each argument and measures every call.
+    Args:
+        function: The operation to time.
+        arguments (list): One argument tuple per call.
+    Returns:
+        dict: Latency percentiles in milliseconds and the peak memory in KiB.
+    """
+    timings = []
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # The storage functions print messages for the user, they are not part of the benchmark output.
+        for args in arguments:
+            start = time.perf_counter()
+            function(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": percentile(timings, 0.50),
+        "p90_ms": percentile(timings, 0.90),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1],
+        "peak_kib": peak / 1024
+    }
+
+
+def run_benchmarks(habit_count=20, history=1000, repeat=20):
+    """
+    Runs every benchmark on a fresh synthetic store.
+    Args:
+        habit_count (int): Number of habits.
+        history (int): Number of check-offs per habit.
+        repeat (int): Number of calls per benchmark.
+    Returns:
+        dict: benchmark name -> measurements.
+    """
+    saved_paths = (storage_saver.file_name, storage_saver.event_log_file, storage_saver.catalog_file)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            names = make_store(folder, habit_count, history)
+            sample = [(names[i % len(names)],) for i in range(repeat)]
+            repository = storage_saver.get_repository()
+
+            def load_cold():
+                repository.cache.invalidate()
+                storage_saver.load_habits()
+
+            results["load_habits (cold)"] = measure(load_cold, [()] * repeat)
+            results["load_habits (cached)"] = measure(storage_saver.load_habits, [()] * repeat)
+            results["user_streaks"] = measure(storage_saver.user_streaks, sample)
+
+            stored = [repository.get(name) for (name,) in sample]
+            habit_objects = [Habit.from_dict(h) for h in stored]
+
+            def full_streaks(habit):
+                habit.rebuild()
+                habit.streaks()
+
+            results["Habit.streaks (rebuild)"] = measure(full_streaks, [(h,) for h in habit_objects])
+            results["Habit.streaks"] = measure(Habit.streaks, [(h,) for h in habit_objects])
+
+            def view_streaks(habit_data):
+                HabitView(habit_data).streaks()
+
+            results["HabitView.streaks"] = measure(view_streaks, [(h,) for h in stored])
+            results["longest_streak_all"] = measure(analytics.longest_streak_all, [()] * repeat)
+
+            # Every habit can only be checked off and deleted once, so these use distinct habits.
+            distinct = [(name,) for name in names[:repeat]]
+            results["user_check_off"] = measure(storage_saver.user_check_off, distinct)
+            results["delete_habit"] = measure(storage_saver.delete_habit, distinct)
+    finally:
+        storage_saver.file_name, storage_saver.event_log_file, storage_saver.catalog_file = saved_paths
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the median latencies with a baseline run.
+    Args:
+        results (dict): The current measurements.
+        baseline (dict): The measurements of the baseline run.
+        threshold (float): A benchmark is a regression if it is this many times slower.
+    Returns:
+        list: (benchmark name, ratio) of the regressions.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or before["p50_ms"] <= 0:
+            continue
+        ratio = current["p50_ms"] / before["p50_ms"]
+        if ratio > threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the storage, streak and analytics hot paths.")
+    parser.add_argument("--habits", type=int, default=20, help="number of habits in the synthetic store")
+    parser.add_argument("--history", type=int, default=1000, help="number of check-offs per habit")
+    parser.add_argument("--repeat", type=int, default=20, help="number of calls per benchmark")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slow-down ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.habits, args.history, min(args.repeat, args.habits))
+
+    print(f"{'benchmark':<26}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak KiB':>12}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['p50_ms']:>10.3f}{r['p90_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['max_ms']:>10.3f}"
+              f"{r['peak_kib']:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "parameters": {"habits": args.habits, "history": args.history, "repeat": args.repeat},
+                "python": platform.python_version(),
+                "results": results
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, ratio in regressions:
+            print(f"Regression: {name} is {ratio:.2f}x slower than the baseline.")
+        if regressions:
+            return 1
+        print("No regressions compared with the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/parallel_analytics.py" from the project folder.
+
+from analytics import parallel
+
+"""
+This file contains the scaling benchmark of the parallel analytics runner. It builds synthetic habits in memory, times
+longest_streaks() with 1, 2, 4, ... processes up to the number of cores, checks that every run gives the same result as
+the single-process run and reports the speed-up:
+
+    python benchmarks/parallel_analytics.py --habits 2000 --history 1000
+"""
+
+
+def make_habits(habit_count, history):
+    """
+    Returns:
+        list: Synthetic habit dictionaries, every tenth period skipped so there are several streaks.
+    """
+    today = date.today()
+    habits = []
+    for i in range(habit_count):
+        periodicity = "weekly" if i % 3 == 2 else "daily"
+        step = 7 if periodicity == "weekly" else 1
+        habits.append({"name": f"habit {i}", "periodicity": periodicity,
+                       "days_list": [(today - timedelta(days=step * k)).isoformat()
+                                     for k in range(history, 0, -1) if k % 10]})
+    return habits
+
+
+def run_scaling(habit_count=2000, history=1000, max_workers=None):
+    """
+    Times longest_streaks() for a growing number of processes.
+    Returns:
+        list: (workers, seconds, speed-up) for each run.
+    """
+    habits = make_habits(habit_count, history)
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    rows = []
+    expected = None
+    for workers in counts:
+        start = time.perf_counter()
+        result = parallel.longest_streaks(habits, workers)
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = result
+        elif result != expected:
+            raise AssertionError(f"The run with {workers} processes gave a different result.")
+        rows.append((workers, elapsed, rows[0][1] / elapsed if rows else 1.0))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scaling of the parallel analytics.")
+    parser.add_argument("--habits", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=1000, help="number of check-offs per habit")
+    parser.add_argument("--workers", type=int, help="largest number of processes (default: number of cores)")
+    args = parser.parse_args(argv)
+    print(f"{'processes':>10}{'seconds':>10}{'speed-up':>10}")
+    for workers, elapsed, speed_up in run_scaling(args.habits, args.history, args.workers):
+        print(f"{workers:>10}{elapsed:>10.3f}{speed_up:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/startup.py" from the project folder.
+
+from benchmarks.hot_paths import percentile
+
+"""
+This file contains the startup benchmark of the command line. Scripts often start "main.py" once per check-off, so
+the time until the program is ready (mostly imports) matters as much as the check-off itself. The benchmark creates a
+user with one habit in a temporary folder (the real files in db/ are never touched), then:
+
+- times "python main.py --user bench check-off <habit>" several times, next to a bare "python -c pass" for comparison;
+- runs it once with "python -X importtime" and reports the modules that take longest to import.
+
+    python benchmarks/startup.py --runs 10 --max-ms 60
+"""
+
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HABIT = "bench habit"
+
+
+def parse_importtime(stderr):
+    """
+    Reads the output of "python -X importtime".
+    Args:
+        stderr (str): The standard error of the run.
+    Returns:
+        tuple: (names of all imported modules, [(top-level module, cumulative microseconds)] slowest first).
+    """
+    modules = []
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        if name[1:2] != " ":
+            # Nested imports are indented, the top-level ones have a single space in front.
+            top_level.append((name.strip(), int(cumulative)))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return modules, top_level
+
+
+def _time_runs(command, env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+
+def run_startup(runs=5):
+    """
+    Runs the startup benchmark.
+    Args:
+        runs (int): Number of timed launches of each command.
+    Returns:
+        dict: Median and 90th percentile wall times in milliseconds of the bare interpreter and of a check-off, the
+        imported modules and the slowest top-level imports.
+    """
+    import db.storage_saver as storage_saver
+
+    with tempfile.TemporaryDirectory() as folder:
+        saved_users_dir = storage_saver.users_dir
+        storage_saver.users_dir = folder
+        try:
+            storage_saver.add_habit_to_catalog(HABIT, "daily", user_id="bench")
+            storage_saver.load_habits("bench")
+        finally:
+            storage_saver.users_dir = saved_users_dir
+
+        env = dict(os.environ, HABIT_TRACKER_USERS_DIR=folder)
+        check_off = [sys.executable, "main.py", "--user", "bench", "check-off", HABIT]
+        interpreter = _time_runs([sys.executable, "-c", "pass"], env, runs)
+        launches = _time_runs(check_off, env, runs)
+        traced = subprocess.run([sys.executable, "-X", "importtime"] + check_off[1:], env=env, cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True)
+
+    modules, slowest = parse_importtime(traced.stderr)
+    return {
+        "interpreter_p50_ms": percentile(interpreter, 0.50),
+        "check_off_p50_ms": percentile(launches, 0.50),
+        "check_off_p90_ms": percentile(launches, 0.90),
+        "modules": modules,
+        "slowest_imports": slowest
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the startup of a scripted check-off.")
+    parser.add_argument("--runs", type=int, default=10, help="number of timed launches")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to show")
+    parser.add_argument("--max-ms", type=float, help="fail if the median check-off launch is slower than this")
+    args = parser.parse_args(argv)
+
+    result = run_startup(args.runs)
+    print(f"python -c pass:        p50 {result['interpreter_p50_ms']:.1f} ms")
+    print(f"main.py check-off:     p50 {result['check_off_p50_ms']:.1f} ms, p90 {result['check_off_p90_ms']:.1f} ms")
+    print(f"\nModules imported: {len(result['modules'])}. Slowest top-level imports (cumulative):")
+    for name, microseconds in result["slowest_imports"][:args.top]:
+        print(f"{microseconds / 1000:>8.2f} ms  {name}")
+
+    if args.max_ms is not None and result["check_off_p50_ms"] > args.max_ms:
+        print(f"\nThe check-off launch is slower than {args.max_ms} ms.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
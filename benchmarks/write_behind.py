@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the benchmark be started as "python benchmarks/write_behind.py" from the project folder.
+
+import db.storage_saver as storage_saver
+from db import durability
+
+"""
+This file contains the benchmark of the write-behind of check-offs. It creates a user with many habits in a temporary
+folder, checks off every habit once in a quick burst (as a busy server would), and counts the writes, the bytes written
+and the fsyncs per check-off, first with every check-off written right away and then with write-behind:
+
+    python benchmarks/write_behind.py --habits 200
+"""
+
+
+def run_burst(habit_count=200, enabled=False):
+    """
+    Checks off every habit of a new store once, one user_check_off() call each.
+    Args:
+        habit_count (int): Number of habits (and check-offs).
+        enabled (bool): True to use write-behind.
+    Returns:
+        dict: "seconds" of the burst (including the last flush) and "writes", "bytes" and "fsyncs" per check-off.
+    """
+    saved = (storage_saver.users_dir, storage_saver.write_behind)
+    with tempfile.TemporaryDirectory() as folder:
+        storage_saver.users_dir = folder
+        try:
+            names = [f"habit {i}" for i in range(habit_count)]
+            for name in names:
+                storage_saver.add_habit_to_catalog(name, "daily", user_id="bench")
+            storage_saver.load_habits("bench")
+            storage_saver.set_write_behind(enabled)
+
+            before = dict(durability.stats)
+            start = time.perf_counter()
+            for name in names:
+                storage_saver.user_check_off(name, user_id="bench")
+            storage_saver.flush()
+            elapsed = time.perf_counter() - start
+            after = dict(durability.stats)
+
+            stored = storage_saver.get_repository("bench").load_all()
+            if sum(len(h["log_ins"]) for h in stored) != habit_count:
+                raise AssertionError("A check-off was lost.")
+        finally:
+            storage_saver.set_write_behind(saved[1])
+            storage_saver.users_dir = saved[0]
+    result = {key: (after[key] - before[key]) / habit_count for key in after}
+    result["seconds"] = elapsed
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the write-behind of check-offs.")
+    parser.add_argument("--habits", type=int, default=200, help="number of habits checked off in the burst")
+    args = parser.parse_args(argv)
+
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull
+    # user_check_off() prints a line for every check-off.
+    try:
+        rows = [(label, run_burst(args.habits, enabled)) for label, enabled in (("write-through", False),
+                                                                               ("write-behind", True))]
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    print(f"{'':<15}{'seconds':>10}{'writes':>10}{'bytes':>12}{'fsyncs':>10}   (per check-off)")
+    for label, r in rows:
+        print(f"{label:<15}{r['seconds']:>10.3f}{r['writes']:>10.2f}{r['bytes']:>12.1f}{r['fsyncs']:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import os
+
+"""
+This file contains the in-process cache of the parsed habits. The cache remembers the modification time and the size
+of the files the habits were read from. As long as neither changes, the parsed habits are given back without reading
+the files again. The storage writes through the cache: after each change it updates the cached habits itself instead
+of throwing them away. The hits and misses are counted so it can be checked that the cache is working.
+"""
+
+
+class FileSignatureCache:
+    """
+    Keeps one value (the parsed habits) together with the signature of the files it was built from.
+    """
+
+    def __init__(self, paths):
+        """
+        Args:
+            paths (list): The files the cached value depends on.
+        """
+        self.paths = list(paths)
+        self.value = None
+        self.signature = None
+        self.hits = 0
+        self.misses = 0
+
+    def current_signature(self):
+        """
+        Returns:
+            tuple: (modification time, size) of every file, None for a file that does not exist.
+        """
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def is_fresh(self):
+        """
+        Returns:
+            bool: True if there is a cached value and the files did not change since it was stored.
+        """
+        return self.value is not None and self.signature == self.current_signature()
+
+    def get(self, loader):
+        """
+        Returns the cached value, or calls loader() to read it again if the files changed.
+        Args:
+            loader (function): Reads the value from the files.
+        """
+        signature = self.current_signature()
+        if self.value is not None and signature == self.signature:
+            self.hits += 1
+            return self.value
+        self.misses += 1
+        self.value = loader()
+        self.signature = signature
+        return self.value
+
+    def update(self, value):
+        """
+        Stores a value that was just written to the files (write-through).
+        Args:
+            value: The new value.
+        """
+        self.value = value
+        self.signature = self.current_signature()
+
+    def invalidate(self):
+        """
+        Forgets the cached value, the next get() reads the files again.
+        """
+        self.value = None
+        self.signature = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of hits and misses.
+        """
+        return {"hits": self.hits, "misses": self.misses}
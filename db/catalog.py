@@ -0,0 +1,134 @@
+import json
+import os
+import instrumentation
+from db import compaction
+from db.cache import FileSignatureCache
+from db.durability import atomic_write
+from db.event_log import EventLog
+from db.locking import ShardLock
+
+"""
+This file contains the habit catalog: the list of habits the user has defined, with their periodicity. It replaces the
+generated "habit_names.py" file. The catalog is plain data in "habit_catalog.json", it is read once and kept in memory,
+and adding or removing a habit updates the memory copy in place, so a new habit is seen right away in the same session.
+The files are only read again if another program changed them.
+
+Like the store, the catalog has an append-only log next to it ("habit_catalog.events.jsonl"): adding a habit appends an
+"add" event and removing one appends a "remove" event (a tombstone), so the cost does not grow with the size of the
+catalog. The catalog is the JSON file with the log replayed on top of it. Once the log is long enough it is folded into
+the JSON file (see "compaction.py"). Replaying the log again on the folded file gives the same catalog, so a crash
+between the two steps loses nothing. The changes are made under the catalog's own lock ("habit_catalog.lock"), which is
+taken after the lock of the store when both are needed.
+"""
+
+
+class HabitCatalog:
+    """
+    The defined habits, kept as an ordered dictionary name -> periodicity.
+    """
+
+    def __init__(self, path, compact_after=500):
+        """
+        Args:
+            path (str): The JSON file of the catalog.
+            compact_after (int): Number of events after which the log is folded into the JSON file.
+        """
+        self.path = path
+        self.log = EventLog(os.path.splitext(path)[0] + ".events.jsonl")
+        self.compact_after = compact_after
+        self.lock = ShardLock(os.path.splitext(path)[0] + ".lock")
+        self._cache = FileSignatureCache([path, self.log.path])
+        # Loaded the first time the catalog is used.
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+                if instrumentation.enabled:
+                    instrumentation.count("bytes read", f.tell())
+        except FileNotFoundError:
+            stored = []
+        habits = {h["name"]: h["periodicity"] for h in stored}
+        for event in self.log.read():
+            if event.get("op") == "add":
+                habits.setdefault(event["name"], event["periodicity"])
+            elif event.get("op") == "remove":
+                habits.pop(event["name"], None)
+        return habits
+
+    def _entries(self):
+        return self._cache.get(self._read)
+
+    def __contains__(self, name):
+        return name in self._entries()
+
+    def __len__(self):
+        return len(self._entries())
+
+    def items(self):
+        """
+        Returns:
+            list: (name, periodicity) pairs in the order the habits were defined.
+        """
+        return list(self._entries().items())
+
+    def names(self):
+        """
+        Returns:
+            list: The names of the defined habits.
+        """
+        return list(self._entries())
+
+    def periodicity(self, name):
+        """
+        Returns:
+            str: The periodicity of the habit, or None if it is not in the catalog.
+        """
+        return self._entries().get(name)
+
+    def add(self, name, periodicity):
+        """
+        Adds a habit to the catalog. A habit that is already defined is left as it is.
+        Args:
+            name (str): The name of the habit.
+            periodicity (str): The periodicity, see "periodicity.py".
+        """
+        self._change({"op": "add", "name": name, "periodicity": periodicity})
+
+    def remove(self, name):
+        """
+        Removes a habit from the catalog, if it is there.
+        Args:
+            name (str): The name of the habit.
+        """
+        self._change({"op": "remove", "name": name})
+
+    def _change(self, event):
+        with self.lock:
+            habits = self._entries()
+            # Read again if another program changed the catalog, so the event is checked against its latest state.
+            if (event["name"] in habits) == (event["op"] == "add"):
+                return
+            self.log.append(event)
+            if event["op"] == "add":
+                habits[event["name"]] = event["periodicity"]
+            else:
+                del habits[event["name"]]
+            self._cache.update(habits)
+            if len(self.log) >= self.compact_after:
+                compaction.request(self)
+
+    def compact(self, background=False):
+        """
+        Writes the catalog into its JSON file and empties its log. The catalog is small, so the lock is held
+        throughout, also in the background.
+        Args:
+            background (bool): Unused, compaction.request() passes it to every store.
+        """
+        with self.lock:
+            habits = self._entries()
+            atomic_write(self.path, lambda f: json.dump([{"name": n, "periodicity": p} for n, p in habits.items()], f,
+                                                        indent=2))
+            # Written under a temporary name and renamed, so a reader never sees a half written catalog.
+            self.log.clear()
+            self._cache.update(habits)
@@ -0,0 +1,323 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from db.durability import atomic_write
+from db.repository import StoreCorruptedError
+from models.habit import to_microseconds, from_microseconds
+
+"""
+This file contains a binary, column based file format for the habit histories ("habits.col"). In "habits.json" every
+day and every log in is text that has to be parsed (fromisoformat) before it can be used. Here they are stored as
+numbers, packed one after the other, so a reader can use them as they are:
+
+- a header: the magic bytes "HABITCOL", the format version and the number of habits;
+- a table with one fixed-size entry per habit: where its name, its other fields and its two columns are, and how long
+  they are;
+- the names and the other fields of the habits (UTF-8, the fields as JSON);
+- the columns, aligned to 8 bytes: the days as int32 day numbers (date.toordinal()), sorted oldest first, and the log
+  ins as int64 microseconds since 1970-01-01 (see to_microseconds() in "habit.py"), in their stored order.
+
+All the numbers are little-endian. ColumnarFile opens the file with mmap and gives the columns as memoryviews on the
+mapped file, so nothing is copied and only the pages of the habits that are asked for are read from the disk.
+
+The format round-trips with "habits.json": reading a record gives back exactly the record that was written. The order
+of "days_list" (oldest or newest first) is kept in a flag, and a list that can not be rebuilt exactly from the numbers
+(an unsorted days list, a timestamp with a time zone or not in the form isoformat() writes) is also kept as it was in
+the fields, next to its column. Convert a store with:
+
+    python -m db.columnar db/habits.json db/habits.col
+    python -m db.columnar db/habits.col db/habits.json
+"""
+
+
+MAGIC = b"HABITCOL"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+# magic, version, number of habits
+ENTRY = struct.Struct("<QIIQIIQI4x")
+# name offset, name length, fields length (the fields follow the name), days offset, days count, log ins count,
+# log ins offset, flags
+DAYS_NEWEST_FIRST = 1
+# Flag: "days_list" was stored newest first, the column is kept oldest first anyway.
+
+
+def _days_column(days_list):
+    """
+    Returns:
+        tuple: (day numbers oldest first, flags, True if days_list can be rebuilt from them exactly).
+    """
+    ordinals = [date.fromisoformat(str(d)[:10]).toordinal() for d in days_list]
+    exact = all(isinstance(d, str) and len(d) == 10 for d in days_list)
+    if ordinals == sorted(ordinals):
+        return ordinals, 0, exact
+    if ordinals == sorted(ordinals, reverse=True):
+        return ordinals[::-1], DAYS_NEWEST_FIRST, exact
+    return sorted(ordinals), 0, False
+
+
+def _log_in_column(log_ins):
+    """
+    Returns:
+        tuple: (microseconds in the stored order, True if log_ins can be rebuilt from them exactly).
+    """
+    moments = [datetime.fromisoformat(ts).replace(tzinfo=None) for ts in log_ins]
+    micros = [to_microseconds(m) for m in moments]
+    exact = all(from_microseconds(m).isoformat() == ts for m, ts in zip(micros, log_ins))
+    return micros, exact
+
+
+def _little_endian(values, code):
+    column = array(code, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_columnar(path, records):
+    """
+    Writes habit records into a columnar file, atomically (see "durability.py").
+    Args:
+        path (str): The file, for example "db/habits.col".
+        records (iterable): The habit records (the layout of "habits.json").
+    Returns:
+        int: The number of habits written.
+    """
+    records = list(records)
+    strings = []
+    columns = []
+    for record in records:
+        days, flags, days_exact = _days_column(record.get("days_list") or [])
+        micros, log_ins_exact = _log_in_column(record.get("log_ins") or [])
+        fields = dict(record)
+        # The lists are replaced by null when the column is enough, the key order of the record is kept.
+        if "days_list" in fields and days_exact:
+            fields["days_list"] = None
+        if "log_ins" in fields and log_ins_exact:
+            fields["log_ins"] = None
+        strings.append((record["name"].encode("utf-8"), json.dumps(fields, separators=(",", ":")).encode("utf-8")))
+        columns.append((_little_endian(days, 'i'), len(days), _little_endian(micros, 'q'), len(micros), flags))
+
+    def write(f):
+        position = HEADER.size + ENTRY.size * len(records)
+        name_offsets = []
+        for name, fields in strings:
+            name_offsets.append(position)
+            position += len(name) + len(fields)
+        entries = []
+        for (name, fields), name_offset, (days, day_count, log_ins, log_count, flags) in zip(strings, name_offsets,
+                                                                                             columns):
+            position += -position % 8
+            days_offset = position
+            position += len(days)
+            position += -position % 8
+            entries.append(ENTRY.pack(name_offset, len(name), len(fields), days_offset, day_count, log_count,
+                                      position, flags))
+            position += len(log_ins)
+
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        f.write(b"".join(entries))
+        for name, fields in strings:
+            f.write(name)
+            f.write(fields)
+        for days, _, log_ins, _, _ in columns:
+            f.write(b"\0" * (-f.tell() % 8))
+            f.write(days)
+            f.write(b"\0" * (-f.tell() % 8))
+            f.write(log_ins)
+        return len(records)
+
+    return atomic_write(path, write, binary=True)
+
+
+class ColumnarFile:
+    """
+    A memory-mapped columnar file, used with "with" or closed with close(). The memoryviews it gives out point into
+    the mapped file and can only be used while it is open.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The columnar file.
+        Raises:
+            StoreCorruptedError: If the file is not a columnar habits file.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise StoreCorruptedError(f"{path} is empty.") from e
+        # The mapping stays valid after the file is closed.
+        self._view = memoryview(self._map)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise StoreCorruptedError(f"{path} is not a columnar habits file.")
+        magic, version, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or HEADER.size + ENTRY.size * self._count > len(self._map):
+            self.close()
+            raise StoreCorruptedError(f"{path} is not a columnar habits file of version {VERSION}.")
+        self._positions = None
+        # name -> position in the table, read the first time a habit is looked up by name.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Unmaps the file. A memoryview that is still used keeps the mapping alive until it is released.
+        """
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, name):
+        return name in self._table()
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * position)
+
+    def _table(self):
+        if self._positions is None:
+            self._positions = {}
+            for position in range(self._count):
+                name_offset, name_length = self._entry(position)[:2]
+                self._positions[str(self._view[name_offset:name_offset + name_length], "utf-8")] = position
+        return self._positions
+
+    def _find(self, name):
+        position = self._table().get(name)
+        if position is None:
+            raise KeyError(name)
+        return self._entry(position)
+
+    def _column(self, offset, count, code):
+        size = array(code).itemsize
+        data = self._view[offset:offset + count * size]
+        if sys.byteorder == "little":
+            return data.cast(code)
+        column = array(code, bytes(data))
+        column.byteswap()
+        return column
+
+    def names(self):
+        """
+        Returns:
+            list: The names of the habits, in the order they were written.
+        """
+        return list(self._table())
+
+    def fields(self, name):
+        """
+        Returns:
+            dict: The fields of the habit other than its columns ("periodicity", "time of creation", "streak", ...).
+        """
+        name_offset, name_length, fields_length = self._find(name)[:3]
+        start = name_offset + name_length
+        return json.loads(str(self._view[start:start + fields_length], "utf-8"))
+
+    def periodicity(self, name):
+        """
+        Returns:
+            str: The periodicity of the habit.
+        """
+        return self.fields(name).get("periodicity", "daily")
+
+    def days(self, name):
+        """
+        Returns the days of one habit, without reading the other habits.
+        Args:
+            name (str): The name of the habit.
+        Returns:
+            memoryview: The day numbers (int32), oldest first.
+        """
+        entry = self._find(name)
+        return self._column(entry[3], entry[4], 'i')
+
+    def log_in_microseconds(self, name):
+        """
+        Returns:
+            memoryview: The log ins of the habit (int64 microseconds since 1970-01-01), in their stored order.
+        """
+        entry = self._find(name)
+        return self._column(entry[6], entry[5], 'q')
+
+    def days_between(self, name, first, last):
+        """
+        Returns the days of a habit between two dates (both included), found with two binary searches.
+        Args:
+            name (str): The name of the habit.
+            first (date): The first day of the window.
+            last (date): The last day of the window.
+        Returns:
+            memoryview: The day numbers of the window, oldest first.
+        """
+        days = self.days(name)
+        return days[bisect_left(days, first.toordinal()):bisect_right(days, last.toordinal())]
+
+    def days_array(self, name):
+        """
+        Returns the days of a habit as a NumPy array on the mapped file (no copy), for "vectorized.py".
+        Returns:
+            numpy.ndarray: The day numbers (int32), oldest first.
+        """
+        import numpy as np
+        # NumPy is optional and slow to import, so it is only imported here.
+
+        entry = self._find(name)
+        return np.frombuffer(self._map, dtype="<i4", count=entry[4], offset=entry[3])
+
+    def get(self, name):
+        """
+        Rebuilds the record of one habit, exactly as it was written.
+        Args:
+            name (str): The name of the habit.
+        Returns:
+            dict: The habit record, or None if there is no such habit.
+        """
+        if name not in self._table():
+            return None
+        record = self.fields(name)
+        flags = self._find(name)[7]
+        if "days_list" in record and record["days_list"] is None:
+            days = [date.fromordinal(d).isoformat() for d in self.days(name)]
+            record["days_list"] = days[::-1] if flags & DAYS_NEWEST_FIRST else days
+        if "log_ins" in record and record["log_ins"] is None:
+            record["log_ins"] = [from_microseconds(m).isoformat() for m in self.log_in_microseconds(name)]
+        return record
+
+    def iter_records(self):
+        """
+        Yields:
+            dict: The records of all the habits, in the order they were written.
+        """
+        for name in self.names():
+            yield self.get(name)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python -m db.columnar <habits.json> <habits.col>  (or the other way around)")
+        sys.exit(2)
+    source, target = sys.argv[1:]
+    if source.endswith(".col"):
+        from db.json_stream import write_habit_records
+        with ColumnarFile(source) as columnar:
+            converted = write_habit_records(target, columnar.iter_records())
+    else:
+        from db.repository import JsonRepository
+        converted = write_columnar(target, JsonRepository(source).load_all())
+        # The habits are read with their event log, the source files are not changed.
+    print(f"Converted {converted} habits from {source} into {target}.")
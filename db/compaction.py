@@ -0,0 +1,95 @@
+import atexit
+import os
+import sys
+import threading
+
+"""
+This file contains the compaction of the append-only stores (the event log of "habits.json" and the log of the habit
+catalog). A store asks for a compaction with request() once its log is long enough. By default the store is compacted
+right away, by the call that made the log too long. With background compaction (HABIT_TRACKER_BACKGROUND_COMPACTION=on
+or set_background(True), for example in the server) it is done by a worker thread instead, so adding, deleting and
+checking off always cost one append: the JSON store then builds its new snapshot without holding its lock, and only
+takes the lock for the rename (see JsonRepository.compact()).
+
+A store is compacted by calling its compact(background=True) method. The compactions that are still waiting are done
+when the program exits; one that is cut off is finished by the journal of the store.
+"""
+
+
+background = os.environ.get("HABIT_TRACKER_BACKGROUND_COMPACTION", "off") == "on"
+_waiting = []
+# The stores that asked for a compaction, in order. A store stays in the list until its compaction is done.
+_condition = threading.Condition()
+_worker = None
+
+
+def set_background(enabled):
+    """
+    Turns the background compaction on or off. Turning it off waits for the compactions that were asked for.
+    Args:
+        enabled (bool): True to compact in a worker thread.
+    """
+    global background
+    if not enabled:
+        wait()
+    background = enabled
+
+
+def request(store):
+    """
+    Compacts a store, now or (with background compaction) in the worker thread. A store that is already waiting is
+    not added again.
+    Args:
+        store: A store with a compact(background) method (JsonRepository or HabitCatalog).
+    """
+    global _worker
+    if not background:
+        store.compact()
+        return
+    with _condition:
+        if any(waiting is store for waiting in _waiting):
+            return
+        _waiting.append(store)
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name="habit-tracker-compaction", daemon=True)
+            _worker.start()
+        _condition.notify_all()
+
+
+def pending():
+    """
+    Returns:
+        int: The number of stores waiting for a compaction (including the one being compacted).
+    """
+    with _condition:
+        return len(_waiting)
+
+
+def wait():
+    """
+    Waits until every compaction that was asked for is done.
+    """
+    with _condition:
+        while _waiting:
+            _condition.wait()
+
+
+def _work():
+    while True:
+        with _condition:
+            while not _waiting:
+                _condition.wait()
+            store = _waiting[0]
+        try:
+            store.compact(background=True)
+        except Exception as e:
+            # The store is left as it was (a cut off compaction is finished by its journal) and asks again after its
+            # next write, so the error is only reported.
+            print(f"Background compaction of {getattr(store, 'path', store)} failed: {e!r}", file=sys.stderr)
+        finally:
+            with _condition:
+                _waiting.pop(0)
+                _condition.notify_all()
+
+
+atexit.register(wait)
@@ -0,0 +1,178 @@
+import atexit
+import os
+import threading
+import instrumentation
+
+"""
+This file contains the crash-safe writing of the storage files. A file that is replaced (the "habits.json" snapshot,
+the catalog, the summary index, the journal) is written under a temporary name, flushed to the disk with fsync and then
+renamed over the old one, so after a crash the old or the new file is there, never a half written one. The appends to
+the event log are flushed to the disk according to the durability mode, set with the HABIT_TRACKER_DURABILITY
+environment variable or set_durability():
+
+- "always" (the default): every append is fsynced before the call returns. Nothing that was reported as stored is
+  lost, even in a power cut.
+- "group": the appends are written to the operating system right away and fsynced together at most every
+  "group_commit_seconds" (and when the program exits). It is much faster when many check-offs arrive close together,
+  but a power cut (not a crash of the program) can lose the check-offs of the last moment.
+- "never": nothing is fsynced, the operating system decides when the files reach the disk. Meant for tests and
+  benchmarks.
+"""
+
+
+MODES = ("always", "group", "never")
+durability = os.environ.get("HABIT_TRACKER_DURABILITY", "always")
+if durability not in MODES:
+    raise ValueError(f"HABIT_TRACKER_DURABILITY should be one of {', '.join(MODES)}.")
+group_commit_seconds = 0.1
+# The longest time an append waits for its fsync in the "group" mode.
+
+stats = {"writes": 0, "bytes": 0, "fsyncs": 0}
+# Counted for every file written through this module, read by the benchmarks.
+_pending = set()
+# Files appended to in the "group" mode that were not fsynced yet.
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def set_durability(mode):
+    """
+    Chooses when the appends are flushed to the disk.
+    Args:
+        mode (str): "always", "group" or "never".
+    """
+    global durability
+    if mode not in MODES:
+        raise ValueError(f"The durability should be one of {', '.join(MODES)}.")
+    flush_pending()
+    durability = mode
+
+
+def fsync_file(f):
+    """
+    Flushes an open file to the disk, unless the durability mode is "never".
+    Args:
+        f: The open file.
+    """
+    f.flush()
+    if durability != "never":
+        os.fsync(f.fileno())
+        stats["fsyncs"] += 1
+
+
+def fsync_directory(path):
+    """
+    Flushes the folder of a file to the disk, so that a rename or a removal in it survives a crash. Some systems
+    (Windows) can not open a folder, there the rename is already durable.
+    Args:
+        path (str): A file in the folder.
+    """
+    if durability == "never":
+        return
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+        stats["fsyncs"] += 1
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, before_replace=None, sync=True, binary=False, temp_path=None):
+    """
+    Replaces a file atomically: write(f) fills a temporary file, which is fsynced and renamed over "path".
+    Args:
+        path (str): The file to replace.
+        write (function): Called with the temporary file opened for writing, its result is returned.
+        before_replace (function): Called after the temporary file is on the disk and before the rename (used to
+            write the journal).
+        sync (bool): False for files that can be built again (the summary index), they are renamed without fsync.
+        binary (bool): True to open the temporary file in binary mode.
+        temp_path (str): The temporary file, by default "path" + ".tmp". A writer that does not hold the lock of the
+            file (a background compaction) uses a name of its own.
+    Returns:
+        The result of write(f).
+    """
+    temp_path = temp_path or path + ".tmp"
+    with open(temp_path, 'wb' if binary else 'w') as f:
+        result = write(f)
+        stats["writes"] += 1
+        stats["bytes"] += f.tell()
+        if instrumentation.enabled:
+            instrumentation.count("bytes written", f.tell())
+        if sync:
+            fsync_file(f)
+    if before_replace is not None:
+        before_replace()
+    os.replace(temp_path, path)
+    if sync:
+        fsync_directory(path)
+    return result
+
+
+def append(path, data):
+    """
+    Appends text at the end of a file and flushes it according to the durability mode. If the file does not end with
+    a new line (an append that was cut off by a crash), the new text starts on a new line, so the cut off line can be
+    skipped by the reader without taking the new one with it.
+    Args:
+        path (str): The file.
+        data (str): The text to append, ending with a new line.
+    """
+    with open(path, 'ab+') as f:
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                data = "\n" + data
+        encoded = data.encode("utf-8")
+        f.write(encoded)
+        # In append mode the write always goes to the end of the file, whatever was read before.
+        stats["writes"] += 1
+        stats["bytes"] += len(encoded)
+        if instrumentation.enabled:
+            instrumentation.count("bytes written", len(encoded))
+        if durability == "always":
+            fsync_file(f)
+        elif durability == "group":
+            f.flush()
+            _schedule(path)
+
+
+def _schedule(path):
+    global _timer
+    with _pending_lock:
+        _pending.add(path)
+        if _timer is None:
+            _timer = threading.Timer(group_commit_seconds, flush_pending)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush_pending():
+    """
+    Fsyncs the files appended to in the "group" mode that were not fsynced yet. Called by a timer, at exit, and
+    whenever the durability mode changes.
+    """
+    global _timer
+    with _pending_lock:
+        paths = list(_pending)
+        _pending.clear()
+        _timer = None
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        # A file that was removed in the meantime has nothing left to flush.
+        try:
+            os.fsync(fd)
+            stats["fsyncs"] += 1
+        finally:
+            os.close(fd)
+
+
+atexit.register(flush_pending)
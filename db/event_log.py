@@ -0,0 +1,194 @@
+import json
+import os
+from bisect import insort
+import instrumentation
+from db import durability
+
+"""
+This file contains the append-only event log that sits next to the "habits.json" snapshot. Instead of rewriting the whole
+JSON file for every change, each create, check-off and delete is written as one small JSON line at the end of the log.
+Loading the habits means reading the snapshot and replaying the log on top of it. Once the log grows long enough it is
+compacted, which means the replayed state is written back into the snapshot and the log is emptied (or, for a
+compaction in the background, only the events that were written into the snapshot are removed from its front).
+"""
+
+
+def make_empty_record(name, periodicity, created_at):
+    """
+    Builds the dictionary of a habit that has never been checked off.
+    Args:
+        name (str): The name of the habit.
+        periodicity (str): The periodicity, see "periodicity.py".
+        created_at (str): ISO time of creation.
+    Returns:
+        dict: The habit record in the same layout as "habits.json".
+    """
+    return {
+        "name": name,
+        "periodicity": periodicity,
+        "time of creation": created_at,
+        "streak": 0,
+        "days_list": [],
+        "log_ins": []
+    }
+
+
+def add_day(days, day):
+    """
+    Adds an ISO day to a stored days list. The stored lists are sorted, either oldest or newest first, so a new day is
+    put on the newest end and the order is kept. ISO dates sort the same way as the dates themselves.
+    Args:
+        days (list): The "days_list" of a habit record.
+        day (str): The ISO day to add.
+    """
+    if not days:
+        days.append(day)
+        return
+    oldest_first = days[0] <= days[-1]
+    newest = days[-1] if oldest_first else days[0]
+    if day > newest:
+        if oldest_first:
+            days.append(day)
+        else:
+            days.insert(0, day)
+    elif day not in days:
+        # A day from the past (for example an imported check-off), the list is sorted again.
+        days.append(day)
+        days.sort(reverse=not oldest_first)
+
+
+def apply_event(habits_by_name, event):
+    """
+    Applies a single event to the habits, which are kept in a dictionary by name (the dictionary keeps the order in
+    which the habits were created).
+    Args:
+        habits_by_name (dict): name -> habit record.
+        event (dict): One line of the event log.
+    """
+    op = event.get("op")
+    name = event.get("name")
+
+    if op == "create":
+        if name not in habits_by_name:
+            habits_by_name[name] = event["habit"]
+    elif op == "check_off":
+        habit = habits_by_name.get(name)
+        if habit is None:
+            return
+        log_ins = habit["log_ins"]
+        if not log_ins or log_ins[-1] <= event["ts"]:
+            log_ins.append(event["ts"])
+        else:
+            # An imported check-off from the past, the log ins stay in time order.
+            insort(log_ins, event["ts"])
+        add_day(habit["days_list"], event["ts"][:10])
+        # The date part of an ISO timestamp is the day itself, so it is not parsed here.
+        habit["streak"] = event.get("streak", habit.get("streak", 0))
+    elif op == "delete":
+        habits_by_name.pop(name, None)
+
+
+class EventLog:
+    """
+    A JSON Lines file where each line is one event. The log is only ever appended to, apart from compaction which
+    removes the events after they have been written into the snapshot.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The location of the log file.
+        """
+        self.path = path
+        self._length = None
+        # Number of events in the log, counted lazily the first time it is needed.
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self.read())
+        return self._length
+
+    def read(self, until=None):
+        """
+        Reads the events one by one. A half written line (for example after a crash during an append) is skipped.
+        Args:
+            until (int): Only read the first "until" bytes of the log (the events that were there when size() was
+            called), by default the whole log.
+        Yields:
+            dict: The next event.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                for line in (f if until is None else f.read(until).splitlines(keepends=True)):
+                    if instrumentation.enabled:
+                        instrumentation.count("bytes read", len(line))
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    if instrumentation.enabled:
+                        instrumentation.count("hydrated")
+                    yield event
+        except FileNotFoundError:
+            return
+
+    def append(self, event):
+        """
+        Appends one event at the end of the log.
+        Args:
+            event (dict): The event to store.
+        """
+        self.extend([event])
+
+    def extend(self, events):
+        """
+        Appends several events with a single write.
+        Args:
+            events (list): The events to store.
+        """
+        if not events:
+            return
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+        durability.append(self.path, data)
+        # Flushed to the disk according to the durability mode (see "durability.py").
+        if self._length is not None:
+            self._length += len(events)
+
+    def size(self):
+        """
+        Returns:
+            int: The size of the log in bytes, 0 if there is no log.
+        """
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def drop_prefix(self, size):
+        """
+        Removes the first "size" bytes of the log (the events a background compaction wrote into the snapshot) and
+        keeps the events that were appended after them. The rest of the log is written under a temporary name and
+        renamed, so a crash leaves either the whole log or the rest of it.
+        Args:
+            size (int): The number of bytes to remove, a value returned by size().
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(size)
+                rest = f.read()
+        except FileNotFoundError:
+            return
+        durability.atomic_write(self.path, lambda f: f.write(rest), binary=True)
+        self._length = None
+
+    def clear(self):
+        """
+        Empties the log, called after compaction.
+        """
+        if os.path.exists(self.path):
+            with open(self.path, 'w') as f:
+                durability.fsync_file(f)
+        self._length = 0
@@ -1,11 +0,0 @@
-from models.habit import Habit
-
-habits = [
-    Habit('coding', 'daily'),
-    Habit('working', 'weekly'),
-    Habit('running', 'daily'),
-    Habit('dentist visit', 'weekly'),
-    Habit('reading', 'daily'),
-    Habit('weekly planning', 'weekly'),
-    Habit('eating healthy', 'daily'),
-]
@@ -0,0 +1,79 @@
+import json
+import os
+from contextlib import contextmanager
+from db.durability import atomic_write, fsync_directory
+
+"""
+This file contains the journal of a store: a small file that describes the operation that is being done while that
+operation changes more than one file (for example deleting a habit, which changes the catalog and the store, or a
+compaction, which replaces the snapshot and empties the event log). It is written, and flushed to the disk, before the
+first file is changed and removed after the last one. If the program stops in between, the journal is still there the
+next time the store is locked, and the operation is finished then (the steps are written so they can safely be done
+twice). A store that is not in the middle of such an operation has no journal file.
+"""
+
+
+class Journal:
+    """
+    The journal file of one store. Without a path (in-memory databases) the entry is only kept in memory.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The journal file, for example "db/habits.journal.json".
+        """
+        self.path = path
+        self._entry = None
+
+    def pending(self):
+        """
+        Returns:
+            dict: The entry of an operation that was started and not finished, or None.
+        """
+        if self.path is None:
+            return self._entry
+        if not os.path.exists(self.path):
+            return None
+        # Checked first so that the common case (no journal) costs a single stat.
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def begin(self, entry):
+        """
+        Writes the entry of an operation before its first step.
+        Args:
+            entry (dict): The operation, with an "op" key and what is needed to finish it.
+        """
+        if self.path is None:
+            self._entry = entry
+            return
+        atomic_write(self.path, lambda f: json.dump(entry, f))
+
+    def end(self):
+        """
+        Removes the entry after the last step of the operation.
+        """
+        if self.path is None:
+            self._entry = None
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            return
+        fsync_directory(self.path)
+
+    @contextmanager
+    def operation(self, entry):
+        """
+        Runs the steps of the "with" block as one operation. If a step fails the entry is kept, and the operation is
+        finished the next time the store is locked.
+        Args:
+            entry (dict): The operation.
+        """
+        self.begin(entry)
+        yield
+        self.end()
@@ -0,0 +1,187 @@
+import json
+import sys
+import instrumentation
+from db.durability import atomic_write
+
+"""
+This file contains the streaming reader and writer of the habit files. The reader gives the habit records one at a time
+(as a generator), both from the indented JSON array of "habits.json" and from JSON Lines files, where every line is
+one compact habit record. The writer takes the records one at a time as well, so a whole store never has to be in
+memory to be read, converted or written. It can also be run to convert "habits.json" into JSON Lines:
+
+    python -m db.json_stream db/habits.json db/habits.jsonl
+"""
+
+
+CHUNK_SIZE = 1 << 16
+
+
+def _is_json_lines(path):
+    return path.endswith(".jsonl")
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """
+    Reads the elements of a top-level JSON array one by one, keeping only a small buffer in memory. The elements are
+    expected to be objects (habit records).
+    Args:
+        f: A text file opened for reading.
+        chunk_size (int): How many characters are read at a time.
+    Yields:
+        dict: The next element.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill(buffer, pos):
+        # Drops what was already parsed and reads the next chunk.
+        more = f.read(chunk_size)
+        if instrumentation.enabled:
+            instrumentation.count("bytes read", len(more))
+        return buffer[pos:] + more, 0, not more
+
+    def skip_whitespace(buffer, pos, eof):
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer, pos, eof
+            buffer, pos, eof = fill(buffer, pos)
+
+    buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "[":
+        raise json.JSONDecodeError("Expected a JSON array", buffer, pos)
+    pos += 1
+
+    expect_element = True
+    while True:
+        buffer, pos, eof = skip_whitespace(buffer, pos, eof)
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, pos)
+        if buffer[pos] == "]":
+            return
+        if not expect_element:
+            if buffer[pos] != ",":
+                raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+            pos += 1
+            expect_element = True
+            continue
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The element goes on in the next chunk.
+            buffer, pos, eof = fill(buffer, pos)
+            continue
+        yield element
+        pos = end
+        expect_element = False
+
+
+def iter_json_lines(f):
+    """
+    Reads a JSON Lines file, one record per line.
+    Args:
+        f: A text file opened for reading.
+    Yields:
+        dict: The next record.
+    """
+    for line in f:
+        if instrumentation.enabled:
+            instrumentation.count("bytes read", len(line))
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_habit_records(path):
+    """
+    Reads the habit records of a file one at a time, whether it is a JSON array or JSON Lines. A file that does not
+    exist has no records.
+    Args:
+        path (str): The file.
+    Yields:
+        dict: The next habit record.
+    """
+    try:
+        f = open(path, 'r')
+    except FileNotFoundError:
+        return
+    with f:
+        first = ""
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                first = char
+                break
+        if not first:
+            return
+        f.seek(0)
+        records = iter_json_array(f) if first == "[" else iter_json_lines(f)
+        for record in records:
+            if instrumentation.enabled:
+                instrumentation.count("hydrated")
+            yield record
+
+
+def write_habit_records(path, records, before_replace=None, temp_path=None):
+    """
+    Writes the records one at a time: as compact JSON Lines if the file name ends with ".jsonl", otherwise as the
+    indented JSON array of "habits.json". The file is written under a temporary name, flushed to the disk and renamed
+    at the end (see "durability.py"), so the records may come from the file that is being replaced and a crash never
+    leaves a half written file.
+    Args:
+        path (str): The file.
+        records (iterable): The habit records.
+        before_replace (function): Called when the temporary file is complete, just before the rename.
+        temp_path (str): The temporary file, see atomic_write().
+    Returns:
+        int: The number of records written.
+    """
+    def write(f):
+        count = 0
+        if _is_json_lines(path):
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+        else:
+            # The same layout as json.dump(habits, f, indent=2).
+            for record in records:
+                f.write("[\n  " if count == 0 else ",\n  ")
+                f.write(json.dumps(record, indent=2).replace("\n", "\n  "))
+                count += 1
+            f.write("\n]" if count else "[]")
+        return count
+
+    return atomic_write(path, write, before_replace, temp_path=temp_path)
+
+
+def convert_to_json_lines(source, target):
+    """
+    Converts a habits file (for example the indented "habits.json") into compact JSON Lines.
+    Args:
+        source (str): The file to read.
+        target (str): The ".jsonl" file to write.
+    Returns:
+        int: The number of habits converted.
+    """
+    if not _is_json_lines(target):
+        raise ValueError("The target file name should end with '.jsonl'.")
+    return write_habit_records(target, iter_habit_records(source))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python -m db.json_stream <habits.json> <habits.jsonl>")
+        sys.exit(2)
+    from db.repository import JsonRepository
+    JsonRepository(sys.argv[1]).compact()
+    # The pending events are folded into the source first, both files then share an empty event log.
+    converted = convert_to_json_lines(sys.argv[1], sys.argv[2])
+    print(f"Converted {converted} habits from {sys.argv[1]} into {sys.argv[2]}.")
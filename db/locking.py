@@ -0,0 +1,82 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+# fcntl exists on Linux and macOS, msvcrt on Windows.
+
+"""
+This file contains the lock of a storage shard. A shard (the files of one user) is changed by reading it, updating it
+and writing it back, so two check-offs at the same time could lose one of them. The lock makes these steps exclusive,
+both between the threads of one program (with a threading.RLock) and between programs (with a lock on a small ".lock"
+file next to the shard). Different shards have different locks, so they never wait for each other.
+"""
+
+
+class ShardLock:
+    """
+    A re-entrant lock that is held by one thread of one process at a time. It is used with "with".
+    """
+
+    def __init__(self, path=None, on_acquire=None):
+        """
+        Args:
+            path (str): The lock file. Without one the lock only works between the threads of this program (used for
+            in-memory databases).
+            on_acquire (function): Called every time the lock is taken (not when it is taken again by the thread that
+            holds it), used to finish an operation that another program left unfinished (see "journal.py").
+        """
+        self.path = path
+        self.on_acquire = on_acquire
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and self.path is not None:
+            try:
+                f = open(self.path, 'a+')
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                except BaseException:
+                    f.close()
+                    raise
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._file = f
+        self._depth += 1
+        if self._depth == 1 and self.on_acquire is not None:
+            try:
+                self.on_acquire()
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
@@ -0,0 +1,413 @@
+import json
+import os
+import threading
+from db import compaction
+from db.cache import FileSignatureCache
+from db.catalog import HabitCatalog
+from db.event_log import EventLog, apply_event
+from db.journal import Journal
+from db.json_stream import iter_habit_records, write_habit_records
+from db.locking import ShardLock
+
+"""
+This file contains the repository interface of the storage. A repository keeps the habit records (dictionaries in the
+same layout as "habits.json") and knows how to load, add, check off and delete them. "storage_saver.py" only talks to a
+repository, so the JSON files and the SQLite database can be swapped without changing the rest of the program.
+"""
+
+
+def default_log_path(path):
+    """
+    Returns:
+        str: The event log that belongs to a snapshot ("db/habits.json" -> "db/habits.events.jsonl").
+    """
+    return os.path.splitext(path)[0] + ".events.jsonl"
+
+
+def default_lock_path(path):
+    """
+    Returns:
+        str: The lock file that belongs to a snapshot ("db/habits.json" -> "db/habits.lock").
+    """
+    return os.path.splitext(path)[0] + ".lock"
+
+
+def default_journal_path(path):
+    """
+    Returns:
+        str: The journal that belongs to a store ("db/habits.json" -> "db/habits.journal.json").
+    """
+    return os.path.splitext(path)[0] + ".journal.json"
+
+
+def default_index_path(path):
+    """
+    Returns:
+        str: The summary index that belongs to a store ("db/habits.json" -> "db/habits.summary.json").
+    """
+    return os.path.splitext(path)[0] + ".summary.json"
+
+
+class _SnapshotReplaced(Exception):
+    # Raised by a background compaction that finds a snapshot it did not start from.
+    pass
+
+
+class StoreCorruptedError(ValueError):
+    """
+    Raised when a store file can not be read. The store is left as it is, so nothing is overwritten before it has been
+    repaired or restored from a backup.
+    """
+
+
+class HabitRepository:
+    """
+    The interface every storage backend implements. The methods that have a default implementation here work on top
+    of load_all(), a backend overrides them when it can answer them faster (for example with an index).
+
+    Every backend has a "lock" (a ShardLock). Each method holds it while it runs, and a caller that reads a habit and
+    then writes it back (like a check-off) holds it around both steps with "with repository.lock:".
+
+    Operations that change more than one file are written in the "journal" first (see "journal.py"). Taking the lock
+    calls recover(), which finishes an operation that was cut off by a crash.
+    """
+
+    lock = None
+    journal = None
+    indexes_periodicity = False
+    # True for a backend whose names_by_periodicity() uses an index of its own, it then answers that question instead
+    # of the summary index.
+
+    def recover(self):
+        """
+        Finishes the operation of the journal, if there is one. Called with the lock held.
+        """
+        entry = self.journal.pending() if self.journal is not None else None
+        if entry is not None:
+            self._finish(entry)
+            self.journal.end()
+
+    def _finish(self, entry):
+        """
+        Does the steps of an interrupted operation again, each of them can be done twice.
+        Args:
+            entry (dict): The journal entry.
+        """
+        if entry["op"] == "delete":
+            if entry.get("catalog"):
+                HabitCatalog(entry["catalog"]).remove(entry["name"])
+            self.delete(entry["name"])
+
+    def load_all(self):
+        """
+        Returns:
+            list: All stored habit records, in the order they were created.
+        """
+        raise NotImplementedError
+
+    def replace_all(self, habits):
+        """
+        Replaces the whole content of the store.
+        Args:
+            habits (list): The habit records to keep.
+        """
+        raise NotImplementedError
+
+    def add(self, record):
+        """
+        Stores a new habit record. Does nothing if a habit with the same name already exists.
+        Args:
+            record (dict): The habit record.
+        """
+        raise NotImplementedError
+
+    def record_check_offs(self, check_offs, defer=False):
+        """
+        Stores new log ins.
+        Args:
+            check_offs (list): (habit name, ISO timestamp, streak after the check-off) tuples.
+            defer (bool): True to keep them in memory until flush() (write-behind). They are seen right away by this
+            program, other programs see them after the flush. Backends that can not defer write them right away.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Writes the deferred check-offs with a single write.
+        Returns:
+            int: The number of check-offs written.
+        """
+        return 0
+
+    def delete(self, name):
+        """
+        Removes a habit and its history.
+        Args:
+            name (str): The name of the habit.
+        """
+        raise NotImplementedError
+
+    def data_files(self):
+        """
+        Returns:
+            list: The files the habits are stored in, used to notice changes made by other programs.
+        """
+        return []
+
+    def get(self, name):
+        """
+        Args:
+            name (str): The name of the habit.
+        Returns:
+            dict: The habit record or None if it is not stored.
+        """
+        return next((h for h in self.load_all() if h["name"] == name), None)
+
+    def contains(self, name):
+        """
+        Returns:
+            bool: True if a habit with this name is stored.
+        """
+        return self.get(name) is not None
+
+    def names_by_periodicity(self, periodicity):
+        """
+        Returns:
+            list: Names of the stored habits with the given periodicity.
+        """
+        return [h["name"] for h in self.load_all() if h["periodicity"] == periodicity]
+
+
+class JsonRepository(HabitRepository):
+    """
+    The JSON backend: a "habits.json" snapshot plus the append-only event log from "event_log.py". If the snapshot's
+    name ends with ".jsonl" it is kept as compact JSON Lines instead of an indented array. The parsed habits
+    are kept in a FileSignatureCache, so the files are only read again when another program changed them. The records
+    that are returned are shared with the cache and must not be modified by the caller.
+    """
+
+    def __init__(self, path, log_path=None, compact_after=500, lock_path=None):
+        """
+        Args:
+            path (str): The snapshot file.
+            log_path (str): The event log file, by default next to the snapshot.
+            compact_after (int): Number of events after which the log is folded into the snapshot.
+            lock_path (str): The lock file, by default next to the snapshot.
+        """
+        self.path = path
+        self.log = EventLog(log_path or default_log_path(path))
+        self.compact_after = compact_after
+        self.cache = FileSignatureCache([self.path, self.log.path])
+        self.journal = Journal(default_journal_path(path))
+        self.lock = ShardLock(lock_path or default_lock_path(path), on_acquire=self.recover)
+        self.pending = []
+        # Deferred events (write-behind), they come after the events of the log file.
+        self.listeners = []
+        # Called with the old signature of the files after a background compaction rewrote them (see compact()).
+
+    def data_files(self):
+        return [self.path, self.log.path]
+
+    def iter_records(self):
+        """
+        Gives the current habit records one at a time: the snapshot is streamed record by record and the events of the
+        log (which is kept short by compaction) are applied to each record as it passes. This gives the same result as
+        replaying the whole log on top of the whole snapshot. The caller should hold the lock while iterating.
+        Yields:
+            dict: The next habit record, in the order the habits were created.
+        """
+        yield from self._merged_records(list(self.log.read()) + self.pending)
+
+    def _merged_records(self, events):
+        deleted = {e["name"] for e in events if e.get("op") == "delete"}
+        check_offs = {}
+        for event in events:
+            if event.get("op") == "check_off" and event["name"] not in deleted:
+                check_offs.setdefault(event["name"], []).append(event)
+
+        in_snapshot = set()
+        for record in self._snapshot_records():
+            name = record["name"]
+            in_snapshot.add(name)
+            if name in deleted:
+                continue
+            for event in check_offs.get(name, ()):
+                apply_event({name: record}, event)
+            yield record
+
+        # Habits created after the snapshot, or deleted from it (and maybe created again), come from the log alone.
+        created = {}
+        for event in events:
+            if event["name"] in deleted or event["name"] not in in_snapshot:
+                apply_event(created, event)
+        yield from created.values()
+
+    def _snapshot_records(self):
+        """
+        Streams the records of the snapshot.
+        Raises:
+            StoreCorruptedError: If the snapshot is not valid JSON. Going on with the event log alone would make the
+            next compaction overwrite the habits of the snapshot.
+        """
+        try:
+            yield from iter_habit_records(self.path)
+        except json.JSONDecodeError as e:
+            raise StoreCorruptedError(f"{self.path} is not valid JSON ({e}). It was left unchanged.") from e
+
+    def _read(self):
+        """
+        Reads the snapshot and replays the event log on top of it.
+        Returns:
+            dict: name -> habit record, in the order the habits were created.
+        """
+        return {h["name"]: h for h in self.iter_records()}
+
+    def _state(self):
+        with self.lock:
+            return self.cache.get(self._read)
+
+    def load_all(self):
+        return list(self._state().values())
+
+    def get(self, name):
+        return self._state().get(name)
+
+    def contains(self, name):
+        return name in self._state()
+
+    def replace_all(self, habits):
+        with self.lock:
+            self._replace_snapshot(habits)
+            self.cache.update({h["name"]: h for h in habits})
+
+    def add(self, record):
+        with self.lock:
+            if self.contains(record["name"]):
+                return
+            self._record([{"op": "create", "name": record["name"], "habit": record}])
+
+    def record_check_offs(self, check_offs, defer=False):
+        with self.lock:
+            self._record([{"op": "check_off", "name": name, "ts": ts, "streak": streak}
+                          for name, ts, streak in check_offs], defer)
+
+    def flush(self):
+        with self.lock:
+            count = len(self.pending)
+            if count:
+                self._record([])
+            return count
+
+    def delete(self, name):
+        with self.lock:
+            if self.contains(name):
+                self._record([{"op": "delete", "name": name}])
+
+    def compact(self, background=False):
+        """
+        Writes the current state into the snapshot and empties the event log. The records are streamed from the old
+        snapshot into the new one, so compaction does not need the whole store in memory.
+
+        With "background" (the worker of "compaction.py") the lock is not held while the new snapshot is built, so
+        other threads and programs go on writing in the meantime. The snapshot is built from the events that were in the
+        log when it started, and the lock is only taken again for the rename and to remove these events from the front
+        of the log. If the snapshot was replaced in the meantime (by another compaction) the new one is thrown away.
+        Args:
+            background (bool): True to build the snapshot without holding the lock.
+        """
+        if not background:
+            with self.lock:
+                fresh = self.cache.is_fresh()
+                self._replace_snapshot(self.iter_records())
+                if fresh:
+                    self.cache.update(self.cache.value)
+                else:
+                    self.cache.invalidate()
+            return
+
+        with self.lock:
+            snapshot = FileSignatureCache([self.path]).current_signature()
+            logged = self.log.size()
+        if logged == 0:
+            return
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        state = {}
+
+        def swap():
+            # Called when the new snapshot is on the disk: takes the lock for the rename and keeps it until the
+            # compacted events are removed from the log.
+            self.lock.acquire()
+            state["locked"] = True
+            if FileSignatureCache([self.path]).current_signature() != snapshot:
+                raise _SnapshotReplaced()
+            state["fresh"] = self.cache.is_fresh()
+            state["before"] = self.cache.current_signature()
+            self.journal.begin({"op": "replace", "temp": temp_path, "logged": logged, "log_size": self.log.size()})
+
+        try:
+            write_habit_records(self.path, self._merged_records(list(self.log.read(until=logged))),
+                                before_replace=swap, temp_path=temp_path)
+            self.log.drop_prefix(logged)
+            self.journal.end()
+            if state["fresh"]:
+                self.cache.update(self.cache.value)
+            else:
+                self.cache.invalidate()
+            for listener in self.listeners:
+                listener(state["before"])
+        except _SnapshotReplaced:
+            os.remove(temp_path)
+        finally:
+            if state.get("locked"):
+                self.lock.release()
+
+    def _replace_snapshot(self, records):
+        """
+        Writes a new snapshot and empties the event log, as one operation: the journal is written once the new
+        snapshot is complete on the disk, just before it is renamed into place. If the program stops after that, the
+        rename and the emptying of the log are done by recover(), so the events already in the new snapshot are never
+        applied a second time.
+        """
+        temp_path = self.path + ".tmp"
+        write_habit_records(self.path, records,
+                            before_replace=lambda: self.journal.begin({"op": "replace", "temp": temp_path}))
+        self.pending.clear()
+        # The deferred events are part of the new snapshot.
+        self.log.clear()
+        self.journal.end()
+
+    def _finish(self, entry):
+        if entry["op"] == "replace":
+            if os.path.exists(entry["temp"]):
+                os.replace(entry["temp"], self.path)
+            if "logged" not in entry:
+                self.log.clear()
+            elif self.log.size() == entry["log_size"]:
+                # A background compaction: the events it wrote into the snapshot are still at the front of the log.
+                self.log.drop_prefix(entry["logged"])
+            self.cache.invalidate()
+        else:
+            super()._finish(entry)
+
+    def _record(self, events, defer=False):
+        """
+        Appends the events to the log, together with the deferred ones, and applies them to the cached habits. If the
+        files were changed by someone else in the meantime the cache is dropped instead and the habits are read again
+        next time. The log is compacted (see "compaction.py") once it has grown past "compact_after" events. With
+        "defer" the events are only kept in "pending" (and applied to the cache) until the next write.
+        """
+        fresh = self.cache.is_fresh()
+        if defer:
+            self.pending.extend(events)
+        else:
+            self.log.extend(self.pending + events)
+            self.pending = []
+        if fresh:
+            state = self.cache.value
+            for event in events:
+                apply_event(state, event)
+            self.cache.update(state)
+        else:
+            self.cache.invalidate()
+        if not defer and len(self.log) >= self.compact_after:
+            compaction.request(self)
@@ -0,0 +1,176 @@
+import sqlite3
+import sys
+import instrumentation
+from db import durability
+from db.journal import Journal
+from db.locking import ShardLock
+from db.repository import HabitRepository, JsonRepository
+
+"""
+This file contains the SQLite backend of the storage. The habits and their log ins are kept in two separate tables, and
+the log ins are indexed on (habit_name, day), so looking up the history of one habit does not read the history of all
+the others. It also contains migrate_json_to_sqlite(), which imports the existing "habits.json" into a database.
+"""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS habits (
+    name TEXT PRIMARY KEY,
+    periodicity TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    streak INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_habits_periodicity ON habits (periodicity);
+CREATE TABLE IF NOT EXISTS log_ins (
+    id INTEGER PRIMARY KEY,
+    habit_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    logged_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_log_ins_habit_day ON log_ins (habit_name, day);
+"""
+# A row of log_ins without "logged_at" is a day from "days_list" that has no matching log in.
+
+SYNCHRONOUS = {"always": "FULL", "group": "NORMAL", "never": "OFF"}
+# SQLite's own setting for how often it waits for the disk, for each durability mode of "durability.py".
+
+
+class SqliteRepository(HabitRepository):
+    """
+    The SQLite backend, built on Python's sqlite3 module.
+    """
+
+    indexes_periodicity = True
+    # names_by_periodicity() uses idx_habits_periodicity.
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The database file (":memory:" also works).
+        """
+        self.path = path
+        self.journal = Journal(None if path == ":memory:" else path + ".journal.json")
+        # Only used for the operations that also change the catalog, SQLite's transactions cover the rest.
+        self.lock = ShardLock(None if path == ":memory:" else path + ".lock", on_acquire=self.recover)
+        # The connection is shared by the threads of the program, the lock makes sure one thread uses it at a time.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(f"PRAGMA synchronous = {SYNCHRONOUS[durability.durability]}")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def data_files(self):
+        return [] if self.path == ":memory:" else [self.path]
+
+    def load_all(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT name FROM habits ORDER BY rowid").fetchall()
+            return [self.get(name) for (name,) in rows]
+
+    def get(self, name):
+        with self.lock:
+            return self._get(name)
+
+    def _get(self, name):
+        row = self.connection.execute(
+            "SELECT name, periodicity, created_at, streak FROM habits WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        days = []
+        log_ins = []
+        for day, logged_at in self.connection.execute(
+                "SELECT day, logged_at FROM log_ins WHERE habit_name = ? ORDER BY day DESC, id", (name,)):
+            if not days or days[-1] != day:
+                days.append(day)
+            if logged_at is not None:
+                log_ins.append(logged_at)
+        log_ins.sort()
+        if instrumentation.enabled:
+            instrumentation.count("hydrated")
+        return {
+            "name": row[0],
+            "periodicity": row[1],
+            "time of creation": row[2],
+            "streak": row[3],
+            "days_list": days,
+            "log_ins": log_ins
+        }
+
+    def contains(self, name):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM habits WHERE name = ?", (name,)).fetchone() is not None
+
+    def names_by_periodicity(self, periodicity):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name FROM habits WHERE periodicity = ? ORDER BY rowid", (periodicity,))
+            return [name for (name,) in rows]
+
+    def replace_all(self, habits):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM log_ins")
+            self.connection.execute("DELETE FROM habits")
+            for habit in habits:
+                self._insert(habit)
+
+    def add(self, record):
+        with self.lock, self.connection:
+            if not self.contains(record["name"]):
+                self._insert(record)
+
+    def record_check_offs(self, check_offs, defer=False):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO log_ins (habit_name, day, logged_at) VALUES (?, ?, ?)",
+                [(name, ts[:10], ts) for name, ts, _ in check_offs])
+            self.connection.executemany(
+                "UPDATE habits SET streak = ? WHERE name = ?",
+                [(streak, name) for name, _, streak in check_offs])
+
+    def delete(self, name):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM log_ins WHERE habit_name = ?", (name,))
+            self.connection.execute("DELETE FROM habits WHERE name = ?", (name,))
+
+    def _insert(self, habit):
+        """
+        Inserts one habit record and its history (must be called inside a transaction).
+        """
+        self.connection.execute(
+            "INSERT INTO habits (name, periodicity, created_at, streak) VALUES (?, ?, ?, ?)",
+            (habit["name"], habit["periodicity"], habit.get("time of creation", ""), habit.get("streak", 0)))
+        log_ins = habit.get("log_ins", [])
+        logged_days = {ts[:10] for ts in log_ins}
+        rows = [(habit["name"], ts[:10], ts) for ts in log_ins]
+        rows += [(habit["name"], d[:10], None) for d in set(habit.get("days_list", [])) if d[:10] not in logged_days]
+        self.connection.executemany("INSERT INTO log_ins (habit_name, day, logged_at) VALUES (?, ?, ?)", rows)
+
+
+def migrate_json_to_sqlite(json_path, db_path, log_path=None):
+    """
+    Imports the habits of the JSON store (the snapshot and its event log) into a SQLite database. Whatever was in the
+    database before is replaced.
+    Args:
+        json_path (str): The "habits.json" snapshot.
+        db_path (str): The SQLite database to create or overwrite.
+        log_path (str): The event log of the snapshot, by default the one next to it.
+    Returns:
+        int: The number of habits imported.
+    """
+    habits = JsonRepository(json_path, log_path).load_all()
+    repository = SqliteRepository(db_path)
+    try:
+        repository.replace_all(habits)
+    finally:
+        repository.close()
+    return len(habits)
+
+
+if __name__ == '__main__':
+    # Usage: python -m db.sqlite_repository [habits.json] [habits.sqlite3]
+    source = sys.argv[1] if len(sys.argv) > 1 else 'db/habits.json'
+    target = sys.argv[2] if len(sys.argv) > 2 else 'db/habits.sqlite3'
+    count = migrate_json_to_sqlite(source, target)
+    print(f"Imported {count} habits from {source} into {target}.")
@@ -1,8 +1,17 @@
-import json
-from models.habit import Habit
-from db.habit_names import habits as all_defined_habits
-# Renaming the habits list as predefined to prevent confusion in names.
-from datetime import datetime, date
+import atexit
+import os
+import re
+import threading
+import weakref
+import instrumentation
+from models.habit import Habit, HabitView
+from models.streak_memo import streak_memo
+from models.periodicity import normalize
+from db.event_log import make_empty_record
+from db.repository import JsonRepository, default_index_path
+from db.summary_index import SummaryIndex, empty_summary
+from db.catalog import HabitCatalog
+from datetime import datetime
 
 """
 This file contains the functions' management of the main tasks of the program: deleting a habit, appending a habit into the
@@ -12,214 +21,615 @@ from the "habit.py" file to calculate the streaks and correctly check off the ha
 """
 
 
-file_name = 'db/habits.json'
-habit_names_file = 'db/habit_names.py'
+file_name = os.environ.get("HABIT_TRACKER_FILE", 'db/habits.json')
+# A file name ending with ".jsonl" keeps the habits as compact JSON Lines (see "json_stream.py").
+catalog_file = 'db/habit_catalog.json'
 # Importing the two mains storage files where the habits data is stored.
+event_log_file = 'db/habits.events.jsonl'
+# Every change since the last compaction is appended here instead of rewriting "habits.json".
+sqlite_file = 'db/habits.sqlite3'
+# Used instead of the JSON files when the HABIT_TRACKER_BACKEND environment variable is "sqlite".
+COMPACT_AFTER_EVENTS = 500
+# Once a log has this many events it is folded back into "habits.json" (or the catalog), see "compaction.py".
+users_dir = os.environ.get("HABIT_TRACKER_USERS_DIR", 'db/users')
+# Every user (tenant) has a shard: its own folder here with its own habits, catalog and lock file.
+
+_repository = None
+_repository_is_default = True
+_catalog = None
+_shards = {}
+# user id -> (folder, repository, catalog)
+_shards_lock = threading.Lock()
+_indexes = weakref.WeakKeyDictionary()
+# repository -> its SummaryIndex
+_USER_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+write_behind = os.environ.get("HABIT_TRACKER_WRITE_BEHIND", "off") == "on"
+# With write-behind the check-offs are kept in memory and written together, see set_write_behind().
+FLUSH_AFTER_EVENTS = 100
+FLUSH_AFTER_SECONDS = 0.2
+_flush_timer = None
+_flush_lock = threading.Lock()
+
+
+def shard_folder(user_id):
+    """
+    Returns the folder of a user's shard. Only letters, digits, "_", "-" and "." are allowed in a user id, so it can
+    not point outside of "users_dir".
+    Args:
+        user_id (str): The user (tenant) id.
+    Returns:
+        str: The folder.
+    """
+    if not isinstance(user_id, str) or not _USER_ID.match(user_id) or user_id in (".", ".."):
+        raise ValueError(f"Invalid user id: {user_id!r}")
+    return os.path.join(users_dir, user_id)
+
+
+def _has_shard(user_id):
+    # True for the single-user store and for a user whose folder exists. The reads of a user that was never written
+    # to give an empty answer without creating anything on the disk.
+    return user_id is None or os.path.isdir(shard_folder(user_id))
+
+
+def _create_shard(user_id):
+    # Creates the folder of a user, called by the functions that write into the store.
+    if user_id is not None:
+        os.makedirs(shard_folder(user_id), exist_ok=True)
+
+
+def _get_shard(user_id):
+    """
+    Returns the (folder, repository, catalog) of a user, made the first time the user is seen. The folder is not
+    created here, see _create_shard().
+    """
+    folder = shard_folder(user_id)
+    with _shards_lock:
+        shard = _shards.get(user_id)
+        if shard is None or shard[0] != folder:
+            if os.environ.get("HABIT_TRACKER_BACKEND", "json") == "sqlite":
+                from db.sqlite_repository import SqliteRepository
+                repository = SqliteRepository(os.path.join(folder, "habits.sqlite3"))
+            else:
+                repository = JsonRepository(os.path.join(folder, "habits.json"), compact_after=COMPACT_AFTER_EVENTS)
+            shard = (folder, repository, HabitCatalog(os.path.join(folder, "habit_catalog.json"), COMPACT_AFTER_EVENTS))
+            _shards[user_id] = shard
+    return shard
+
+
+def get_catalog(user_id=None):
+    """
+    Returns the habit catalog of "catalog_file" (or of the user's shard). It is loaded once and then kept in memory,
+    so adding or deleting a habit is seen immediately by the rest of the program.
+    Args:
+        user_id (str): The user, None for the single-user store in db/.
+    Returns:
+        HabitCatalog: The defined habits.
+    """
+    global _catalog
+    if user_id is not None:
+        return _get_shard(user_id)[2]
+    if _catalog is None or _catalog.path != catalog_file:
+        _catalog = HabitCatalog(catalog_file, COMPACT_AFTER_EVENTS)
+    return _catalog
+
+
+def set_repository(repository):
+    """
+    Makes the program use the given storage backend (for example a SqliteRepository) instead of the default one.
+    Passing None goes back to the default.
+    Args:
+        repository (HabitRepository): The backend to use.
+    """
+    global _repository, _repository_is_default
+    _repository = repository
+    _repository_is_default = repository is None
+
+
+def get_repository(user_id=None):
+    """
+    Returns the storage backend in use. By default it is the JSON store in "file_name" and "event_log_file", or the
+    SQLite database in "sqlite_file" if the HABIT_TRACKER_BACKEND environment variable says "sqlite". With a user id
+    it is the backend of that user's shard.
+    Args:
+        user_id (str): The user, None for the single-user store in db/.
+    Returns:
+        HabitRepository: The backend.
+    """
+    global _repository
+    if user_id is not None:
+        return _get_shard(user_id)[1]
+    if not _repository_is_default:
+        return _repository
+    if os.environ.get("HABIT_TRACKER_BACKEND", "json") == "sqlite":
+        from db.sqlite_repository import SqliteRepository
+        # sqlite3 is only imported when the SQLite backend is used, it is not needed to start the program.
+        if not isinstance(_repository, SqliteRepository) or _repository.path != sqlite_file:
+            _repository = SqliteRepository(sqlite_file)
+    elif (not isinstance(_repository, JsonRepository) or _repository.path != file_name
+          or _repository.log.path != event_log_file):
+        # The paths are checked every time so that changing "file_name" (as the tests do) is picked up.
+        _repository = JsonRepository(file_name, event_log_file, COMPACT_AFTER_EVENTS)
+    return _repository
+
+
+def get_summary_index(user_id=None):
+    """
+    Returns the summary index of the storage backend in use, saved next to it ("db/habits.summary.json"). An
+    in-memory database gets an index that is not saved.
+    Args:
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        SummaryIndex: The index.
+    """
+    repository = get_repository(user_id)
+    with _shards_lock:
+        index = _indexes.get(repository)
+        if index is None:
+            path = getattr(repository, "path", ":memory:")
+            index = SummaryIndex(None if path == ":memory:" else default_index_path(path), repository)
+            _indexes[repository] = index
+    return index
+
+
+def set_write_behind(enabled):
+    """
+    Turns the write-behind of check-offs on or off. When it is on, a check-off is kept in memory (the store and the
+    summary index both defer it) and this program sees it right away, but it is only written once "FLUSH_AFTER_EVENTS"
+    check-offs are waiting in a store or "FLUSH_AFTER_SECONDS" have passed, whichever comes first, with one append to
+    the event log and one save of the index for the whole group. flush() writes them at once, and it is called when the
+    program exits. Check-offs that were not written yet are lost if the program is killed, and other programs only see
+    them after the flush. Turning it off writes what is waiting.
+    Args:
+        enabled (bool): True to turn it on.
+    """
+    global write_behind
+    write_behind = enabled
+    if not enabled:
+        flush()
+
+
+def flush():
+    """
+    Writes the deferred check-offs of every store, one write per store.
+    Returns:
+        int: The number of check-offs written.
+    """
+    global _flush_timer
+    with _flush_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    with _shards_lock:
+        stores = list(_indexes.items())
+    written = 0
+    for repository, index in stores:
+        if not getattr(repository, "pending", None) and not index.dirty:
+            continue
+        # The stores without deferred check-offs are not locked, their files may not even exist any more.
+        try:
+            repository.lock.acquire()
+        except FileNotFoundError:
+            # The folder of the store was removed (a temporary store), there is nothing left to write into.
+            index.dirty = False
+            continue
+        try:
+            written += _flush_store(repository, index)
+        finally:
+            repository.lock.release()
+    return written
+
+
+def _flush_store(repository, index):
+    # Writes the deferred check-offs of one store and saves its index, with the store's lock held. The summaries in
+    # memory are only saved if no other program changed the store since they were made (checked before the deferred
+    # check-offs change the files), otherwise the index is built again from the store, which has both.
+    current = index.is_current()
+    written = repository.flush()
+    if index.dirty and not current:
+        index.rebuild()
+    else:
+        index.flush()
+    return written
+
+
+def _deferred(repository, index):
+    # Called after check-offs were deferred, with the store's lock held: writes them now if enough are waiting,
+    # otherwise makes sure a flush is coming.
+    global _flush_timer
+    if len(getattr(repository, "pending", ())) >= FLUSH_AFTER_EVENTS:
+        _flush_store(repository, index)
+        return
+    with _flush_lock:
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(FLUSH_AFTER_SECONDS, flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+atexit.register(flush)
+
+
+def cache_stats(user_id=None):
+    """
+    Returns the hit and miss counters of the habit cache, to check that the habits are not parsed again on every call.
+    Returns:
+        dict: {"hits": ..., "misses": ...}, empty for backends without a cache (SQLite).
+    """
+    if not _has_shard(user_id):
+        return {}
+    cache = getattr(get_repository(user_id), "cache", None)
+    return cache.stats() if cache is not None else {}
+
+
+def compact(user_id=None):
+    """
+    Folds the event log of the JSON store into "habits.json". Other backends do not need it.
+    """
+    if not _has_shard(user_id):
+        return
+    repository = get_repository(user_id)
+    if isinstance(repository, JsonRepository):
+        index = get_summary_index(user_id)
+        with repository.lock:
+            index.summaries()
+            repository.compact()
+            index.sync()
+
+
+def _new_record(name, periodicity):
+    return make_empty_record(name, normalize(periodicity), datetime.now().isoformat())
 
-def load_habits():
+
+def find_habit(habit_name, user_id=None):
+    """
+    Looks up a single habit without loading the others. Like load_habits(), it only knows the habits of the catalog
+    and stores the ones that are missing.
+    Args:
+        habit_name (str): The name of the habit.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        dict: The habit record or None.
+    """
+    if not _has_shard(user_id):
+        return None
+    periodicity = get_catalog(user_id).periodicity(habit_name)
+    if periodicity is None:
+        return None
+    repository = get_repository(user_id)
+    with repository.lock:
+        habit_data = repository.get(habit_name)
+        if habit_data is None:
+            habit_data = _new_record(habit_name, periodicity)
+            _add_record(repository, get_summary_index(user_id), habit_data)
+    return habit_data
+
+
+def _add_record(repository, index, record):
+    # Stores a new habit and its (empty) summary. The caller holds the lock. The index is saved with the next change
+    # that is not deferred (a check-off) or by flush(), so adding many habits does not write the whole index each time.
+    index.summaries()
+    repository.add(record)
+    index.put(record, defer=True)
+
+
+def habit_summary(habit_name, user_id=None):
+    """
+    Returns the summary of a habit from the summary index (see "summary_index.py"), without reading its log ins.
+    Args:
+        habit_name (str): The name of the habit.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        dict: The summary, or None if the habit is not in the catalog.
+    """
+    if not _has_shard(user_id):
+        return None
+    periodicity = get_catalog(user_id).periodicity(habit_name)
+    if periodicity is None:
+        return None
+    return get_summary_index(user_id).get(habit_name) or empty_summary(periodicity)
+
+
+def habit_summaries(user_id=None):
+    """
+    Returns the summaries of all the habits of the catalog, in the order of the catalog. A habit that was not stored
+    yet has an empty summary.
+    Args:
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        list: (habit name, summary) pairs.
+    """
+    if not _has_shard(user_id):
+        return []
+    summaries = get_summary_index(user_id).summaries()
+    return [(name, summaries.get(name) or empty_summary(periodicity))
+            for name, periodicity in get_catalog(user_id).items()]
+
+
+def habit_names_by_periodicity(periodicity, user_id=None):
+    """
+    Returns the names of the habits with the given periodicity, in the order of the catalog. The SQLite backend
+    answers the question with its index on the periodicity, for the JSON store the summary index answers it, so the
+    habits are never all loaded.
+    Args:
+        periodicity (str): The periodicity, see "periodicity.py".
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        list: The names of the habits.
+    """
+    periodicity = normalize(periodicity)
+    if not _has_shard(user_id):
+        return []
+    repository = get_repository(user_id)
+    if repository.indexes_periodicity:
+        stored = set(repository.names_by_periodicity(periodicity))
+        is_stored = repository.contains
+    else:
+        index = get_summary_index(user_id)
+        stored = set(index.names_by_periodicity(periodicity))
+        is_stored = index.summaries().__contains__
+    return [name for name, defined_periodicity in get_catalog(user_id).items()
+            if name in stored or (defined_periodicity == periodicity and not is_stored(name))]
+
+
+@instrumentation.instrumented
+def load_habits(user_id=None):
 
     """
     Uploading the habits' data from the JSON file as a list of dictionaries and saves them. If the habit exists in
-    "habit_names.py" but not in "habits.json", it adds it into both of the files.
+    the habit catalog but not in "habits.json", it adds it into the storage.
+    Args:
+        user_id (str): The user, None for the single-user store.
     Return:
         list: list of dictionaries habits with their attributes.
     """
 
 
-    try:
-        with open(file_name, 'r') as f:
-            stored_habits = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        stored_habits = []
+    if not _has_shard(user_id):
+        return []
+    repository = get_repository(user_id)
+    with repository.lock:
+        return _merge_with_catalog(repository, get_catalog(user_id), get_summary_index(user_id))
+
+
+def _merge_with_catalog(repository, catalog, index):
+    stored_habits = repository.load_all()
     # If the file does nto exist it gives an empty list.
     stored_habits_dict = {h["name"]: h for h in stored_habits}
     # This line of code looks complicated but what it does is it convert as list of stored habits into dict for quick
     # lookup by name.
     merged_habits = []
-    new_habits_added = False
-
-    for defined_habit in all_defined_habits:
-        habit_name = defined_habit.habit_name
-        periodicity = defined_habit.periodicity
 
+    for habit_name, periodicity in catalog.items():
         if habit_name in stored_habits_dict:
             habit_data = stored_habits_dict[habit_name]
             merged_habits.append(habit_data)
         else:
-            new_habit_data = {
-                "name": habit_name,
-                "periodicity": periodicity,
-                "time of creation": datetime.now().isoformat(),
-                "streak": 0,
-                "days_list": [],
-                "log_ins": []
-            }
+            new_habit_data = _new_record(habit_name, periodicity)
             merged_habits.append(new_habit_data)
-            new_habits_added = True
-
-    if new_habits_added:
-        save_habits(merged_habits)
+            _add_record(repository, index, new_habit_data)
 
     return merged_habits
 
 
-def save_habits(habits):
+@instrumentation.instrumented
+def save_habits(habits, user_id=None):
     """
-    Saves the renewed list into the JSON file.
+    Saves the renewed list into the storage, replacing what was there before.
     Args:
         habits (list): List of dictionaries representing habits.
+        user_id (str): The user, None for the single-user store.
     """
-    with open(file_name, 'w') as f:
-        json.dump(habits, f, indent=2)
+    _create_shard(user_id)
+    repository = get_repository(user_id)
+    with repository.lock:
+        repository.replace_all(habits)
+        get_summary_index(user_id).rebuild()
 
 
-def append_habit_to_json(new_habit: Habit):
+def append_habit_to_json(new_habit: Habit, user_id=None):
     """
-    Saves a new habit into the already existing list of habits. It uploads the information from the JSON file and
-    checks. If it does not the function creates a habit object, appends it to the list and saves the whole information
-    back to the JSON file.
+    Saves a new habit into the already existing list of habits. The repository checks whether the habit already
+    exists. If it does not, the habit is stored with an empty history (in the JSON store as a "create" event appended to
+    the event log).
     """
 
-    try:
-        with open(file_name, 'r') as f:
-            habits = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        habits = []
+    _create_shard(user_id)
+    repository = get_repository(user_id)
+    with repository.lock:
+        if not repository.contains(new_habit.habit_name):
+            record = _new_record(new_habit.habit_name, new_habit.periodicity)
+            _add_record(repository, get_summary_index(user_id), record)
 
-    existing_names = {h['name'] for h in habits}
 
-    if new_habit.habit_name in existing_names:
-        return
-
-    habit_dict = new_habit.to_dict()
-    habit_dict["streak"] = 0
-    habit_dict["days_list"] = []
-    habit_dict["log_ins"] = []
-    habit_dict["time of creation"] = datetime.now().isoformat()
-
-    habits.append(habit_dict)
-    save_habits(habits)
-
-
-def user_check_off(habit_name: str):
+@instrumentation.instrumented
+def user_check_off(habit_name: str, user_id=None):
     """
-    Checks off the habit which the user called. Finds the habit in the JSON file and it reconstructs the habit object,
-    then it calls the checked_off() method from "habit.py". Appends the log_ins list as well ad the days list (if needed).
+    Checks off the habit which the user called. Finds the habit in the storage and it reconstructs the habit object,
+    then it calls the checked_off() method from "habit.py". Only the new log in is written (in the JSON store as a
+    single "check_off" event), so the size of the history does not change the cost of the write.
     Prints a statement saying the habit has been checked off successfully.
 
     Args:
         habit_name, from the main.py menu()
+        user_id (str): The user, None for the single-user store.
     """
 
-    try:
-        with open(file_name, 'r') as f:
-            habits = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("No habits file found.")
-        return
-
-    found_index = None
-    habit_obj = None
-
-    for i, h in enumerate(habits):
-        if h.get("name") == habit_name:
-            found_index = i
-            # Creates once again the Habit objects from the JSON information.
-            habit_obj = Habit(h["name"], h["periodicity"])
-            habit_obj.created_at = h.get("time of creation", habit_obj.created_at)
-            habit_obj.log_ins = [datetime.fromisoformat(ts) for ts in h.get("log_ins", [])]
-            habit_obj.days_list = [date.fromisoformat(d) for d in h.get("days_list", [])]
-            break
-
-    if habit_obj is None:
-        print(f"Habit '{habit_name}' not found.")
-        return
-
-    habit_obj.checked_off()
-    # Recalculating the streak each time is safer than importing the streak value from JSON
-    # because the JSON file information is the last saved information therefore it could be
-    # outdated.
-    habit_obj.sort_days_only()
-    habit_obj.streaks()
-
-    updated = habit_obj.to_dict()
-    updated["time of creation"] = habits[found_index].get("time of creation", updated["time of creation"])
-    habits[found_index] = updated
-
-    with open(file_name, 'w') as f:
-        json.dump(habits, f, indent=2)
+    _create_shard(user_id)
+    repository = get_repository(user_id)
+    index = get_summary_index(user_id)
+    with repository.lock:
+        # The habit is read and written back while holding the lock of its shard, so a check-off at the same time
+        # (from another thread or program) can not be lost.
+        h = repository.get(habit_name)
+        if h is None:
+            print(f"Habit '{habit_name}' not found.")
+            return
+
+        # A lazy view of the stored habit: only the newest days are parsed, as far back as the streak goes.
+        habit_obj = HabitView(h)
+
+        new_log_in = habit_obj.checked_off()
+        # Recalculating the streak each time is safer than importing the streak value from JSON
+        # because the JSON file information is the last saved information therefore it could be
+        # outdated.
+        habit_obj.streaks()
+
+        if new_log_in is not None:
+            # checked_off() only adds a log in once a day, so there is nothing to store for a second check-off.
+            index.summaries()
+            repository.record_check_offs([(habit_name, new_log_in.isoformat(), habit_obj.current_streak)],
+                                         defer=write_behind)
+            index.record_days({habit_name: [new_log_in.toordinal()]}, defer=write_behind)
+            if write_behind:
+                _deferred(repository, index)
 
     print(f"Habit '{habit_name}' has been checked off!")
 
 
-def user_streaks(habit_or_name):
+@instrumentation.instrumented
+def user_check_off_many(check_offs, user_id=None):
     """
-    Updates the current streak of the habit. Recreated the Habit object and calls the streaks() method to savely updated
-    the streak corresponding today's date and knowing the previous information - the days and log ins lists.
+    Checks off many habits at once, for example a day's worth of check-offs imported from a tracker device. The
+    storage is read once, every event is applied, the streak is recalculated once for each habit that was touched,
+    and everything is written with a single write.
+    Args:
+        check_offs (iterable): (habit_name, timestamp) pairs, the timestamp is a datetime, an ISO string or None (now).
+            A timestamp with a time zone (for example "2025-07-01T06:00:00Z") is turned into local time.
+    Returns:
+        dict: "checked_off" (number of new log ins), "already_checked_off" (events for a day that was already logged),
+        "not_found" (names of habits that do not exist) and "invalid" (events whose timestamp could not be read, they
+        are skipped).
+    """
+
+    _create_shard(user_id)
+    repository = get_repository(user_id)
+    index = get_summary_index(user_id)
+    with repository.lock:
+        return _check_off_many(repository, index, check_offs)
+
+
+def _local_timestamp(timestamp):
+    # The timestamp of an imported check-off as a naive local datetime (the histories are kept in local time), None
+    # for now, or False if it can not be read.
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.strip())
+        except ValueError:
+            return False
+    if timestamp is None:
+        return None
+    if not isinstance(timestamp, datetime):
+        return False
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def _check_off_many(repository, index, check_offs):
+    touched = {}
+    # name -> (Habit object, new log ins)
+    result = {"checked_off": 0, "already_checked_off": 0, "not_found": [], "invalid": 0}
+
+    for habit_name, timestamp in check_offs:
+        timestamp = _local_timestamp(timestamp)
+        if timestamp is False:
+            result["invalid"] += 1
+            continue
+        if habit_name not in touched:
+            habit_data = repository.get(habit_name)
+            if habit_data is None:
+                if habit_name not in result["not_found"]:
+                    result["not_found"].append(habit_name)
+                continue
+            touched[habit_name] = (Habit.from_dict(habit_data), [])
+        habit_obj, new_log_ins = touched[habit_name]
+        new_log_in = habit_obj.checked_off(timestamp)
+        if new_log_in is None:
+            result["already_checked_off"] += 1
+        else:
+            new_log_ins.append(new_log_in)
+
+    entries = []
+    new_days = {}
+    for habit_name, (habit_obj, new_log_ins) in touched.items():
+        if new_log_ins:
+            streak = habit_obj.streaks()
+            entries.extend((habit_name, log_in.isoformat(), streak) for log_in in new_log_ins)
+            new_days[habit_name] = [log_in.toordinal() for log_in in new_log_ins]
+    if entries:
+        index.summaries()
+        repository.record_check_offs(entries, defer=write_behind)
+        index.record_days(new_days, defer=write_behind)
+        if write_behind:
+            _deferred(repository, index)
+    result["checked_off"] = len(entries)
+    return result
+
+
+def user_streaks(habit_or_name, user_id=None):
+    """
+    Updates the current streak of the habit. Creates a lazy view of the habit (HabitView) and calls the streaks() method
+    to savely updated the streak corresponding today's date and knowing the previous information - the days and log ins
+    lists. Only the days of the current streak are read, newest first, and the result is remembered (see
+    "streak_memo.py") until the history of the habit changes or today's day (or week) ends.
     Arg:
         habit_or_name:
+        user_id (str): The user, None for the single-user store.
     Returns:
         int: The updates streak as an integer.
     """
 
-    habits = load_habits()  # Calls the previous function in order to load the merged habits' data and saves it into a
-    # list called habit.
-
-
     if isinstance(habit_or_name, str):
-        habit_data = next((h for h in habits if h["name"] == habit_or_name), None)
+        habit_data = find_habit(habit_or_name, user_id)  # Only the habit that is asked for is loaded from the storage.
         if not habit_data:
             return 0
     else:
         habit_data = habit_or_name
 
-    # Recreate Habit object
-    habit_obj = Habit(habit_data["name"], habit_data.get("periodicity", "daily"))
-    habit_obj.created_at = habit_data.get("time of creation", habit_obj.created_at)
-    habit_obj.log_ins = [datetime.fromisoformat(ts) for ts in habit_data.get("log_ins", [])]
-    habit_obj.days_list = [datetime.fromisoformat(d) for d in habit_data.get("days_list", [])]
+    def calculate():
+        habit_obj = HabitView(habit_data)
+
+        # Always recalculate streak. Errors may arieses if we simply expect to get the streaks value from the JSON file.
+        # That it why the streaks should always be updated.
+        habit_obj.streaks()
+        return habit_obj.current_streak
 
-    # Always recalculate streak. Errors may arieses if we simply expect to get the streaks value from the JSON file. That it
-    # why the streaks should always be updated.
-    habit_obj.streaks()
-    return habit_obj.current_streak
+    return streak_memo.current_streak((user_id, habit_data["name"]), habit_data, calculate)
 
 
-def delete_habit(habit_name):
+def add_habit_to_catalog(name, periodicity, user_id=None):
     """
-    Deletes the habit that the user called from both files "habit_names.py" and "habits.json".
-    Arg: habit_name: From "main.py" menu().
+    Adds a habit to the habit catalog ("habit_catalog.json").
+    Parameters:
+        name (str): The name of the habit.
+        periodicity (str): The periodicity, see "periodicity.py".
+        user_id (str): The user, None for the single-user store.
     """
-    import json
-    from models.habit import Habit
-    from db import habit_names
-
-
-    updated_habits = []
-    for h in habit_names.habits:
-        # Rebuilding the "habit_names.py" file without the habit we want to delete.
-        name = h if isinstance(h, str) else h.habit_name
-        periodicity = "daily" if isinstance(h, str) else h.periodicity
-        if name != habit_name:
-            updated_habits.append(Habit(name, periodicity))
+    _create_shard(user_id)
+    with get_repository(user_id).lock:
+        get_catalog(user_id).add(name, normalize(periodicity))
 
-    with open("db/habit_names.py", "w") as f:
-        f.write("from models.habit import Habit\n\n")
-        f.write("habits = [\n")
-        for h in updated_habits:
-            f.write(f"    Habit('{h.habit_name}', '{h.periodicity}'),\n")
-        f.write("]\n")
 
-
-    try:
-        with open("db/habits.json", "r") as f:
-            habits = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        habits = []
-
-    habits = [h for h in habits if h["name"] != habit_name]
-
-    with open("db/habits.json", "w") as f:
-        json.dump(habits, f, indent=2)
-
-    print(f"Habit '{habit_name}' deleted from habit_names.py and habits.json successfully.")
+def delete_habit(habit_name, user_id=None):
+    """
+    Deletes the habit that the user called from both the habit catalog and the storage.
+    Arg: habit_name: From "main.py" menu().
+         user_id (str): The user, None for the single-user store.
+    """
+    _create_shard(user_id)
+    repository = get_repository(user_id)
+    index = get_summary_index(user_id)
+    with repository.lock:
+        catalog = get_catalog(user_id)
+        with repository.journal.operation({"op": "delete", "name": habit_name, "catalog": catalog.path}):
+            # The catalog and the store are two files. If the program stops between them, the journal entry makes
+            # the next program finish the delete instead of leaving the history of a habit that is not in the catalog.
+            catalog.remove(habit_name)
+            index.summaries()
+            repository.delete(habit_name)
+            index.remove(habit_name, defer=True)
+            # Saved later, like the index of a new habit (see _add_record()).
+        streak_memo.forget((user_id, habit_name))
+
+    print(f"Habit '{habit_name}' deleted from the habit catalog and habits.json successfully.")
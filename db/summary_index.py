@@ -0,0 +1,272 @@
+import json
+import instrumentation
+from datetime import date
+from db.cache import FileSignatureCache
+from db.durability import atomic_write
+from models.periodicity import day_number, next_run, period_number
+
+"""
+This file contains the summary index of the habits. For every habit it keeps what the analytics menu asks about: the
+periodicity, the state of the current streak, the longest streak, the first and last check-off and the number of
+check-offs, plus the names of the habits per periodicity. It is saved next to the store (for example
+"habits.summary.json") and updated on every check-off and delete, most of the time in constant time, so the analytics
+answers never read the log ins themselves.
+
+The index also remembers the signature (modification time and size) of the store files it describes. If the store was
+changed without going through the index (by another program, by hand or by an older version), the signatures differ
+and the index is built again from the store once. The same happens to an index written with other streak rules (an
+older VERSION).
+"""
+
+
+VERSION = 2
+# Version 2: the longest streak counts periods with the streak engine of "periodicity.py".
+
+
+def empty_summary(periodicity):
+    """
+    Returns:
+        dict: The summary of a habit that was never checked off.
+    """
+    return {"periodicity": periodicity, "count": 0, "first": None, "last": None, "longest_streak": 0, "run": 0,
+            "last_period": None}
+    # "run" and "last_period" are the state of the streak engine ("periodicity.py"), like in the Habit class.
+
+
+def add_day(summary, day):
+    """
+    Adds a check-off day that is newer than the last one, in constant time.
+    Args:
+        summary (dict): The summary, changed in place.
+        day (int): The day number.
+    Returns:
+        bool: False if the day is older than the last one, the summary then has to be built again with summarize().
+    """
+    if summary["last"] is not None:
+        last_day = date.fromisoformat(summary["last"]).toordinal()
+        if day <= last_day:
+            return day == last_day
+    else:
+        summary["first"] = date.fromordinal(day).isoformat()
+    summary["count"] += 1
+    summary["last"] = date.fromordinal(day).isoformat()
+
+    period = period_number(day, summary["periodicity"])
+    if period is not None and period != summary["last_period"]:
+        summary["run"] = next_run(summary["run"], summary["last_period"], period)
+        summary["last_period"] = period
+        summary["longest_streak"] = max(summary["longest_streak"], summary["run"])
+    return True
+
+
+def summarize(record):
+    """
+    Builds the summary of a habit from its whole history.
+    Args:
+        record (dict): The habit record (the layout of "habits.json").
+    Returns:
+        dict: The summary.
+    """
+    summary = empty_summary(record.get("periodicity", "daily"))
+    days = {day_number(d) for d in record.get("days_list") or []}
+    days.update(day_number(d) for d in record.get("log_ins") or [])
+    for day in sorted(days):
+        add_day(summary, day)
+    return summary
+
+
+def current_streak(summary, today=None):
+    """
+    Returns the current streak of a summary, the same value as Habit.streaks(): 0 unless the habit was checked off in
+    the current period (day, week, month, ...).
+    Args:
+        summary (dict): The summary.
+        today (int): The day number of today, by default the real today.
+    Returns:
+        int: The current streak.
+    """
+    if today is None:
+        today = date.today().toordinal()
+    period = period_number(today, summary["periodicity"])
+    if summary["last_period"] is None or summary["last_period"] != period:
+        return 0
+    return summary["run"]
+
+
+def _group_by_periodicity(data):
+    # Fills in the names of the habits per periodicity of an index, if they were not collected yet.
+    if data.get("by_periodicity") is None:
+        by_periodicity = {}
+        for name, summary in data["habits"].items():
+            by_periodicity.setdefault(summary["periodicity"], []).append(name)
+        data["by_periodicity"] = by_periodicity
+    return data["by_periodicity"]
+
+
+class SummaryIndex:
+    """
+    The persisted summaries of the habits of one store (repository).
+    """
+
+    def __init__(self, path, repository):
+        """
+        Args:
+            path (str): The index file, None to keep the index only in memory.
+            repository (HabitRepository): The store it describes.
+        """
+        self.path = path
+        self.repository = repository
+        self._cache = FileSignatureCache([path] if path is not None else [])
+        self._store = FileSignatureCache(repository.data_files())
+        # Only used for the signature of the store files.
+        self.dirty = False
+        # True while changes made with "defer" are not saved yet.
+        if hasattr(repository, "listeners"):
+            repository.listeners.append(self.compacted)
+
+    def _store_signature(self):
+        return [list(s) if s is not None else None for s in self._store.current_signature()]
+
+    def _read(self):
+        if self.path is None:
+            return {"store": None, "habits": {}, "by_periodicity": {}}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+                if instrumentation.enabled:
+                    instrumentation.count("bytes read", f.tell())
+                return data
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"store": None, "habits": {}, "by_periodicity": {}}
+
+    def _current(self):
+        # The index as it was before the store changed. If it was not loaded, it is built from the changed store,
+        # which already contains the change.
+        return self._cache.value if self._cache.value is not None else self._data()
+
+    def _data(self):
+        data = self._cache.value if self.dirty else self._cache.get(self._read)
+        # Changes that are not saved yet are only in memory, an index file written by another program in the meantime
+        # does not have them. If that program changed the store, the signatures differ and the index is built again.
+        if data.get("version") != VERSION or data.get("store") != self._store_signature():
+            data = self.rebuild()
+        return data
+
+    def summaries(self):
+        """
+        Returns:
+            dict: habit name -> summary, in the order the habits were created. It must not be modified by the caller.
+        """
+        return self._data()["habits"]
+
+    def get(self, name):
+        """
+        Returns:
+            dict: The summary of the habit, or None if it is not stored.
+        """
+        return self._data()["habits"].get(name)
+
+    def names_by_periodicity(self, periodicity):
+        """
+        Returns:
+            list: The names of the stored habits with the given periodicity.
+        """
+        return _group_by_periodicity(self._data()).get(periodicity, [])
+
+    def rebuild(self):
+        """
+        Builds the whole index again from the store.
+        Returns:
+            dict: The new index.
+        """
+        with self.repository.lock:
+            return self._save({record["name"]: summarize(record) for record in self.repository.load_all()})
+
+    def record_days(self, new_days, defer=False):
+        """
+        Updates the index after check-offs were stored. Like put() and remove(), it expects summaries() to have been
+        called before the store was changed (with the store's lock held), so the index was up to date.
+        Args:
+            new_days (dict): habit name -> the day numbers of its new check-offs.
+            defer (bool): True when the check-offs were deferred by the store, the index is then saved by flush().
+        """
+        habits = self._current()["habits"]
+        for name, days in new_days.items():
+            summary = habits.get(name)
+            if summary is None or not all(add_day(summary, day) for day in sorted(days)):
+                # An older day changes the streaks of the past, the habit is summarized again.
+                record = self.repository.get(name)
+                if record is not None:
+                    habits[name] = summarize(record)
+        self._save(habits, defer)
+
+    def put(self, record, defer=False):
+        """
+        Updates the index after a habit was stored or replaced.
+        Args:
+            record (dict): The habit record.
+            defer (bool): True to save the index with the next flush() instead of now.
+        """
+        habits = self._current()["habits"]
+        habits[record["name"]] = summarize(record)
+        self._save(habits, defer)
+
+    def remove(self, name, defer=False):
+        """
+        Updates the index after a habit was deleted.
+        Args:
+            name (str): The name of the habit.
+            defer (bool): True to save the index with the next flush() instead of now.
+        """
+        habits = self._current()["habits"]
+        habits.pop(name, None)
+        self._save(habits, defer)
+
+    def sync(self):
+        """
+        Records that the store files changed without changing the habits (after a compaction).
+        """
+        self._save(self._current()["habits"])
+
+    def is_current(self):
+        """
+        Returns:
+            bool: True if the summaries in memory were made from the store files as they are now, False if another
+            program changed the store since (its changes are then missing from them).
+        """
+        data = self._cache.value
+        return data is not None and data.get("store") == self._store_signature()
+
+    def compacted(self, before):
+        """
+        Called by the store after a background compaction rewrote its files without changing the habits. An index
+        that was up to date keeps its summaries and only takes the new signature, instead of being built again.
+        Args:
+            before (tuple): The signature of the store files before the compaction.
+        """
+        data = self._cache.value
+        if data is not None and data.get("store") == [list(s) if s is not None else None for s in before]:
+            self._save(data["habits"], defer=self.dirty)
+
+    def flush(self):
+        """
+        Saves the changes made with "defer", after the store wrote its deferred check-offs.
+        """
+        if self.dirty:
+            self._save(self._current()["habits"])
+
+    def _save(self, habits, defer=False):
+        data = {"version": VERSION, "store": self._store_signature(), "habits": habits, "by_periodicity": None}
+        # The names per periodicity are only collected when they are asked for or saved, so a deferred change costs
+        # the same whatever the number of habits.
+        # The signature is the one of the files as they are now. flush() saves the index again with the signature of the
+        # files after the deferred check-offs were written.
+        self.dirty = defer and self.path is not None
+        if self.path is None or defer:
+            self._cache.update(data)
+            return data
+        _group_by_periodicity(data)
+        atomic_write(self.path, lambda f: json.dump(data, f, separators=(",", ":")), sync=False)
+        # The index can always be built again from the store, so it is not worth an fsync on every check-off.
+        self._cache.update(data)
+        return data
@@ -0,0 +1,125 @@
+import atexit
+import os
+import sys
+import time
+from functools import wraps
+
+"""
+This file contains the optional instrumentation of the hot paths of the program (loading, saving and checking off
+habits, the streak and analytics calculations). It is switched on with the HABIT_TRACKER_PROFILE environment variable:
+
+- "summary": every instrumented function records its number of calls, its total and longest time, and the bytes read,
+  bytes written and objects hydrated (habit records and events parsed from the files, Habit objects built) while it
+  ran. A table is printed when the program exits.
+- "cprofile": the same, and the whole program also runs under cProfile. Its statistics are saved when the program
+  exits, to be read with "python -m pstats".
+
+HABIT_TRACKER_PROFILE_OUTPUT chooses the file (the table goes to the standard error by default, the cProfile data to
+"habit_tracker.prof"). When the variable is not set, instrumented() gives back the functions unchanged, so the
+instrumentation costs nothing; the counting in the storage is one "if instrumentation.enabled" per read or write.
+
+    HABIT_TRACKER_PROFILE=summary python main.py check-off coding
+"""
+
+
+MODES = ("summary", "cprofile")
+mode = os.environ.get("HABIT_TRACKER_PROFILE", "")
+if mode and mode not in MODES:
+    raise ValueError(f"HABIT_TRACKER_PROFILE should be one of {', '.join(MODES)}.")
+enabled = bool(mode)
+output = os.environ.get("HABIT_TRACKER_PROFILE_OUTPUT")
+
+counters = {"bytes read": 0, "bytes written": 0, "hydrated": 0}
+# Running totals of the whole program, the instrumented functions record how much they grew during each call.
+_stats = {}
+# function name -> [calls, total seconds, longest seconds, bytes read, bytes written, hydrated]
+_profile = None
+
+
+def count(counter, amount=1):
+    """
+    Adds to one of the counters. The callers check "enabled" first, so nothing is counted when it is switched off.
+    Args:
+        counter (str): "bytes read", "bytes written" or "hydrated".
+        amount (int): How much to add.
+    """
+    counters[counter] += amount
+
+
+def instrumented(function):
+    """
+    Decorates a function so its calls are measured. Without HABIT_TRACKER_PROFILE the function is returned as it is.
+    Args:
+        function (function): The function to measure.
+    Returns:
+        function: The measured function.
+    """
+    if not enabled:
+        return function
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @wraps(function)
+    def measured(*args, **kwargs):
+        before = tuple(counters.values())
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            row = _stats.setdefault(name, [0, 0.0, 0.0, 0, 0, 0])
+            row[0] += 1
+            row[1] += elapsed
+            row[2] = max(row[2], elapsed)
+            for i, (old, new) in enumerate(zip(before, counters.values()), start=3):
+                row[i] += new - old
+            # A function called inside another one is counted in both, like the cumulative time of a profiler.
+
+    return measured
+
+
+def summary():
+    """
+    Returns:
+        dict: function name -> {"calls", "total_ms", "max_ms", "bytes read", "bytes written", "hydrated"}, for the
+        instrumented functions that were called.
+    """
+    return {name: {"calls": row[0], "total_ms": row[1] * 1000, "max_ms": row[2] * 1000, "bytes read": row[3],
+                   "bytes written": row[4], "hydrated": row[5]}
+            for name, row in _stats.items()}
+
+
+def report(file=None):
+    """
+    Prints the summary as a table, the functions that took longest first.
+    Args:
+        file: Where to print, the standard error by default.
+    """
+    file = file or sys.stderr
+    print(f"{'function':<48}{'calls':>8}{'total ms':>11}{'max ms':>9}{'read B':>11}{'written B':>11}"
+          f"{'hydrated':>10}", file=file)
+    rows = sorted(summary().items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    for name, r in rows:
+        print(f"{name:<48}{r['calls']:>8}{r['total_ms']:>11.2f}{r['max_ms']:>9.2f}{r['bytes read']:>11}"
+              f"{r['bytes written']:>11}{r['hydrated']:>10}", file=file)
+
+
+def _dump():
+    if _profile is not None:
+        _profile.disable()
+        path = output or "habit_tracker.prof"
+        _profile.dump_stats(path)
+        print(f"cProfile statistics saved in {path}", file=sys.stderr)
+        report()
+    elif output:
+        with open(output, 'w') as f:
+            report(f)
+    else:
+        report()
+
+
+if enabled:
+    if mode == "cprofile":
+        import cProfile
+        _profile = cProfile.Profile()
+        _profile.enable()
+    atexit.register(_dump)
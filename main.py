@@ -1,40 +1,29 @@
-from models.habit import Habit
-from db.habit_names import habits
-from db.storage_saver import append_habit_to_json, user_check_off, user_streaks, delete_habit
-import analytics.analytics as analytics
+import sys
 
+"""
+The entry point of the program. The modules are imported inside the functions that use them, so a scripted call such
+as "python main.py check-off coding" only loads the storage code it needs (not the menu, the analytics or argparse) and
+starts quickly. benchmarks/startup.py measures this.
+"""
 
 
 
-def add_habit_to_habit_names_file(name, periodicity):
-    """
-    Adds a habit to db/habit_names.py.
-
-    Parameters:
-        name (str): The name of the habit.
-        periodicity (str): Daily or weekly.
-    """
-    with open('db/habit_names.py', 'r') as f:
-        lines = f.readlines()
-    new_line = f"    Habit('{name}', '{periodicity}'),\n"
-
-    for i, line in enumerate(lines):
-        if line.strip() == ']':
-            lines.insert(i, new_line)
-            break
-
-    with open('db/habit_names.py', 'w') as f:
-        f.writelines(lines)
-
 
 def add_habit():
     """"
     Asks the user for the habit name and periodicity.
     """
+    from models.habit import Habit
+    from models.periodicity import is_valid, normalize
+    from db.storage_saver import add_habit_to_catalog, append_habit_to_json
+
     name = input("Habit name: ")
-    periodicity = input("Periodicity (daily/weekly): ")
+    periodicity = input("Periodicity (daily, weekly, monthly, every N days or weekdays like mon,wed,fri): ")
+    while not is_valid(periodicity):
+        periodicity = input("Unknown periodicity, try again: ")
+    periodicity = normalize(periodicity)
 
-    add_habit_to_habit_names_file(name, periodicity)
+    add_habit_to_catalog(name, periodicity)
     new_habit = Habit(name, periodicity)
     append_habit_to_json(new_habit)
     # The habit is created in memory, made into a dictionary and then imported into the JSON file.
@@ -42,12 +31,75 @@ def add_habit():
     print(f"Habit '{name}' ({periodicity}) added successfully!")
 
 
+def ask_date_range():
+    """
+    Asks for the first and last day of a window. An empty answer means the last 30 days.
+    Returns:
+        tuple: (first date, last date), or None if a date is not valid.
+    """
+    from datetime import date, timedelta
+
+    first = input("From (YYYY-MM-DD, empty for 30 days ago): ").strip()
+    last = input("To (YYYY-MM-DD, empty for today): ").strip()
+    try:
+        last = date.fromisoformat(last) if last else date.today()
+        first = date.fromisoformat(first) if first else last - timedelta(days=29)
+    except ValueError:
+        print("\n⚠️  Invalid date, use the YYYY-MM-DD format.")
+        return None
+    return first, last
+
+
+def date_range_report():
+    """
+    Prints the completion rate, the check-offs and the longest streak of every habit in a date window, and the habits
+    that were missed in their last period.
+    """
+    import analytics.ranges as ranges
+
+    window = ask_date_range()
+    if window is None:
+        return
+    print(f"\nFrom {window[0]} to {window[1]}:")
+    for row in ranges.window_report(*window):
+        print(f"- {row['name']}: {row['completion_rate']:.0%} done, {row['check_offs']} check-offs, "
+              f"longest streak {row['longest_streak']}")
+    missed = ranges.missed_last_period()
+    if missed:
+        print("\nMissed in the last period: " + ", ".join(missed))
+
+
+def period_counts():
+    """
+    Prints the number of check-offs of a habit per week or per month in a date window.
+    """
+    import analytics.ranges as ranges
+
+    habit_name = input("Habit name: ")
+    period = input("Per week or per month (week/month): ").strip() or "week"
+    if period not in ("week", "month"):
+        print("\n⚠️  Invalid option, try again.")
+        return
+    window = ask_date_range()
+    if window is None:
+        return
+    counts = ranges.counts_by_period(habit_name, window[0], window[1], period)
+    if counts is None:
+        print(f"Habit '{habit_name}' not found.")
+        return
+    for label, count in counts.items():
+        print(f"{label}: {count}")
+
+
 def menu():
     """
     This function represents the main CLI of the program. Displays the options that
     the user can choose from, as well as the analytics menu. Navigates the answer based
     on the choice of the user.
     """
+    from db.storage_saver import user_check_off, user_streaks, delete_habit, habit_summary
+    import analytics.analytics as analytics
+
     while True:
         print("\n" + "=" * 40)
         print("📋  Habit Tracker Menu")
@@ -80,13 +132,15 @@ def menu():
                 print("2. Habits by periodicity")
                 print("3. Longest streak overall")
                 print("4. Longest streak for a habit")
-                print("5. Exit Analytics Menu")
+                print("5. Report for a date range")
+                print("6. Check-offs per week or month")
+                print("7. Exit Analytics Menu")
                 choice = input("Choose an option: ")
 
                 if choice == '1':
                     analytics.all_habits()
                 elif choice == '2':
-                    p = input("Enter periodicity (daily/weekly): ")
+                    p = input("Enter periodicity (daily, weekly, monthly, ...): ")
                     habits = analytics.habits_by_periodicity(p)
                     # Filters between daily and weekly
                     if habits:
@@ -103,9 +157,15 @@ def menu():
                         print("No habits tracked yet.")
                 elif choice == '4':
                     h = input("Habit name: ")
-                    streak = analytics.longest_streak_habit(h)
-                    print(f"Longest streak for '{h}': {streak}")
+                    if habit_summary(h) is None:
+                        print(f"Habit '{h}' not found.")
+                    else:
+                        print(f"Longest streak for '{h}': {analytics.longest_streak_habit(h)}")
                 elif choice == '5':
+                    date_range_report()
+                elif choice == '6':
+                    period_counts()
+                elif choice == '7':
                     print("\nExiting Analytics Menu...")
                     break
                 else:
@@ -119,7 +179,126 @@ def menu():
         print("\n" + "-" * 40)
 
 
+def read_check_offs(lines):
+    """
+    Reads check-offs in CSV form, one "habit name,timestamp" per line. The timestamp is optional (it means now), and
+    empty lines and lines starting with "#" are skipped.
+    Args:
+        lines (iterable): The lines of the file.
+    Yields:
+        tuple: (habit_name, timestamp or None).
+    """
+    import csv
+
+    for row in csv.reader(lines):
+        if not row or not row[0].strip() or row[0].startswith("#"):
+            continue
+        timestamp = row[1].strip() if len(row) > 1 and row[1].strip() else None
+        yield row[0].strip(), timestamp
+
+
+def parse_check_off(argv):
+    """
+    Recognizes the most common scripted call, "[--user ID] check-off NAME...", without argparse, which is one of the
+    slowest modules to import. Anything else (help, import, mistakes) goes through argparse.
+    Args:
+        argv (list): The command line arguments without the program name.
+    Returns:
+        tuple: (user id or None, habit names), or None if the call has another form.
+    """
+    user_id = None
+    if len(argv) >= 2 and argv[0] == "--user":
+        user_id, argv = argv[1], argv[2:]
+    elif argv and argv[0].startswith("--user="):
+        user_id, argv = argv[0][len("--user="):], argv[1:]
+    if len(argv) < 2 or argv[0] != "check-off" or any(a.startswith("-") for a in argv[1:]):
+        return None
+    if user_id is not None and (not user_id or user_id.startswith("-")):
+        return None
+    return user_id, argv[1:]
+
+
+def cli(argv):
+    """
+    The non-interactive entry point, used instead of menu() when main.py is started with arguments:
+
+        python main.py check-off coding reading
+        python main.py import check_offs.csv      (or "-" to read from the standard input)
+        python main.py --user alice check-off coding
+
+    All the check-offs of one call are stored with a single write. With --user they go to that user's own store.
+    Args:
+        argv (list): The command line arguments without the program name.
+    Returns:
+        int: The exit code.
+    """
+    from db.storage_saver import user_check_off_many
+
+    fast = parse_check_off(argv)
+    if fast is not None:
+        user_id, habits = fast
+        if not _valid_user(user_id):
+            return 2
+        return _report(user_check_off_many(((name, None) for name in habits), user_id=user_id))
+
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py", description="Habit Tracker without the interactive menu.")
+    parser.add_argument("--user", help="the user whose habits are changed (default: the shared store in db/)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check_off_parser = commands.add_parser("check-off", help="check off one or more habits now")
+    check_off_parser.add_argument("habits", nargs="+")
+    import_parser = commands.add_parser("import", help="import check-offs from a CSV file (habit name,timestamp)")
+    import_parser.add_argument("file")
+    args = parser.parse_args(argv)
+    if not _valid_user(args.user):
+        return 2
+
+    if args.command == "check-off":
+        result = user_check_off_many(((name, None) for name in args.habits), user_id=args.user)
+    elif args.file == "-":
+        result = user_check_off_many(read_check_offs(sys.stdin), user_id=args.user)
+    else:
+        try:
+            with open(args.file, newline="") as f:
+                result = user_check_off_many(read_check_offs(f), user_id=args.user)
+        except OSError as e:
+            print(f"Can not read {args.file}: {e.strerror or e}", file=sys.stderr)
+            return 2
+    return _report(result)
+
+
+def _valid_user(user_id):
+    """
+    Checks the --user of the command line, an invalid one is reported on the standard error.
+    Args:
+        user_id (str): The user id, None for the shared store.
+    Returns:
+        bool: True if the user id can be used.
+    """
+    from db.storage_saver import shard_folder
+
+    if user_id is None:
+        return True
+    try:
+        shard_folder(user_id)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return False
+    return True
+
+
+def _report(result):
+    print(f"Checked off: {result['checked_off']}, already checked off: {result['already_checked_off']}")
+    for name in result["not_found"]:
+        print(f"Habit '{name}' not found.")
+    if result.get("invalid"):
+        print(f"Skipped {result['invalid']} check-off(s) with an invalid timestamp.")
+    return 1 if result["not_found"] or result.get("invalid") else 0
+
+
 if __name__ == '__main__':
-   menu()
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
+    menu()
 
 
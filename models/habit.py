@@ -1,4 +1,66 @@
+from array import array
+from bisect import bisect_left, insort
 from datetime import datetime, timedelta, date
+import instrumentation
+from models.periodicity import next_run, period_number
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_microseconds(moment):
+   """
+   Turns a (naive, local) datetime into the number of microseconds since 1970-01-01, exactly.
+   """
+
+
+   return (moment - _EPOCH) // _MICROSECOND
+
+
+def from_microseconds(value):
+   """
+   The inverse of to_microseconds().
+   """
+
+
+   return _EPOCH + timedelta(microseconds=value)
+
+
+def iso_window(items, first, last):
+   """
+   Returns the ISO days of a sorted list (newest first or oldest first) that lie between two
+   days, found with two binary searches on the strings, so the rest of the list is never
+   read or parsed. ISO strings sort the same way as the days they stand for.
+   Args:
+       items (list): ISO days or timestamps, sorted by day.
+       first (str): The first ISO day of the window.
+       last (str): The last ISO day of the window.
+   Returns:
+       list: The ISO days in the window, oldest first (a day can appear more than once).
+   """
+
+
+   n = len(items)
+   if n == 0 or first > last:
+       return []
+   oldest_first = items[0][:10] <= items[-1][:10]
+
+   def day_at(i):
+       # The i-th day in ascending order, whichever way the list is kept.
+       return items[i if oldest_first else n - 1 - i][:10]
+
+   def bound(day, after):
+       low, high = 0, n
+       while low < high:
+           middle = (low + high) // 2
+           if day_at(middle) < day or (after and day_at(middle) == day):
+               low = middle + 1
+           else:
+               high = middle
+       return low
+
+   return [day_at(i) for i in range(bound(first, False), bound(last, True))]
 
 
 class Habit:
@@ -7,157 +69,270 @@ class Habit:
    in Python. This class captures the essence of the habit, its periodicity, the time it
    was created, each log in, each date it was checked off, calculates the streaks and most
    importantly, it converts these attributes into a dictionary by the end of it.
+
+   The streak is kept up to date incrementally: every check-off updates the current run, the
+   longest run and the last active day/week in constant time. The whole history is only
+   scanned again after it was replaced (by assigning log_ins or days_list).
+
+   To keep long histories small, the days are stored as sorted arrays of day numbers
+   (date.toordinal()) and the log ins as a parallel array of microsecond timestamps. The
+   log_ins and days_list attributes still give lists of datetime and date objects.
+
+   Next to the arrays the habit keeps two hashed sets in sync with them: the days that have
+   a log in, and the active periods (days for daily habits, Monday based weeks for weekly
+   ones, months for monthly ones, ... see "periodicity.py"). A check-off finds out in O(1)
+   whether its day is already logged and whether its period is new, so a second check-off
+   of a day or a week never changes the streak state, and only a new period before the
+   last active one asks for a rebuild.
    """
 
 
+   __slots__ = ('habit_name', 'periodicity', 'created_at', 'current_streak', 'longest_streak',
+                '_days', '_login_days', '_login_stamps', '_login_set', '_periods', '_unmerged', '_run',
+                '_last_period', '_needs_rebuild')
+
+
    def __init__(self, habit_name: str, periodicity: str):
        """
        Initializes the habit object.
        Args:
            habit_name (str): name of the habit.
-           periodicity (str): periodicity of the habit (daily/weekly).
+           periodicity (str): periodicity of the habit (daily, weekly, monthly, "every N days" or
+           weekdays like "mon,wed,fri", see "periodicity.py").
        """
 
 
        self.habit_name = habit_name
        self.periodicity = periodicity
        self.created_at = datetime.now().isoformat()
-       self.log_ins = []
+       self._days = array('i')
+       # Sorted day numbers of days_list.
+       self._login_days = array('i')
+       self._login_stamps = array('q')
+       # Sorted log ins: the day number of each one and, at the same index, its timestamp.
+       self._login_set = set()
+       # The day numbers of _login_days.
+       self._periods = set()
+       # The active periods of the days and log ins (see period_number()).
+       self._unmerged = []
+       # Log in days not yet merged into _days by sort_days_only(), None when all of them have to be merged.
        self.current_streak = 0
-       self.days_list = []
+       self.longest_streak = 0
+       self._run = 0
+       # Length of the run of consecutive periods that ends with the last active period.
+       self._last_period = None
+       # Last active period: the day (daily habits), the week (weekly habits), ... as an integer.
+       self._needs_rebuild = False
 
 
-   def checked_off(self):
+   @classmethod
+   def from_dict(cls, habit_data):
        """
-       Checks off a habit and appends the log_ins list each time this habit is checked off.
+       Recreates a Habit object from its dictionary (the layout of "habits.json").
+       Args:
+           habit_data (dict): The stored habit.
+       Returns:
+           Habit: The habit with its history.
        """
 
 
-       current_time = datetime.now()
-       if current_time.date() not in [d.date() for d in self.log_ins]:
-           self.log_ins.append(current_time)
+       habit = cls(habit_data["name"], habit_data.get("periodicity", "daily"))
+       habit.created_at = habit_data.get("time of creation", habit.created_at)
+       habit._days = array('i', sorted({date.fromisoformat(d[:10]).toordinal()
+                                        for d in habit_data.get("days_list", [])}))
+       habit.log_ins = [datetime.fromisoformat(ts) for ts in habit_data.get("log_ins", [])]
+       # Set after the days, so the periods are indexed once.
+       if instrumentation.enabled:
+           instrumentation.count("hydrated")
+       return habit
 
 
-   def sort_days_only(self):
-       """
-       Organizes the log_ins list and exerts only singular days, creating a new list.
-       Returns:
-           list: A days list containing the log_ins dates (each date is mentioned only once).
-       """
+   @property
+   def log_ins(self):
+       return [from_microseconds(stamp) for stamp in self._login_stamps]
 
 
-       # Normalize all entries to date objects
-       normalized_days = []
-       for d in self.days_list:
+   @log_ins.setter
+   def log_ins(self, log_ins):
+       # A new history was imported, the streak state is rebuilt the next time it is needed.
+       stamps = sorted(to_microseconds(login) for login in log_ins)
+       self._login_stamps = array('q', stamps)
+       self._login_days = array('i', (from_microseconds(stamp).toordinal() for stamp in stamps))
+       self._login_set = set(self._login_days)
+       self._unmerged = None
+       self._index_periods()
+
+
+   @property
+   def days_list(self):
+       return [date.fromordinal(day) for day in reversed(self._days)]
+
+
+   @days_list.setter
+   def days_list(self, days_list):
+       days = set()
+       for d in days_list:
            if isinstance(d, datetime):
-               normalized_days.append(d.date())
+               days.add(d.date().toordinal())
            elif isinstance(d, date):
-               normalized_days.append(d)
+               days.add(d.toordinal())
            else:
                raise TypeError(f"Unexpected type in days_list: {type(d)}")
+       self._days = array('i', sorted(days))
+       self._index_periods()
 
 
-       self.days_list = sorted(normalized_days, reverse=True)
+   def _period_of(self, day):
+       """
+       Returns the period number of a day for this habit's periodicity, see period_number().
+       """
 
 
-       # Ensure all log_ins are accounted for
-       existing_days = set(self.days_list)
-       for login in self.log_ins:
-           login_day = login.date()
-           if login_day not in existing_days:
-               self.days_list.append(login_day)
-               existing_days.add(login_day)
+       return period_number(day, self.periodicity)
 
 
-       # Sort again after adding any missing days
-       self.days_list = sorted(self.days_list, reverse=True)
+   def _index_periods(self):
+       """
+       Builds the set of active periods again after the history was replaced. The streak
+       state is rebuilt from it the next time it is needed.
+       """
 
 
-       return self.days_list
+       periods = {self._period_of(day) for day in self._days}
+       periods.update(self._period_of(day) for day in self._login_days)
+       periods.discard(None)
+       self._periods = periods
+       self._needs_rebuild = True
 
 
-   def streaks(self):
+   def _extend_run(self, period):
        """
-       Calculates the streaks based on periodicity. A habit is broken automatically if it
-       is not checked off by the user in two or more consecutive days (and for weekly habits,
-       two or more consecutive days).
-       Returns:
-           int: The current streak length.
+       Adds a period after the last active one to the streak state.
        """
 
 
-       self.sort_days_only()  # Ensure days_list is clean and sorted
-       if not self.days_list:
-           self.current_streak = 0
-           return 0
+       self._run = next_run(self._run, self._last_period, period)
+       self._last_period = period
+       self.longest_streak = max(self.longest_streak, self._run)
 
 
-       today = datetime.now().date()
-       streak = 0
+   def _add_period(self, period):
+       """
+       Updates the streak state with the period of a new check-off in constant time.
+       """
 
 
-       # The daily streaks are separated from the weekly streaks calculations.
-       if self.periodicity == 'daily':
-           days = sorted(self.days_list, reverse=True)
-           last_day = days[0]
+       if period is None or period in self._periods:
+           # The period was already active, the runs stay the same.
+           return
+       self._periods.add(period)
+       if self._needs_rebuild:
+           # The state is rebuilt from the set later, so a long import costs a single rebuild.
+           return
+       if self._last_period is not None and period < self._last_period:
+           # A new period before the last active one changes runs in the past.
+           self._needs_rebuild = True
+       else:
+           self._extend_run(period)
 
 
-           # If last check-in was not today → streak reset
-           if (today - last_day).days > 0:
-               self.current_streak = 0
-               return 0
+   def rebuild(self):
+       """
+       Recomputes the streak state from the whole history, in one pass over the sorted periods.
+       """
 
 
-           streak = 1
-           for i in range(1, len(days)):
-               if (days[i - 1] - days[i]).days == 1:
-                   streak += 1
-               else:
-                   break
+       self._needs_rebuild = False
+       self._run = 0
+       self._last_period = None
+       self.longest_streak = 0
+       for period in sorted(self._periods):
+           self._extend_run(period)
 
 
-       # Weekly streaks calculation.
-       elif self.periodicity == 'weekly':
-           week_list = []
-           for d in self.days_list:
-               year_week = d.isocalendar()[:2]  # (year, week number)
-               if year_week not in week_list:
-                   week_list.append(year_week)
+   def checked_off(self, current_time=None):
+       """
+       Checks off a habit and appends the log_ins list each time this habit is checked off.
+       Args:
+           current_time (datetime): When the habit was done, by default now (imported
+           check-offs pass their own time).
+       Returns:
+           datetime: The new log in, or None if the habit was already checked off that day.
+       """
 
 
-           week_list.sort(reverse=True)
-           current_year, current_week, _ = today.isocalendar()
-           last_year, last_week = week_list[0]
+       if current_time is None:
+           current_time = datetime.now()
+       today = current_time.toordinal()
+       if today in self._login_set:
+           return None
+       self._login_set.add(today)
+       stamp = to_microseconds(current_time)
+       if not self._login_days or today > self._login_days[-1]:
+           self._login_days.append(today)
+           self._login_stamps.append(stamp)
+       else:
+           # An earlier day, its place is found with a binary search.
+           i = bisect_left(self._login_days, today)
+           self._login_days.insert(i, today)
+           self._login_stamps.insert(i, stamp)
+       if self._unmerged is not None:
+           self._unmerged.append(today)
+       self._add_period(self._period_of(today))
+       return current_time
+
+
+   @instrumentation.instrumented
+   def sort_days_only(self):
+       """
+       Organizes the log_ins list and exerts only singular days, creating a new list.
+       Returns:
+           list: A days list containing the log_ins dates (each date is mentioned only once).
+       """
 
 
-           # If no activity this week → streak reset
-           if (last_year, last_week) != (current_year, current_week):
-               self.current_streak = 0
-               return 0
+       # Ensure all log_ins are accounted for. The days are the same ones as before, so the
+       # streak state stays valid.
+       if self._unmerged is None:
+           if self._login_days:
+               self._days = array('i', sorted(set(self._days).union(self._login_days)))
+       else:
+           # Only the days checked off since the last call are merged, each with a binary search.
+           for day in self._unmerged:
+               i = bisect_left(self._days, day)
+               if i == len(self._days) or self._days[i] != day:
+                   self._days.insert(i, day)
+       self._unmerged = []
+       return self.days_list
 
 
-           streak = 1
-           for i in range(1, len(week_list)):
-               prev_year, prev_week = week_list[i - 1]
-               curr_year, curr_week = week_list[i]
+   @instrumentation.instrumented
+   def streaks(self):
+       """
+       Calculates the streaks based on periodicity. A habit is broken automatically if it
+       is not checked off by the user in two or more consecutive days (and for weekly habits,
+       two or more consecutive days). The periods come from "periodicity.py", so monthly,
+       "every N days" and weekday habits are counted the same way.
+       Returns:
+           int: The current streak length.
+       """
 
 
-               # Same year consecutive weeks
-               if prev_year == curr_year and prev_week - curr_week == 1:
-                   streak += 1
-               # Year rollover consecutive weeks
-               elif prev_year - curr_year == 1:
-                   weeks_in_prev_year = datetime(prev_year, 12, 28).isocalendar()[1]
-                   if prev_week == weeks_in_prev_year and curr_week == 1:
-                       streak += 1
-                   else:
-                       break
-               else:
-                   break
+       if self._needs_rebuild:
+           self.rebuild()
 
 
-       self.current_streak = streak
-       return streak
+       today_period = self._period_of(datetime.now().toordinal())
+
+
+       # If the last check-in was not today (or this week for weekly habits) → streak reset
+       if self._last_period is None or self._last_period != today_period:
+           self.current_streak = 0
+           return 0
+
+
+       self.current_streak = self._run
+       return self._run
 
 
    def to_dict(self):
@@ -173,7 +348,168 @@ class Habit:
            "periodicity": self.periodicity,
            "time of creation": self.created_at,
            "streak": self.current_streak,  # kept for JSON saving
-           "days_list": [d.isoformat() for d in self.days_list],
-           "log_ins": [dt.isoformat() for dt in self.log_ins]
+           "days_list": [date.fromordinal(day).isoformat() for day in reversed(self._days)],
+           "log_ins": [from_microseconds(stamp).isoformat() for stamp in self._login_stamps]
        }
 
+
+class HabitView:
+   """
+   A read-only, lazy view of a stored habit record (the layout of "habits.json"). Unlike
+   Habit.from_dict(), which parses the whole history, the view only parses the days a
+   question needs. The current streak is found by walking the history from the newest day
+   backward and stops as soon as the streak breaks, so it costs O(streak length) instead of
+   O(whole history).
+
+   The view relies on the order the storage keeps: "days_list" sorted (newest first or
+   oldest first) and "log_ins" in the order they were made. It never changes the record,
+   a new check-off is only remembered by the view until it is stored.
+   """
+
+
+   __slots__ = ('habit_name', 'periodicity', 'current_streak', '_record', '_new_log_ins', '_new_days')
+
+
+   def __init__(self, habit_data):
+       """
+       Args:
+           habit_data (dict): The stored habit.
+       """
+
+
+       self.habit_name = habit_data["name"]
+       self.periodicity = habit_data.get("periodicity", "daily")
+       self.current_streak = habit_data.get("streak", 0)
+       self._record = habit_data
+       self._new_log_ins = []
+       # Check-offs made through the view, not stored yet (ISO strings, oldest first).
+       self._new_days = set()
+       # The ISO days of _new_log_ins.
+       if instrumentation.enabled:
+           instrumentation.count("hydrated")
+
+
+   def _iter_newest_first(self, items):
+       # ISO days (the first ten characters) from the newest end of a sorted list.
+       if not items:
+           return
+       oldest_first = items[0][:10] <= items[-1][:10]
+       indices = range(len(items) - 1, -1, -1) if oldest_first else range(len(items))
+       for i in indices:
+           yield items[i][:10]
+
+
+   def iter_days(self):
+       """
+       Gives the days of the history newest first, each day once. The three sources (days,
+       log ins and new check-offs) are merged on their ISO strings, so nothing is parsed
+       here.
+       Yields:
+           str: The next ISO day.
+       """
+
+
+       sources = [(ts[:10] for ts in reversed(self._new_log_ins)),
+                  self._iter_newest_first(self._record.get("log_ins") or []),
+                  self._iter_newest_first(self._record.get("days_list") or [])]
+       heads = [next(source, None) for source in sources]
+       last = None
+       while True:
+           newest = max((h for h in heads if h is not None), default=None)
+           if newest is None:
+               return
+           for i, head in enumerate(heads):
+               if head == newest:
+                   heads[i] = next(sources[i], None)
+           if newest != last:
+               yield newest
+               last = newest
+
+
+   def has_log_in(self, day):
+       """
+       Tells whether the habit was checked off on a day. The log ins are sorted, so this is
+       a binary search on their ISO strings.
+       Args:
+           day (str): The ISO day.
+       Returns:
+           bool: True if there is a log in on that day.
+       """
+
+
+       if day in self._new_days:
+           return True
+       return bool(iso_window(self._record.get("log_ins") or [], day, day))
+
+
+   def days_between(self, first, last):
+       """
+       Returns the active days in a date window. Only the days inside the window are read,
+       the history is sliced with binary searches (see iso_window()).
+       Args:
+           first (date): The first day of the window.
+           last (date): The last day of the window.
+       Returns:
+           list: The day numbers (date.toordinal()) in the window, sorted, each day once.
+       """
+
+
+       first, last = first.isoformat(), last.isoformat()
+       days = set(iso_window(self._record.get("days_list") or [], first, last))
+       days.update(iso_window(self._record.get("log_ins") or [], first, last))
+       days.update(ts[:10] for ts in self._new_log_ins if first <= ts[:10] <= last)
+       return sorted(date.fromisoformat(day).toordinal() for day in days)
+
+
+   def checked_off(self, current_time=None):
+       """
+       Checks the habit off, like Habit.checked_off().
+       Args:
+           current_time (datetime): When the habit was done, by default now.
+       Returns:
+           datetime: The new log in, or None if the habit was already checked off that day.
+       """
+
+
+       if current_time is None:
+           current_time = datetime.now()
+       if self.has_log_in(current_time.date().isoformat()):
+           return None
+       insort(self._new_log_ins, current_time.isoformat())
+       self._new_days.add(current_time.date().isoformat())
+       return current_time
+
+
+   @instrumentation.instrumented
+   def streaks(self, today=None):
+       """
+       Calculates the current streak, with the same result as Habit.streaks(): the number of
+       consecutive active periods that end with today's day (or week), 0 if the habit was
+       not checked off in the current period.
+       Args:
+           today (date): By default the real today.
+       Returns:
+           int: The current streak length.
+       """
+
+
+       today = (today or date.today()).toordinal()
+       today_period = period_number(today, self.periodicity)
+       streak = 0
+       previous = None
+       if today_period is not None:
+           for day in self.iter_days():
+               period = period_number(date.fromisoformat(day).toordinal(), self.periodicity)
+               if previous is None:
+                   if period != today_period:
+                       break
+                   streak = 1
+               elif period == previous:
+                   continue
+               elif period == previous - 1:
+                   streak += 1
+               else:
+                   break
+               previous = period
+       self.current_streak = streak
+       return streak
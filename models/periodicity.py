@@ -0,0 +1,295 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+"""
+This file contains the periodicities of the habits and the one streak engine that all the streak calculations share
+(the Habit class, the lazy view, the summary index, the analytics, the vectorized and the parallel engines). A
+periodicity cuts the calendar into periods and gives every day the number of its period; consecutive periods have
+consecutive numbers, so a streak is simply a run of consecutive active period numbers. The numbers are found with
+integer arithmetic on the day number (date.toordinal()), which also works on whole NumPy arrays of day numbers.
+
+A periodicity is stored as a string:
+
+- "daily": every day is a period;
+- "weekly": calendar weeks, Monday to Sunday;
+- "monthly": calendar months;
+- "every N days", for example "every 3 days": blocks of N days, counted from 0001-01-01 (a Monday, so "every 7 days"
+  gives the same weeks as "weekly");
+- a set of weekdays, for example "mon,wed,fri" (three-letter abbreviations or full names like "monday"): every listed
+  weekday starts a period that lasts until the next listed weekday, so a check-off on a Tuesday still counts for
+  Monday.
+
+The spec of a parsed periodicity is its normal form ("Every 3  Days" -> "every 3 days", "Friday, mon" -> "mon,fri"),
+which is what the storage keeps (see normalize()), so the same periodicity is always stored as the same string.
+
+A new kind of periodicity is a subclass of Periodicity with parse(), period() and first_day(), added to SCHEDULES.
+"""
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+WEEKDAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+class Periodicity:
+    """
+    The base of the periodicities. Instances are shared (see get_periodicity()) and never changed.
+    """
+
+    __slots__ = ('spec',)
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Args:
+            spec (str): The stored periodicity, in lower case and without surrounding spaces.
+        Returns:
+            Periodicity: The periodicity with its spec in normal form, or None if the string is not of this kind.
+        """
+        raise NotImplementedError
+
+    def period(self, day):
+        """
+        Args:
+            day: A day number (date.toordinal()), or a NumPy array of day numbers.
+        Returns:
+            The number of the period the day belongs to (an array for an array).
+        """
+        raise NotImplementedError
+
+    def first_day(self, period):
+        """
+        Args:
+            period (int): A period number.
+        Returns:
+            int: The day number of the first day of the period.
+        """
+        raise NotImplementedError
+
+
+class Daily(Periodicity):
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, spec):
+        return cls(spec) if spec == "daily" else None
+
+    def period(self, day):
+        return day
+
+    def first_day(self, period):
+        return period
+
+
+class EveryNDays(Periodicity):
+    __slots__ = ('days',)
+
+    def __init__(self, spec, days):
+        super().__init__(spec)
+        self.days = days
+
+    @classmethod
+    def parse(cls, spec):
+        if spec == "weekly":
+            return cls(spec, 7)
+            # date(1, 1, 1) is a Monday, so this counts whole weeks from Monday to Sunday.
+        match = re.fullmatch(r"every\s+(\d+)\s+days?", spec)
+        if match is None or int(match.group(1)) < 1:
+            return None
+        days = int(match.group(1))
+        return cls(f"every {days} day" if days == 1 else f"every {days} days", days)
+
+    def period(self, day):
+        return (day - 1) // self.days
+
+    def first_day(self, period):
+        return period * self.days + 1
+
+
+class Monthly(Periodicity):
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, spec):
+        return cls(spec) if spec == "monthly" else None
+
+    def period(self, day):
+        # The year and month of the day without building a date (the "civil from days" algorithm, with years that
+        # start in March so the leap day is the last day of a year), as the number of months since January of year 0.
+        z = day + 305
+        # Days since 0000-03-01.
+        era = z // 146097
+        day_of_era = z - era * 146097
+        year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+        day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+        month_from_march = (5 * day_of_year + 2) // 153
+        return (era * 400 + year_of_era) * 12 + month_from_march + 2
+
+    def first_day(self, period):
+        year, month = divmod(period, 12)
+        return date(year, month + 1, 1).toordinal()
+
+
+class Weekdays(Periodicity):
+    __slots__ = ('starts',)
+
+    def __init__(self, spec, starts):
+        super().__init__(spec)
+        self.starts = starts
+        # The listed weekdays (0 is Monday), sorted.
+
+    @classmethod
+    def parse(cls, spec):
+        starts = set()
+        for name in spec.split(","):
+            name = name.strip()
+            if name in WEEKDAYS:
+                starts.add(WEEKDAYS.index(name))
+            elif name in WEEKDAY_NAMES:
+                starts.add(WEEKDAY_NAMES.index(name))
+            else:
+                # Only whole names: "month" or "sunny" are mistakes, not Monday or Sunday.
+                return None
+        starts = tuple(sorted(starts))
+        return cls(",".join(WEEKDAYS[start] for start in starts), starts)
+
+    def period(self, day):
+        week, weekday = divmod(day - 1, 7)
+        # The number of listed weekdays up to the day's weekday. sum() starts at 0, so it also counts NumPy booleans
+        # as integers. A day before the first listed weekday gets -1: the last period of the week before.
+        started = sum(weekday >= start for start in self.starts)
+        return week * len(self.starts) + started - 1
+
+    def first_day(self, period):
+        week, slot = divmod(period, len(self.starts))
+        return week * 7 + self.starts[slot] + 1
+
+
+SCHEDULES = [Daily, EveryNDays, Monthly, Weekdays]
+
+
+@lru_cache(maxsize=256)
+def get_periodicity(spec):
+    """
+    Parses a stored periodicity. The result is remembered, so this is cheap to call for every day.
+    Args:
+        spec (str): For example "daily", "monthly", "every 3 days" or "mon,wed,fri".
+    Returns:
+        Periodicity: The periodicity.
+    Raises:
+        ValueError: If the string is not a known periodicity.
+    """
+    normalized = spec.strip().lower() if isinstance(spec, str) else ""
+    for schedule in SCHEDULES:
+        periodicity = schedule.parse(normalized)
+        if periodicity is not None:
+            return periodicity
+    raise ValueError(f"Unknown periodicity {spec!r}: use daily, weekly, monthly, \"every N days\" or weekdays like "
+                     f"\"mon,wed,fri\".")
+
+
+def is_valid(spec):
+    """
+    Returns:
+        bool: True if the string is a known periodicity.
+    """
+    try:
+        get_periodicity(spec)
+    except ValueError:
+        return False
+    return True
+
+
+def day_number(d):
+    """
+    Args:
+        d: An ISO day or timestamp string, a date or a datetime.
+    Returns:
+        int: The day number (date.toordinal()).
+    """
+    if isinstance(d, str):
+        return date.fromisoformat(d[:10]).toordinal()
+    if isinstance(d, datetime):
+        return d.date().toordinal()
+    return d.toordinal()
+
+
+def normalize(spec):
+    """
+    Returns the form in which a periodicity is stored, so that for example "Mon, Wed" and "mon,wed" are the same habit
+    periodicity when the habits are listed by periodicity.
+    Args:
+        spec (str): The periodicity as it was typed.
+    Returns:
+        str: The normal form, or the string unchanged if it is not a known periodicity.
+    """
+    try:
+        return get_periodicity(spec).spec
+    except ValueError:
+        return spec
+
+
+def period_number(day, periodicity):
+    """
+    Turns a day number into the number of its period, consecutive periods have consecutive
+    numbers.
+    Args:
+        day (int): The day, as date.toordinal().
+        periodicity (str): The stored periodicity.
+    Returns:
+        int: The number of the period, None for an unknown periodicity.
+    """
+    try:
+        return get_periodicity(periodicity).period(day)
+    except ValueError:
+        return None
+
+
+def next_run(run, last_period, period):
+    """
+    The step of the streak engine: the length of the run after a new active period, newer than the last one.
+    Args:
+        run (int): The length of the run that ends with the last active period.
+        last_period (int): The last active period, None if there is none yet.
+        period (int): The new active period.
+    Returns:
+        int: The length of the run that ends with the new period.
+    """
+    if last_period is not None and period == last_period + 1:
+        return run + 1
+    return 1
+
+
+def streaks_of_days(days, periodicity, today=None):
+    """
+    Calculates the current and the longest streak of a history in one pass.
+    Args:
+        days (iterable): Day numbers, oldest first (a day can appear more than once).
+        periodicity (str): The stored periodicity.
+        today (int): The day number of today, by default the real today.
+    Returns:
+        tuple: (current streak, longest streak). The current streak is 0 unless the habit was checked off in today's
+        period; an unknown periodicity has no streaks.
+    """
+    try:
+        schedule = get_periodicity(periodicity)
+    except ValueError:
+        return 0, 0
+    run = longest = 0
+    last_period = None
+    periods = days if type(schedule) is Daily else map(schedule.period, days)
+    # A day is its own period for daily habits.
+    for period in periods:
+        if period == last_period:
+            continue
+        # next_run(), written out because this loop goes over whole histories.
+        run = run + 1 if last_period is not None and period == last_period + 1 else 1
+        last_period = period
+        if run > longest:
+            longest = run
+    today = date.today().toordinal() if today is None else today
+    current = run if last_period is not None and last_period == schedule.period(today) else 0
+    return current, longest
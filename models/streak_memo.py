@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from models.periodicity import period_number
+
+"""
+This file contains the memo of the streak calculations. A dashboard asks for the same streaks again and again while
+nothing changed, so the current and the longest streak of a habit are remembered together with:
+
+- the version of the habit's history, read in constant time from the stored record (its creation time, the number of
+  days and log ins and the newest and oldest of them). A check-off adds a day or a log in and a delete removes the
+  record, so both give a new version and the old answer is never used again;
+- for the current streak, today's period (the day for daily habits, the week for weekly ones, ...), so the answer
+  expires at midnight or when a new period starts.
+
+The memo is a bounded LRU: it keeps the habits used most recently and forgets the others. The version assumes that a
+history only changes through the storage (which adds or removes days); a history edited by hand so that its length
+and its first and last day stay the same is not noticed until forget() is called.
+"""
+
+
+def history_version(habit_data):
+    """
+    Returns a value that changes whenever the history of the habit changes, without reading the whole history.
+    Args:
+        habit_data (dict): The stored habit.
+    Returns:
+        tuple: The version.
+    """
+    days = habit_data.get("days_list") or []
+    log_ins = habit_data.get("log_ins") or []
+    return (habit_data.get("time of creation"), habit_data.get("periodicity"), len(days),
+            days[0] if days else None, days[-1] if days else None, len(log_ins), log_ins[-1] if log_ins else None)
+
+
+class StreakMemo:
+    """
+    Remembers the streaks of the most recently used habits. It can be used from several threads.
+    """
+
+    def __init__(self, max_habits=1024):
+        """
+        Args:
+            max_habits (int): The number of habits it remembers.
+        """
+        self.max_habits = max_habits
+        self._entries = OrderedDict()
+        # habit key -> {kind: (version, value)}, the least recently used habit first.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, habit_key, kind, version, compute):
+        """
+        Returns the remembered value, or calls compute() and remembers its result.
+        Args:
+            habit_key (tuple): Identifies the habit (for example the user and the name).
+            kind (str): "current" or "longest".
+            version (tuple): The history version, plus today's period for values that depend on the date.
+            compute (function): Calculates the value.
+        Returns:
+            The value.
+        """
+        with self._lock:
+            entry = self._entries.get(habit_key)
+            if entry is not None and kind in entry and entry[kind][0] == version:
+                self._entries.move_to_end(habit_key)
+                self.hits += 1
+                return entry[kind][1]
+            self.misses += 1
+        value = compute()
+        # Calculated without the lock, two threads may both calculate it the first time.
+        with self._lock:
+            self._entries.setdefault(habit_key, {})[kind] = (version, value)
+            self._entries.move_to_end(habit_key)
+            while len(self._entries) > self.max_habits:
+                self._entries.popitem(last=False)
+        return value
+
+    def current_streak(self, habit_key, habit_data, compute, today=None):
+        """
+        Returns the current streak of a habit, remembered until its history changes or today's period ends.
+        Args:
+            habit_key (tuple): Identifies the habit.
+            habit_data (dict): The stored habit.
+            compute (function): Calculates the current streak.
+            today (int): The day number of today, by default the real today.
+        Returns:
+            int: The current streak.
+        """
+        today = date.today().toordinal() if today is None else today
+        version = history_version(habit_data) + (period_number(today, habit_data.get("periodicity", "daily")),)
+        return self.lookup(habit_key, "current", version, compute)
+
+    def longest_streak(self, habit_key, habit_data, compute):
+        """
+        Returns the longest streak of a habit, remembered until its history changes.
+        """
+        return self.lookup(habit_key, "longest", history_version(habit_data), compute)
+
+    def forget(self, habit_key=None):
+        """
+        Forgets one habit, or everything without a key.
+        """
+        with self._lock:
+            if habit_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(habit_key, None)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of hits and misses and of remembered habits.
+        """
+        return {"hits": self.hits, "misses": self.misses, "habits": len(self._entries)}
+
+
+streak_memo = StreakMemo()
+# Shared by "storage_saver.py" and "analytics.py".
@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the server be started as "python server/http_server.py" from the project folder.
+
+import db.storage_saver as storage_saver
+from db import compaction
+import analytics.analytics as analytics
+from models.habit import Habit
+from models.periodicity import is_valid, normalize
+
+"""
+This file contains a small HTTP/JSON server, so the habit tracker can be used by other programs and by many clients at
+the same time instead of only through the input() menu. It is built on asyncio from the standard library. The storage
+functions read and write files, so they are run in a thread pool of a fixed size and never block the event loop.
+Check-offs that arrive at about the same time are collected and stored with one user_check_off_many() call, that is one
+write for the whole group. Start it with:
+
+    python -m server.http_server --port 8080
+
+The endpoints (the habit names are URL encoded, "?user=<id>" selects a user's own store):
+
+    POST /habits                           {"name": "...", "periodicity": "daily"}   adds a habit
+    POST /habits/<name>/check-off                                                    checks the habit off now
+    GET  /habits/<name>/streak                                                       the current streak
+    GET  /habits?periodicity=daily                                                   the habits with the periodicity
+    GET  /analytics/longest-streak                                                   the habit with the longest streak
+    GET  /analytics/longest-streak/<name>                                            the longest streak of one habit
+"""
+
+
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 100
+MAX_HEADER_BYTES = 16 * 1024
+# A request with more header lines or more bytes of headers is answered with 431.
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """
+    An error that is sent back to the client with its status code.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CheckOffBatcher:
+    """
+    Collects the check-offs of concurrent requests and stores them per user with a single user_check_off_many() call.
+    The first check-off of a group waits "delay" seconds for others to join it. While one group is being written, the
+    next one is collected.
+    """
+
+    def __init__(self, executor, delay=0.002):
+        """
+        Args:
+            executor: The thread pool that runs the storage functions.
+            delay (float): How long the first check-off of a group waits for others, in seconds.
+        """
+        self.executor = executor
+        self.delay = delay
+        self.batches = 0
+        self.check_offs = 0
+        self._pending = {}
+        # user id -> [(habit name, future)]
+        self._flushers = {}
+        # user id -> the task that writes the user's groups
+
+    async def check_off(self, habit_name, user_id=None):
+        """
+        Checks a habit off now, together with the other check-offs of the same moment.
+        Args:
+            habit_name (str): The name of the habit.
+            user_id (str): The user, None for the single-user store.
+        Returns:
+            bool: False if the habit does not exist.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(user_id, []).append((habit_name, future))
+        if user_id not in self._flushers:
+            self._flushers[user_id] = asyncio.ensure_future(self._flush(user_id))
+        return await future
+
+    async def _flush(self, user_id):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(self.delay)
+            while self._pending.get(user_id):
+                group = self._pending.pop(user_id)
+                try:
+                    result = await loop.run_in_executor(self.executor, storage_saver.user_check_off_many,
+                                                        [(name, None) for name, _ in group], user_id)
+                except Exception as e:
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.check_offs += len(group)
+                for name, future in group:
+                    if not future.done():
+                        future.set_result(name not in result["not_found"])
+        finally:
+            del self._flushers[user_id]
+
+
+class HabitServer:
+    """
+    The HTTP server. Every connection is served by its own coroutine and may send several requests (keep-alive).
+    """
+
+    def __init__(self, workers=4, batch_delay=0.002):
+        """
+        Args:
+            workers (int): Number of threads for the storage functions.
+            batch_delay (float): How long check-offs are collected before they are stored, in seconds.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habit-storage")
+        self.batcher = CheckOffBatcher(self.executor, batch_delay)
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """
+        Starts listening. Port 0 picks a free port, see "port" afterwards.
+        """
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+        return self
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+        storage_saver.flush()
+        # Check-offs deferred by write-behind are written before the server goes away.
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except ValueError:
+                    # readline() raises it for a line longer than the stream's limit (64 KiB).
+                    request_line = b"-"
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line."}, keep_alive=False)
+                    break
+                try:
+                    headers = await self._read_headers(reader)
+                except HttpError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                length = headers.get("content-length") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    # Also refuses a negative length, which readexactly() would not accept.
+                    await self._respond(writer, 400, {"error": "Invalid Content-Length."}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "The request body is too large."}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.handle(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except ValueError as e:
+                    status, payload = 400, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader):
+        # Reads the header lines up to the empty line. Too many of them, too many bytes or a line longer than the
+        # stream's limit are answered with 431 (HttpError) instead of dropping the connection without an answer.
+        headers = {}
+        count = size = 0
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HttpError(431, "A request header line is too long.")
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            count += 1
+            size += len(line)
+            if count > MAX_HEADERS or size > MAX_HEADER_BYTES:
+                raise HttpError(431, "The request headers are too large.")
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def handle(self, method, target, body):
+        """
+        Answers one request.
+        Args:
+            method (str): GET or POST.
+            target (str): The path with the query string.
+            body (bytes): The request body (JSON).
+        Returns:
+            tuple: (status code, JSON payload).
+        """
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        user_id = query.get("user", [None])[0]
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+
+        if parts == ["habits"]:
+            if method == "GET":
+                periodicity = query.get("periodicity", [None])[0]
+                if not is_valid(periodicity):
+                    raise HttpError(400, "Give a periodicity, for example ?periodicity=daily or ?periodicity=monthly.")
+                periodicity = normalize(periodicity)
+                names = await self._run(analytics.habits_by_periodicity, periodicity, user_id)
+                return 200, {"periodicity": periodicity, "habits": names}
+            if method == "POST":
+                data = self._json(body)
+                name, periodicity = data.get("name"), data.get("periodicity")
+                if not isinstance(name, str) or not name.strip() or not is_valid(periodicity):
+                    raise HttpError(400, "Give a habit \"name\" and a \"periodicity\" (daily, weekly, monthly, "
+                                         "\"every N days\" or weekdays like \"mon,wed,fri\").")
+                periodicity = normalize(periodicity)
+                await self._run(self._add_habit, name.strip(), periodicity, user_id)
+                return 201, {"name": name.strip(), "periodicity": periodicity}
+            raise HttpError(405, "Use GET or POST.")
+
+        if len(parts) == 3 and parts[0] == "habits" and parts[2] == "check-off":
+            if method != "POST":
+                raise HttpError(405, "Use POST.")
+            if user_id is not None:
+                storage_saver.shard_folder(user_id)
+                # An invalid user id is refused (ValueError) before it joins a group of check-offs.
+            if not await self.batcher.check_off(parts[1], user_id):
+                raise HttpError(404, f"Habit '{parts[1]}' not found.")
+            return 200, {"name": parts[1], "checked_off": True}
+
+        if len(parts) == 3 and parts[0] == "habits" and parts[2] == "streak":
+            if method != "GET":
+                raise HttpError(405, "Use GET.")
+            streak = await self._run(self._streak, parts[1], user_id)
+            if streak is None:
+                raise HttpError(404, f"Habit '{parts[1]}' not found.")
+            return 200, {"name": parts[1], "streak": streak}
+
+        if parts[:2] == ["analytics", "longest-streak"] and len(parts) <= 3:
+            if method != "GET":
+                raise HttpError(405, "Use GET.")
+            if len(parts) == 2:
+                name, streak = await self._run(analytics.longest_streak_all, user_id)
+                return 200, {"name": name, "longest_streak": streak}
+            found = await self._run(storage_saver.find_habit, parts[2], user_id)
+            if found is None:
+                raise HttpError(404, f"Habit '{parts[2]}' not found.")
+            streak = await self._run(analytics.longest_streak_habit, parts[2], user_id)
+            return 200, {"name": parts[2], "longest_streak": streak}
+
+        raise HttpError(404, f"Unknown path: {url.path}")
+
+    @staticmethod
+    def _json(body):
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HttpError(400, "The request body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise HttpError(400, "The request body should be a JSON object.")
+        return data
+
+    @staticmethod
+    def _add_habit(name, periodicity, user_id):
+        # The same two steps as add_habit() in "main.py".
+        storage_saver.add_habit_to_catalog(name, periodicity, user_id)
+        storage_saver.append_habit_to_json(Habit(name, periodicity), user_id)
+
+    @staticmethod
+    def _streak(name, user_id):
+        habit_data = storage_saver.find_habit(name, user_id)
+        if habit_data is None:
+            return None
+        return storage_saver.user_streaks(habit_data, user_id)
+
+
+async def serve(host, port, workers, batch_delay):
+    server = await HabitServer(workers, batch_delay).start(host, port)
+    print(f"Habit Tracker server listening on http://{host}:{server.port}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the habit tracker over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="threads for the storage functions")
+    parser.add_argument("--batch-delay", type=float, default=0.002,
+                        help="seconds check-offs are collected before one write")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="keep check-offs in memory and write them in groups (see storage_saver.set_write_behind)")
+    parser.add_argument("--background-compaction", action="store_true",
+                        help="compact the logs in a worker thread instead of in the request (see db/compaction.py)")
+    args = parser.parse_args(argv)
+    if args.write_behind:
+        storage_saver.set_write_behind(True)
+    if args.background_compaction:
+        compaction.set_background(True)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.batch_delay))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Lets the client be started as "python server/load_client.py" from the project folder.
+
+from benchmarks.hot_paths import percentile
+
+"""
+This file contains the load test client of "http_server.py". It opens a number of keep-alive connections and sends
+requests on all of them at the same time, a mix of check-offs and streak questions for the given habits, and reports
+the throughput and the latency percentiles:
+
+    python -m server.load_client --port 8080 --connections 50 --requests 20 coding reading
+"""
+
+
+async def request(reader, writer, method, path, payload=None):
+    """
+    Sends one request on an open connection and reads the answer.
+    Returns:
+        tuple: (status code, JSON payload).
+    """
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _connection(host, port, paths, timings, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for method, path in paths:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, method, path)
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, habit_names, connections=20, requests=20, user_id=None):
+    """
+    Sends connections x requests requests, every other one a check-off.
+    Args:
+        host (str): The server.
+        port (int): Its port.
+        habit_names (list): The habits that are checked off and asked about.
+        connections (int): Number of connections used at the same time.
+        requests (int): Number of requests per connection.
+        user_id (str): The user, None for the single-user store.
+    Returns:
+        dict: Number of requests, status counts, requests per second and latency percentiles in milliseconds.
+    """
+    suffix = f"?user={quote(user_id)}" if user_id else ""
+    timings = []
+    statuses = {}
+    plans = []
+    for c in range(connections):
+        plan = []
+        for r in range(requests):
+            name = quote(habit_names[(c + r) % len(habit_names)], safe="")
+            if r % 2 == 0:
+                plan.append(("POST", f"/habits/{name}/check-off{suffix}"))
+            else:
+                plan.append(("GET", f"/habits/{name}/streak{suffix}"))
+        plans.append(plan)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_connection(host, port, plan, timings, statuses) for plan in plans))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "statuses": statuses,
+        "requests_per_second": len(timings) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(timings, 0.50),
+        "p90_ms": percentile(timings, 0.90),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1] if timings else 0.0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the habit tracker HTTP server.")
+    parser.add_argument("habits", nargs="+", help="the habits to check off and ask about")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20, help="requests per connection")
+    parser.add_argument("--user", help="the user whose habits are used")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run_load(args.host, args.port, args.habits, args.connections, args.requests, args.user))
+    print(f"{result['requests']} requests, {result['requests_per_second']:.0f} requests/s, "
+          f"statuses {result['statuses']}")
+    print(f"p50 {result['p50_ms']:.2f} ms, p90 {result['p90_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+          f"max {result['max_ms']:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,38 @@
 import unittest # Imports the Python's framework with which the code is tested.
+from unittest import mock
 import os
 import sys # Helps navigate the paths.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from datetime import datetime, timedelta, date
-from models.habit import Habit
-from analytics.analytics import longest_streak_all, longest_streak_habit
+from models.habit import Habit, HabitView, iso_window
+from analytics.analytics import longest_streak_all, longest_streak_habit, _calculate_longest_streak
+from analytics.analytics import longest_streaks_columnar
+from analytics import vectorized
+from analytics import parallel
+from analytics import ranges
 from db.storage_saver import delete_habit
+import db.storage_saver as storage_saver
+from db.sqlite_repository import SqliteRepository, migrate_json_to_sqlite
+from db.repository import JsonRepository, StoreCorruptedError
+from db.catalog import HabitCatalog
+from db import compaction
+from db import durability
+from db import json_stream
+from db import columnar
+from db import summary_index
+from models.streak_memo import StreakMemo, streak_memo
+from models.periodicity import get_periodicity, normalize, streaks_of_days
+from benchmarks import hot_paths
+from benchmarks import startup
+from server.http_server import HabitServer
+from server import load_client
+import asyncio
+import json
+import tempfile
+import threading
+import subprocess
+import main
+import instrumentation
 
 
 class TestHabitTracking(unittest.TestCase):
@@ -16,11 +43,19 @@ class TestHabitTracking(unittest.TestCase):
     def setUp(self):
         """
         This function is called before each test is executed. It creates fake habits for the purpose of testing the program
-        instead of using the real ones and possibly damaging them.
+        instead of using the real ones and possibly damaging them. The storage is moved to a temporary folder, so the
+        tests never write into db/.
         """
         self.temp_file = "temp_habits.txt"
         with open(self.temp_file, "w") as f:
             f.write("Exercise\nRead\nMeditate\n#Comment line\n")
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_paths = (storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file)
+        storage_saver.catalog_file = os.path.join(self.temp_dir.name, "habit_catalog.json")
+        storage_saver.file_name = os.path.join(self.temp_dir.name, "habits.json")
+        storage_saver.event_log_file = os.path.join(self.temp_dir.name, "habits.events.jsonl")
+        storage_saver.add_habit_to_catalog("Exercise", "daily")
+        storage_saver.add_habit_to_catalog("Read", "weekly")
 
     def tearDown(self):
         """
@@ -28,6 +63,8 @@ class TestHabitTracking(unittest.TestCase):
         """
         if os.path.exists(self.temp_file):
             os.remove(self.temp_file)
+        storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file = self.saved_paths
+        self.temp_dir.cleanup()
 
     def test_delete_habit_exact_match(self):
         """
@@ -129,6 +166,64 @@ class TestHabitTracking(unittest.TestCase):
         self.assertIsInstance(streak, int)
         self.assertGreaterEqual(streak, 0)
 
+    def test_habit_incremental_streak(self):
+        """
+        Ensures that a check-off extends the streak of an imported history and keeps the longest streak.
+        """
+        habit = Habit("Exercise", "daily")
+        today = datetime.now().date()
+        habit.days_list = [today - timedelta(days=i) for i in range(1, 4)] + [today - timedelta(days=10 + i) for i in range(5)]
+        self.assertEqual(habit.streaks(), 0)
+        self.assertEqual(habit.longest_streak, 5)
+        habit.checked_off()
+        self.assertEqual(habit.streaks(), 4)
+        self.assertEqual(habit.longest_streak, 5)
+
+    def test_habit_weekly_streak_over_new_year(self):
+        """
+        Ensures that consecutive weeks across the end of a year are counted as one streak.
+        """
+        habit = Habit("Exercise", "weekly")
+        habit.days_list = [date(2020, 12, 30), date(2021, 1, 6), date(2021, 1, 12)]
+        habit.rebuild()
+        self.assertEqual(habit.longest_streak, 3)
+
+    def test_habit_backfill_matches_rebuild(self):
+        """
+        Ensures that check-offs in any order give the same days and streaks as building the habit from the whole
+        history, and that a second check-off of a day or a week changes nothing.
+        """
+        for periodicity, step in (("daily", 1), ("weekly", 7)):
+            habit = Habit("Exercise", periodicity)
+            habit.days_list = [date(2025, 1, 6) + timedelta(days=step * k) for k in range(20) if k % 4]
+            habit.sort_days_only()
+            habit.streaks()
+            for k in (16, 0, 8, 4, 12):
+                self.assertIsNotNone(habit.checked_off(datetime(2025, 1, 6, 9) + timedelta(days=step * k)))
+            self.assertIsNone(habit.checked_off(datetime(2025, 1, 6, 20)))
+            if periodicity == "weekly":
+                self.assertIsNotNone(habit.checked_off(datetime(2025, 1, 8, 9)))
+            days = habit.sort_days_only()
+            self.assertEqual(days, sorted(set(days), reverse=True))
+            rebuilt = Habit.from_dict(habit.to_dict())
+            rebuilt.rebuild()
+            habit.streaks()
+            self.assertEqual((habit.longest_streak, habit.days_list), (rebuilt.longest_streak, rebuilt.days_list))
+            self.assertEqual(habit.longest_streak, 20)
+
+    def test_habit_dict_round_trip(self):
+        """
+        Ensures that the array based history gives back the same days and log ins, and that the
+        habit has no per-instance __dict__.
+        """
+        habit_data = {"name": "Exercise", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00",
+                      "streak": 0, "days_list": ["2025-07-02", "2025-07-01"],
+                      "log_ins": ["2025-07-01T10:00:00.250000", "2025-07-02T09:30:00"]}
+        habit = Habit.from_dict(habit_data)
+        self.assertEqual(habit.to_dict(), habit_data)
+        self.assertEqual(habit.log_ins[0], datetime(2025, 7, 1, 10, 0, 0, 250000))
+        self.assertFalse(hasattr(habit, "__dict__"))
+
     def test_habit_to_dict(self):
         """
         Ensures that the to_dict() works properly and converts the information into a dictionary.
@@ -146,6 +241,1248 @@ class TestHabitTracking(unittest.TestCase):
         self.assertIn("days_list", d)
         self.assertIn("log_ins", d)
 
+    def test_habit_view_matches_habit(self):
+        """
+        Ensures that the lazy view gives the same streaks and check-off answers as the full Habit object, for days
+        kept newest first or oldest first.
+        """
+        today = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        for periodicity in ("daily", "weekly"):
+            for offsets in ([], [1, 2], [0, 1, 2, 4], [0, 6, 7, 14, 15, 30], [2, 3, 9, 10]):
+                moments = [today - timedelta(days=o) for o in sorted(offsets, reverse=True)]
+                newest_first = [m.date().isoformat() for m in moments]
+                for days in (newest_first, newest_first[::-1]):
+                    habit_data = {"name": "h", "periodicity": periodicity, "time of creation": "2025-07-01T10:00:00",
+                                  "streak": 0, "days_list": days, "log_ins": [m.isoformat() for m in moments]}
+                    view, habit = HabitView(habit_data), Habit.from_dict(habit_data)
+                    self.assertEqual(view.streaks(), habit.streaks())
+                    self.assertEqual(view.checked_off() is None, habit.checked_off() is None)
+                    self.assertEqual(view.streaks(), habit.streaks())
+                    self.assertEqual(habit_data["log_ins"], [m.isoformat() for m in moments])
+
+    def test_habit_view_reads_only_the_streak(self):
+        """
+        Ensures that the view stops at the end of the current streak: days older than that are never parsed, so
+        even an invalid one does not matter.
+        """
+        today = date.today()
+        days = ["2000-13-45"] + [(today - timedelta(days=i)).isoformat() for i in (3, 1, 0)]
+        habit_data = {"name": "h", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00", "streak": 0,
+                      "days_list": days, "log_ins": []}
+        self.assertEqual(HabitView(habit_data).streaks(), 2)
+        self.assertFalse(HabitView(habit_data).has_log_in(today.isoformat()))
+
+
+
+class TestPeriodicity(unittest.TestCase):
+    """
+    Tests the periodicities and the shared streak engine.
+    """
+
+    def test_periods_are_consecutive(self):
+        """
+        Ensures that every periodicity numbers its periods consecutively, that first_day() finds where each period
+        starts, that unknown periodicities (also words that only start like a weekday) are refused and that the known
+        ones are stored in one normal form.
+        """
+        first, last = date(2023, 12, 1).toordinal(), date(2025, 3, 31).toordinal()
+        for spec in ("daily", "weekly", "monthly", "every 3 days", "mon,wed,fri", "Sunday"):
+            schedule = get_periodicity(spec)
+            for day in range(first + 1, last):
+                gap = schedule.period(day) - schedule.period(day - 1)
+                self.assertIn(gap, (0, 1))
+                if gap:
+                    self.assertEqual(schedule.first_day(schedule.period(day)), day)
+        self.assertEqual(get_periodicity("monthly").period(date(2025, 2, 28).toordinal()), 2025 * 12 + 1)
+        # A Tuesday still belongs to the Monday of "mon,wed,fri".
+        schedule = get_periodicity("mon,wed,fri")
+        self.assertEqual(schedule.period(date(2025, 7, 8).toordinal()), schedule.period(date(2025, 7, 7).toordinal()))
+        for spec in ("fortnightly", "every 0 days", "mon,funday", None, "month", "months", "sunny", "satellite",
+                     "mon-fri", "mo,we"):
+            self.assertRaises(ValueError, get_periodicity, spec)
+        self.assertEqual(normalize("Friday, mon ,MON"), "mon,fri")
+        self.assertEqual(normalize(" Every 3  Days"), "every 3 days")
+        self.assertEqual(normalize("fortnightly"), "fortnightly")
+
+    def test_every_engine_agrees(self):
+        """
+        Ensures that the Habit class, the lazy view, the summary index, the analytics and the vectorized engine give
+        the same streaks for monthly, every-N-days and weekday habits.
+        """
+        today = date.today()
+        for spec, offsets in (("monthly", [0, 31, 62, 150, 181]), ("every 2 days", [0, 2, 4, 9]),
+                              ("mon,thu", [7, 14, 21])):
+            days = [today - timedelta(days=o) for o in offsets]
+            record = {"name": "h", "periodicity": spec, "time of creation": "2025-07-01T10:00:00", "streak": 0,
+                      "days_list": [d.isoformat() for d in days],
+                      "log_ins": [datetime.combine(d, datetime.min.time()).isoformat() for d in reversed(days)]}
+            ordinals = sorted(d.toordinal() for d in days)
+            found = streaks_of_days(ordinals, spec)
+            habit = Habit.from_dict(record)
+            summary = summary_index.summarize(record)
+            self.assertEqual((HabitView(record).streaks(), habit.streaks(), summary_index.current_streak(summary)),
+                             (found[0],) * 3)
+            self.assertEqual((habit.longest_streak, summary["longest_streak"], _calculate_longest_streak(record)),
+                             (found[1],) * 3)
+            self.assertGreater(found[1], 0)
+            if vectorized.HAS_NUMPY:
+                self.assertEqual(vectorized.longest_streak(vectorized.days_to_array(record["days_list"]), spec),
+                                 found[1])
+        self.assertEqual(streaks_of_days([1, 2, 3], "fortnightly"), (0, 0))
+
+
+@unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+class TestVectorizedAnalytics(unittest.TestCase):
+    """
+    Tests that the NumPy engine gives the same results as the pure-Python loops.
+    """
+
+    def setUp(self):
+        self.habits = [
+            {"name": "Exercise", "periodicity": "daily",
+             "days_list": ["2025-07-03", "2025-07-01", "2025-07-02", "2025-07-05", "2025-07-06"]},
+            {"name": "Read", "periodicity": "weekly",
+             "days_list": ["2025-06-01", "2025-06-08", "2025-06-20", "2025-07-20", "2025-07-25"]},
+            {"name": "Meditate", "periodicity": "daily", "days_list": ["2025-07-01"]},
+            {"name": "Walk", "periodicity": "daily", "days_list": []},
+        ]
+
+    def test_longest_streak_matches_python(self):
+        """
+        Ensures that the NumPy results are the same as _calculate_longest_streak().
+        """
+        expected = [_calculate_longest_streak(h) for h in self.habits]
+        self.assertEqual(expected, [3, 2, 1, 0])
+        single = [vectorized.longest_streak(vectorized.days_to_array(h["days_list"]), h["periodicity"])
+                  for h in self.habits]
+        self.assertEqual(single, expected)
+
+    def test_run_lengths(self):
+        """
+        Ensures that the run lengths behind the longest streak are correct.
+        """
+        days = vectorized.days_to_array(self.habits[0]["days_list"])
+        self.assertEqual(list(vectorized.run_lengths(days, "daily")), [3, 2])
+
+
+class TestEventLogStorage(unittest.TestCase):
+    """
+    Tests the append-only event log of the JSON store against a temporary folder, so the real files are not touched.
+    """
+
+    def setUp(self):
+        """
+        Points the storage files to a temporary folder.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_paths = (storage_saver.file_name, storage_saver.event_log_file)
+        storage_saver.file_name = os.path.join(self.temp_dir.name, "habits.json")
+        storage_saver.event_log_file = os.path.join(self.temp_dir.name, "habits.events.jsonl")
+
+    def tearDown(self):
+        """
+        Restores the real storage files and removes the temporary folder.
+        """
+        storage_saver.file_name, storage_saver.event_log_file = self.saved_paths
+        self.temp_dir.cleanup()
+
+    def test_check_off_appends_without_rewriting_snapshot(self):
+        """
+        Ensures that a check-off is stored as one event and the snapshot is left untouched.
+        """
+        storage_saver.save_habits([])
+        storage_saver.append_habit_to_json(Habit("Exercise", "daily"))
+        storage_saver.user_check_off("Exercise")
+        storage_saver.user_check_off("Exercise")
+
+        with open(storage_saver.file_name) as f:
+            self.assertEqual(json.load(f), [])
+        with open(storage_saver.event_log_file) as f:
+            ops = [json.loads(line)["op"] for line in f]
+        self.assertEqual(ops, ["create", "check_off"])
+
+        habit = storage_saver.get_repository().get("Exercise")
+        self.assertEqual(len(habit["log_ins"]), 1)
+        self.assertEqual(habit["days_list"], [datetime.now().date().isoformat()])
+        self.assertEqual(habit["streak"], 1)
+
+    def test_compact_and_delete(self):
+        """
+        Ensures that compaction folds the log into the snapshot and that a deleted habit stays deleted.
+        """
+        storage_saver.save_habits([])
+        storage_saver.append_habit_to_json(Habit("Exercise", "daily"))
+        storage_saver.append_habit_to_json(Habit("Read", "weekly"))
+        storage_saver.user_check_off("Read")
+        storage_saver.compact()
+
+        with open(storage_saver.file_name) as f:
+            self.assertEqual([h["name"] for h in json.load(f)], ["Exercise", "Read"])
+        self.assertEqual(os.path.getsize(storage_saver.event_log_file), 0)
+
+        storage_saver.get_repository().delete("Read")
+        self.assertEqual([h["name"] for h in storage_saver.get_repository().load_all()], ["Exercise"])
+
+    def test_check_off_many_writes_once(self):
+        """
+        Ensures that a batch of check-offs is applied per habit, skips duplicate days, unknown habits and unreadable
+        timestamps, reads timestamps with a time zone as local time, and is written to the event log in one go.
+        """
+        storage_saver.save_habits([])
+        storage_saver.append_habit_to_json(Habit("Exercise", "daily"))
+        storage_saver.append_habit_to_json(Habit("Read", "weekly"))
+        today = datetime.now().replace(microsecond=0)
+        yesterday = today - timedelta(days=1)
+        result = storage_saver.user_check_off_many([
+            ("Exercise", yesterday.isoformat()),
+            ("Exercise", today),
+            ("Exercise", today.isoformat()),
+            ("Read", today),
+            ("Walk", today),
+            ("Exercise", today.astimezone().isoformat()),
+            ("Exercise", "yesterday"),
+        ])
+        self.assertEqual(result, {"checked_off": 3, "already_checked_off": 2, "not_found": ["Walk"], "invalid": 1})
+
+        exercise = storage_saver.get_repository().get("Exercise")
+        self.assertEqual(sorted(exercise["days_list"]), [yesterday.date().isoformat(), today.date().isoformat()])
+        self.assertEqual(exercise["streak"], 2)
+        with open(storage_saver.event_log_file) as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+    def test_cache_hits_and_reload_after_external_change(self):
+        """
+        Ensures that repeated loads come from the cache and that a file changed by someone else is read again.
+        """
+        repository = storage_saver.get_repository()
+        storage_saver.save_habits([])
+        storage_saver.append_habit_to_json(Habit("Exercise", "daily"))
+        before = dict(repository.cache.stats())
+        for _ in range(3):
+            repository.load_all()
+        self.assertEqual(repository.cache.stats()["hits"], before["hits"] + 3)
+        self.assertEqual(repository.cache.stats()["misses"], before["misses"])
+
+        with open(storage_saver.file_name, "w") as f:
+            json.dump([{"name": "Read", "periodicity": "weekly", "time of creation": "2025-07-01T10:00:00",
+                        "streak": 0, "days_list": [], "log_ins": []}], f)
+        os.remove(storage_saver.event_log_file)
+        self.assertEqual([h["name"] for h in repository.load_all()], ["Read"])
+        self.assertEqual(repository.cache.stats()["misses"], before["misses"] + 1)
+
+
+class TestCrashSafety(unittest.TestCase):
+    """
+    Tests the crash-safe writes, the journal and the durability modes, by leaving the files as a crash at different
+    moments would leave them.
+    """
+
+    def setUp(self):
+        """
+        Creates a JSON store with one checked off habit in a temporary folder.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "habits.json")
+        repository = JsonRepository(self.path)
+        repository.replace_all([])
+        repository.add({"name": "Exercise", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00",
+                        "streak": 0, "days_list": [], "log_ins": []})
+        repository.record_check_offs([("Exercise", "2025-07-01T12:00:00", 1)])
+
+    def tearDown(self):
+        """
+        Removes the temporary folder.
+        """
+        durability.set_durability("always")
+        self.temp_dir.cleanup()
+
+    def test_corrupt_snapshot_is_not_overwritten(self):
+        """
+        Ensures that a snapshot cut off in the middle raises an error and is left as it is.
+        """
+        with open(self.path, "w") as f:
+            f.write('[\n  {"name": "Exer')
+        repository = JsonRepository(self.path)
+        with self.assertRaises(StoreCorruptedError):
+            repository.load_all()
+        with self.assertRaises(StoreCorruptedError):
+            repository.compact()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), '[\n  {"name": "Exer')
+
+    def test_append_after_a_cut_off_line(self):
+        """
+        Ensures that an event appended after a half written line is not lost with it.
+        """
+        with open(JsonRepository(self.path).log.path, "a") as f:
+            f.write('{"op":"check_off","name":"Exer')
+        repository = JsonRepository(self.path)
+        repository.record_check_offs([("Exercise", "2025-07-02T12:00:00", 2)])
+        self.assertEqual(JsonRepository(self.path).get("Exercise")["log_ins"],
+                         ["2025-07-01T12:00:00", "2025-07-02T12:00:00"])
+
+    def test_interrupted_compaction_is_finished(self):
+        """
+        Ensures that a compaction stopped before or after the rename of the snapshot is finished by the next program
+        without applying a check-off twice.
+        """
+        repository = JsonRepository(self.path)
+        begin = repository.journal.begin
+
+        def begin_and_stop(entry):
+            begin(entry)
+            raise KeyboardInterrupt
+
+        for day, stop in ((2, mock.patch.object(repository.journal, "begin", begin_and_stop)),
+                          (3, mock.patch.object(repository.log, "clear", side_effect=KeyboardInterrupt))):
+            repository.record_check_offs([("Exercise", f"2025-07-0{day}T12:00:00", 1)])
+            expected = list(repository.get("Exercise")["log_ins"])
+            with stop, self.assertRaises(KeyboardInterrupt):
+                repository.compact()
+            self.assertIsNotNone(repository.journal.pending())
+
+            restarted = JsonRepository(self.path)
+            self.assertEqual(restarted.get("Exercise")["log_ins"], expected)
+            self.assertIsNone(restarted.journal.pending())
+            self.assertEqual(os.path.getsize(restarted.log.path), 0)
+
+    def test_background_compaction_keeps_new_events(self):
+        """
+        Ensures that a background compaction keeps the check-offs written while it built the snapshot, and that one
+        stopped after the rename is finished without applying a check-off twice.
+        """
+        repository = JsonRepository(self.path)
+        merged = repository._merged_records
+
+        def check_off_and_merge(events):
+            JsonRepository(self.path).record_check_offs([("Exercise", "2025-07-02T12:00:00", 2)])
+            # Written by another program while the snapshot is being built.
+            return merged(events)
+
+        with mock.patch.object(repository, "_merged_records", check_off_and_merge):
+            repository.compact(background=True)
+        self.assertEqual(len(list(repository.log.read())), 1)
+        self.assertEqual(JsonRepository(self.path).get("Exercise")["log_ins"],
+                         ["2025-07-01T12:00:00", "2025-07-02T12:00:00"])
+
+        repository.record_check_offs([("Exercise", "2025-07-03T12:00:00", 3)])
+        with mock.patch.object(repository.log, "drop_prefix", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                repository.compact(background=True)
+        restarted = JsonRepository(self.path)
+        self.assertEqual(len(restarted.get("Exercise")["log_ins"]), 3)
+        self.assertIsNone(restarted.journal.pending())
+        self.assertEqual(os.path.getsize(restarted.log.path), 0)
+
+    def test_interrupted_delete_is_finished(self):
+        """
+        Ensures that a delete stopped between the catalog and the store is finished the next time the store is used.
+        """
+        saved_paths = (storage_saver.file_name, storage_saver.event_log_file, storage_saver.catalog_file)
+        storage_saver.file_name = self.path
+        storage_saver.event_log_file = JsonRepository(self.path).log.path
+        storage_saver.catalog_file = os.path.join(self.temp_dir.name, "habit_catalog.json")
+        try:
+            storage_saver.add_habit_to_catalog("Exercise", "daily")
+            with mock.patch.object(storage_saver.get_repository(), "delete", side_effect=KeyboardInterrupt), \
+                    self.assertRaises(KeyboardInterrupt):
+                storage_saver.delete_habit("Exercise")
+            self.assertNotIn("Exercise", storage_saver.get_catalog())
+
+            restarted = JsonRepository(self.path)
+            self.assertFalse(restarted.contains("Exercise"))
+            self.assertIsNone(restarted.journal.pending())
+        finally:
+            storage_saver.file_name, storage_saver.event_log_file, storage_saver.catalog_file = saved_paths
+
+    def test_durability_modes(self):
+        """
+        Ensures that every mode stores the events, that the "group" mode flushes them later and that an unknown mode
+        is refused.
+        """
+        repository = JsonRepository(self.path)
+        for day, mode in enumerate(("never", "always", "group"), start=2):
+            durability.set_durability(mode)
+            repository.record_check_offs([("Exercise", f"2025-07-0{day}T12:00:00", day)])
+        self.assertIn(repository.log.path, durability._pending)
+        durability.flush_pending()
+        self.assertEqual(durability._pending, set())
+        self.assertEqual(len(JsonRepository(self.path).get("Exercise")["log_ins"]), 4)
+        with self.assertRaises(ValueError):
+            durability.set_durability("sometimes")
+
+
+class TestRangeQueries(unittest.TestCase):
+    """
+    Tests the date window analytics against a temporary store.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_paths = (storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file)
+        storage_saver.catalog_file = os.path.join(self.temp_dir.name, "habit_catalog.json")
+        storage_saver.file_name = os.path.join(self.temp_dir.name, "habits.json")
+        storage_saver.event_log_file = os.path.join(self.temp_dir.name, "habits.events.jsonl")
+        storage_saver.add_habit_to_catalog("Exercise", "daily")
+        storage_saver.add_habit_to_catalog("Plan", "weekly")
+        storage_saver.save_habits([
+            {"name": "Exercise", "periodicity": "daily", "time of creation": "2025-06-01T08:00:00", "streak": 0,
+             "days_list": ["2025-07-31", "2025-07-03", "2025-07-02", "2025-07-01", "2025-06-30"],
+             "log_ins": ["2025-06-30T08:00:00", "2025-07-01T08:00:00", "2025-07-02T08:00:00", "2025-07-03T08:00:00",
+                         "2025-07-31T08:00:00"]},
+            {"name": "Plan", "periodicity": "weekly", "time of creation": "2025-06-01T08:00:00", "streak": 0,
+             "days_list": ["2025-07-01", "2025-07-08"], "log_ins": ["2025-07-01T09:00:00", "2025-07-08T09:00:00"]}])
+
+    def tearDown(self):
+        storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file = self.saved_paths
+        self.temp_dir.cleanup()
+
+    def test_iso_window_matches_a_linear_filter(self):
+        """
+        Ensures that the binary search slicing finds the same days as filtering the whole list, in both orders.
+        """
+        days = ["2025-07-01", "2025-07-01", "2025-07-03", "2025-07-10", "2025-08-01"]
+        for first, last in (("2025-07-01", "2025-07-03"), ("2025-07-02", "2025-07-09"), ("2025-06-01", "2025-06-30"),
+                            ("2025-07-10", "2025-12-31"), ("2025-08-01", "2025-07-01")):
+            expected = [d for d in days if first <= d <= last]
+            self.assertEqual(iso_window(days, first, last), expected)
+            self.assertEqual(iso_window(days[::-1], first, last), expected)
+
+    def test_window_queries(self):
+        """
+        Ensures the completion rate, the longest streak and the counts per week and month of a window.
+        """
+        self.assertEqual(ranges.completion_rate("Exercise", "2025-07-01", "2025-07-10"), 0.3)
+        self.assertEqual(ranges.completion_rate("Plan", date(2025, 7, 1), date(2025, 7, 20)), 2 / 3)
+        self.assertIsNone(ranges.completion_rate("Walk", "2025-07-01", "2025-07-10"))
+        self.assertEqual(ranges.longest_streak_between("Exercise", "2025-07-02", "2025-07-31"), 2)
+        self.assertEqual(ranges.longest_streak_between("Exercise", "2025-06-01", "2025-07-31"), 4)
+        self.assertEqual(ranges.counts_by_period("Exercise", "2025-06-29", "2025-07-13"),
+                         {"2025-W26": 0, "2025-W27": 4, "2025-W28": 0})
+        self.assertEqual(ranges.counts_by_period("Exercise", "2025-06-15", "2025-08-15", "month"),
+                         {"2025-06": 1, "2025-07": 4, "2025-08": 0})
+        report = ranges.window_report("2025-07-01", "2025-07-07")
+        self.assertEqual([(r["name"], r["check_offs"], r["longest_streak"]) for r in report],
+                         [("Exercise", 3, 3), ("Plan", 1, 1)])
+
+    def test_missed_last_period(self):
+        """
+        Ensures that a daily habit is missed if yesterday has no check-off and a weekly one if last week has none.
+        """
+        self.assertEqual(ranges.missed_last_period(date(2025, 7, 4)), ["Plan"])
+        self.assertEqual(ranges.missed_last_period(date(2025, 7, 14)), ["Exercise"])
+        self.assertEqual(ranges.missed_last_period(date(2025, 6, 2)), ["Exercise", "Plan"])
+
+
+class TestParallelAnalytics(unittest.TestCase):
+    """
+    Tests that the process pool analytics give the same answers as the serial path.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_users_dir = storage_saver.users_dir
+        storage_saver.users_dir = self.temp_dir.name
+
+    def tearDown(self):
+        storage_saver.users_dir = self.saved_users_dir
+        self.temp_dir.cleanup()
+
+    def test_longest_streaks_match_serial(self):
+        """
+        Ensures that chunked, packed habits give the serial longest streaks in the input order.
+        """
+        with open("db/habits.json") as f:
+            habits = json.load(f)
+        habits += [{"name": "empty", "periodicity": "daily", "days_list": []},
+                   {"name": "one", "periodicity": "weekly", "days_list": [date(2025, 7, 1)]}]
+        expected = [_calculate_longest_streak(h) for h in habits]
+        self.assertEqual(parallel.longest_streaks(habits, workers=1), expected)
+        self.assertEqual(parallel.longest_streaks(habits, workers=2, chunk_size=3), expected)
+
+    def test_report_over_users(self):
+        """
+        Ensures that the per-user report gives every user's longest streak, in the order of the users.
+        """
+        start = datetime(2025, 7, 1, 9, 0)
+        for user_id, days in (("alice", 3), ("bob", 5), ("carol", 0)):
+            storage_saver.add_habit_to_catalog("Exercise", "daily", user_id=user_id)
+            storage_saver.load_habits(user_id)
+            storage_saver.user_check_off_many([("Exercise", start + timedelta(days=i)) for i in range(days)],
+                                              user_id=user_id)
+        report = parallel.longest_streak_report(["bob", "alice", "carol"], workers=2)
+        self.assertEqual(list(report.items()), [("bob", ("Exercise", 5)), ("alice", ("Exercise", 3)),
+                                                ("carol", (None, 0))])
+        with self.assertRaises(ValueError):
+            parallel.longest_streak_report(["../x"])
+
+
+class TestJsonStreaming(unittest.TestCase):
+    """
+    Tests the streaming reader and writer of "json_stream.py".
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.habits = [{"name": f"Habit {i}", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00",
+                        "streak": 0, "days_list": ["2025-07-01"], "log_ins": ["2025-07-01T10:00:00"]}
+                       for i in range(20)]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_array_is_read_one_record_at_a_time(self):
+        """
+        Ensures that an indented array is parsed correctly even when it is read in very small chunks, and that the
+        writer keeps the layout of json.dump(indent=2).
+        """
+        path = os.path.join(self.temp_dir.name, "habits.json")
+        json_stream.write_habit_records(path, iter(self.habits))
+        with open(path) as f:
+            self.assertEqual(f.read(), json.dumps(self.habits, indent=2))
+        with open(path) as f:
+            self.assertEqual(list(json_stream.iter_json_array(f, chunk_size=7)), self.habits)
+
+    def test_convert_to_json_lines(self):
+        """
+        Ensures that the converted file has one compact record per line and gives back the same habits.
+        """
+        source = os.path.join(self.temp_dir.name, "habits.json")
+        target = os.path.join(self.temp_dir.name, "habits.jsonl")
+        with open(source, "w") as f:
+            json.dump(self.habits, f, indent=2)
+        self.assertEqual(json_stream.convert_to_json_lines(source, target), 20)
+        with open(target) as f:
+            self.assertEqual(len(f.readlines()), 20)
+        self.assertEqual(list(json_stream.iter_habit_records(target)), self.habits)
+
+    def test_compaction_of_a_json_lines_store(self):
+        """
+        Ensures that compaction streams the snapshot and the event log into a new JSON Lines snapshot.
+        """
+        path = os.path.join(self.temp_dir.name, "habits.jsonl")
+        json_stream.write_habit_records(path, self.habits)
+        repository = JsonRepository(path)
+        repository.record_check_offs([("Habit 3", "2025-07-02T08:00:00", 2)])
+        repository.delete("Habit 5")
+        repository.add({"name": "Habit 5", "periodicity": "weekly", "time of creation": "2025-07-03T10:00:00",
+                        "streak": 0, "days_list": [], "log_ins": []})
+        before = [dict(h) for h in repository.load_all()]
+        repository.compact()
+        after = list(json_stream.iter_habit_records(path))
+        self.assertEqual(after, before)
+        self.assertEqual(after[-1]["name"], "Habit 5")
+        self.assertEqual(after[3]["days_list"], ["2025-07-01", "2025-07-02"])
+
+
+class TestColumnarFormat(unittest.TestCase):
+    """
+    Tests the binary columnar history format against the sample habits.
+    """
+
+    def setUp(self):
+        """
+        Writes the sample habits, plus one with lists that can not be rebuilt from the columns, into a columnar file.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "habits.col")
+        with open(os.path.join(os.path.dirname(__file__), "..", "db", "habits.json")) as f:
+            self.records = json.load(f)
+        self.records.append({"name": "Lesen ä", "periodicity": "weekly", "streak": 0,
+                             "days_list": ["2025-07-08", "2025-07-01", "2025-07-15"],
+                             "log_ins": ["2025-07-01T10:00:00+02:00", "2025-07-08T10:00:00.5"], "note": "kept"})
+        columnar.write_columnar(self.path, self.records)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip_is_exact(self):
+        """
+        Ensures that every record, including the order of its lists and its unknown fields, is read back exactly.
+        """
+        with columnar.ColumnarFile(self.path) as columns:
+            self.assertEqual(list(columns.iter_records()), self.records)
+            self.assertEqual(columns.names(), [r["name"] for r in self.records])
+            self.assertIsNone(columns.get("Missing"))
+
+    def test_columns_of_one_habit(self):
+        """
+        Ensures that the columns of a habit are memoryviews on the mapped file with sorted day numbers, that a window
+        and the longest streaks are the same as from the JSON records (with or without NumPy, which is only imported
+        when a column is used as an array), and that another file is refused.
+        """
+        with columnar.ColumnarFile(self.path) as columns:
+            days = columns.days("coding")
+            self.assertIsInstance(days, memoryview)
+            expected_days = sorted(date.fromisoformat(d).toordinal() for d in self.records[0]["days_list"])
+            self.assertEqual(list(days), expected_days)
+            self.assertEqual(list(columns.days("Lesen ä")), [date(2025, 7, d).toordinal() for d in (1, 8, 15)])
+            self.assertEqual(len(columns.log_in_microseconds("coding")), len(self.records[0]["log_ins"]))
+            self.assertEqual(list(columns.days_between("Lesen ä", date(2025, 7, 2), date(2025, 7, 8))),
+                             [date(2025, 7, 8).toordinal()])
+        expected = {r["name"]: _calculate_longest_streak(r) for r in self.records}
+        self.assertEqual(longest_streaks_columnar(self.path), expected)
+        with mock.patch.object(vectorized, "HAS_NUMPY", False):
+            self.assertEqual(longest_streaks_columnar(self.path), expected)
+        code = "import sys, analytics.analytics; print('numpy' in sys.modules)"
+        imported = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), ".."),
+                                  capture_output=True, text=True)
+        self.assertEqual(imported.stdout.strip(), "False")
+        # The analytics menu and the server do not pay for importing NumPy.
+        self.assertEqual(longest_streaks_columnar(self.path, ["running"]), {"running": expected["running"]})
+        with self.assertRaises(StoreCorruptedError):
+            columnar.ColumnarFile(os.path.join(os.path.dirname(__file__), "..", "db", "habits.json"))
+
+
+class TestSqliteRepository(unittest.TestCase):
+    """
+    Tests the SQLite backend and the migration from "habits.json".
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.temp_dir.name, "habits.json")
+        with open(self.json_path, "w") as f:
+            json.dump([
+                {"name": "Exercise", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00",
+                 "streak": 2, "days_list": ["2025-07-01", "2025-07-02"],
+                 "log_ins": ["2025-07-01T10:00:00", "2025-07-02T09:30:00"]},
+                {"name": "Read", "periodicity": "weekly", "time of creation": "2025-07-01T10:00:00",
+                 "streak": 0, "days_list": ["2025-06-20"], "log_ins": []}
+            ], f)
+        self.db_path = os.path.join(self.temp_dir.name, "habits.sqlite3")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_migration_keeps_the_history(self):
+        """
+        Ensures that the migrated database gives back the same habits as the JSON file, and that it answers the
+        habits by periodicity itself.
+        """
+        self.assertEqual(migrate_json_to_sqlite(self.json_path, self.db_path), 2)
+        repository = SqliteRepository(self.db_path)
+        try:
+            exercise = repository.get("Exercise")
+            self.assertEqual(exercise["days_list"], ["2025-07-02", "2025-07-01"])
+            self.assertEqual(exercise["log_ins"], ["2025-07-01T10:00:00", "2025-07-02T09:30:00"])
+            self.assertEqual(repository.get("Read")["days_list"], ["2025-06-20"])
+            self.assertEqual(repository.names_by_periodicity("weekly"), ["Read"])
+
+            catalog = HabitCatalog(os.path.join(self.temp_dir.name, "habit_catalog.json"))
+            for name, periodicity in (("Exercise", "daily"), ("Read", "weekly"), ("Walk", "weekly")):
+                catalog.add(name, periodicity)
+            storage_saver.set_repository(repository)
+            try:
+                with mock.patch.object(storage_saver, "get_catalog", return_value=catalog), \
+                        mock.patch.object(storage_saver, "get_summary_index") as get_summary_index:
+                    self.assertEqual(storage_saver.habit_names_by_periodicity("weekly"), ["Read", "Walk"])
+                get_summary_index.assert_not_called()
+                # The database's own index answers, the summary index is not needed.
+            finally:
+                storage_saver.set_repository(None)
+        finally:
+            repository.close()
+
+    def test_check_off_and_delete(self):
+        """
+        Ensures that check-offs and deletions are stored in the database.
+        """
+        migrate_json_to_sqlite(self.json_path, self.db_path)
+        repository = SqliteRepository(self.db_path)
+        try:
+            repository.record_check_offs([("Exercise", "2025-07-03T08:00:00", 3)])
+            exercise = repository.get("Exercise")
+            self.assertEqual(exercise["days_list"][0], "2025-07-03")
+            self.assertEqual(exercise["streak"], 3)
+            repository.delete("Exercise")
+            self.assertFalse(repository.contains("Exercise"))
+            self.assertEqual([h["name"] for h in repository.load_all()], ["Read"])
+        finally:
+            repository.close()
+
+
+class TestHabitCatalog(unittest.TestCase):
+    """
+    Tests the data-driven habit catalog.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_paths = (storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file)
+        storage_saver.catalog_file = os.path.join(self.temp_dir.name, "habit_catalog.json")
+        storage_saver.file_name = os.path.join(self.temp_dir.name, "habits.json")
+        storage_saver.event_log_file = os.path.join(self.temp_dir.name, "habits.events.jsonl")
+
+    def tearDown(self):
+        storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file = self.saved_paths
+        self.temp_dir.cleanup()
+
+    def test_new_habit_is_seen_in_the_same_session(self):
+        """
+        Ensures that a habit added to the catalog is listed right away, is seen by another program and is saved to
+        the catalog file by the compaction.
+        """
+        storage_saver.add_habit_to_catalog("Exercise", "daily")
+        storage_saver.add_habit_to_catalog("Read", "weekly")
+        storage_saver.add_habit_to_catalog("Walk", "daily")
+        storage_saver.get_catalog().remove("Walk")
+        self.assertEqual([h["name"] for h in storage_saver.load_habits()], ["Exercise", "Read"])
+        self.assertEqual(storage_saver.habit_names_by_periodicity("weekly"), ["Read"])
+        self.assertEqual(HabitCatalog(storage_saver.catalog_file).items(), [("Exercise", "daily"), ("Read", "weekly")])
+
+        storage_saver.get_catalog().compact()
+        self.assertEqual(len(storage_saver.get_catalog().log), 0)
+        with open(storage_saver.catalog_file) as f:
+            self.assertEqual(json.load(f), [{"name": "Exercise", "periodicity": "daily"},
+                                            {"name": "Read", "periodicity": "weekly"}])
+
+    def test_delete_removes_from_catalog(self):
+        """
+        Ensures that a deleted habit disappears from the catalog and the storage.
+        """
+        storage_saver.add_habit_to_catalog("Exercise", "daily")
+        storage_saver.load_habits()
+        delete_habit("Exercise")
+        self.assertNotIn("Exercise", storage_saver.get_catalog())
+        self.assertEqual(storage_saver.load_habits(), [])
+        self.assertFalse(storage_saver.get_repository().contains("Exercise"))
+
+
+    def test_periodicity_is_stored_in_normal_form(self):
+        """
+        Ensures that a periodicity typed in another form is stored in its normal form and found by it.
+        """
+        storage_saver.add_habit_to_catalog("Gym", "Wednesday, Mon")
+        storage_saver.append_habit_to_json(Habit("Gym", "Wednesday, Mon"))
+        self.assertEqual(storage_saver.get_catalog().periodicity("Gym"), "mon,wed")
+        self.assertEqual(storage_saver.get_repository().get("Gym")["periodicity"], "mon,wed")
+        self.assertEqual(storage_saver.habit_names_by_periodicity("mon, wed"), ["Gym"])
+
+
+class TestSummaryIndex(unittest.TestCase):
+    """
+    Tests the summary index that answers the analytics questions, against a temporary store.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_paths = (storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file)
+        storage_saver.catalog_file = os.path.join(self.temp_dir.name, "habit_catalog.json")
+        storage_saver.file_name = os.path.join(self.temp_dir.name, "habits.json")
+        storage_saver.event_log_file = os.path.join(self.temp_dir.name, "habits.events.jsonl")
+
+    def tearDown(self):
+        storage_saver.catalog_file, storage_saver.file_name, storage_saver.event_log_file = self.saved_paths
+        self.temp_dir.cleanup()
+
+    def test_summaries_match_full_recomputation(self):
+        """
+        Ensures that the summaries give the same longest and current streaks as the analytics loop and the Habit
+        class, for daily and weekly histories with gaps.
+        """
+        today = date.today().toordinal()
+        for periodicity in ("daily", "weekly"):
+            for offsets in ([], [0], [0, 1, 2, 5, 6], [3, 4, 10, 11, 12, 13], [0, 7, 14, 30], [1, 8, 9, 40]):
+                days = [date.fromordinal(today - o) for o in sorted(offsets, reverse=True)]
+                record = {"name": "h", "periodicity": periodicity, "time of creation": "2025-07-01T10:00:00",
+                          "streak": 0, "days_list": [d.isoformat() for d in days],
+                          "log_ins": [datetime.combine(d, datetime.min.time()).isoformat() for d in days]}
+                summary = summary_index.summarize(record)
+                self.assertEqual(summary["longest_streak"], _calculate_longest_streak(record))
+                self.assertEqual(summary_index.current_streak(summary), Habit.from_dict(record).streaks())
+                self.assertEqual(summary["count"], len(days))
+
+    def test_analytics_come_from_the_index(self):
+        """
+        Ensures that check-offs and deletes update the index, that the analytics answers do not read the stored
+        habits, and that a store changed behind the index's back is summarized again.
+        """
+        storage_saver.add_habit_to_catalog("Exercise", "daily")
+        storage_saver.add_habit_to_catalog("Read", "weekly")
+        storage_saver.load_habits()
+        today = datetime.now().replace(microsecond=0)
+        storage_saver.user_check_off_many([("Exercise", today - timedelta(days=2)),
+                                           ("Exercise", today - timedelta(days=1)),
+                                           ("Exercise", today), ("Read", today)])
+
+        repository = storage_saver.get_repository()
+        index = storage_saver.get_summary_index()
+        index.summaries()
+        original_load_all = repository.load_all
+        repository.load_all = None
+        # Any full scan of the store would now fail.
+        try:
+            self.assertEqual(longest_streak_all(), ("Exercise", 3))
+            self.assertEqual(longest_streak_habit("Read"), 1)
+            self.assertEqual(storage_saver.habit_names_by_periodicity("weekly"), ["Read"])
+            delete_habit("Read")
+            self.assertEqual(storage_saver.habit_names_by_periodicity("weekly"), [])
+        finally:
+            repository.load_all = original_load_all
+
+        summary = storage_saver.habit_summary("Exercise")
+        self.assertEqual((summary["count"], summary["last"]), (3, today.date().isoformat()))
+
+        older = (today - timedelta(days=3)).isoformat()
+        JsonRepository(storage_saver.file_name).record_check_offs([("Exercise", older, 1)])
+        self.assertEqual(longest_streak_habit("Exercise"), 4)
+
+
+class TestStreakMemo(unittest.TestCase):
+    """
+    Tests the memo of the current and longest streaks.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_users_dir = storage_saver.users_dir
+        storage_saver.users_dir = self.temp_dir.name
+
+    def tearDown(self):
+        storage_saver.users_dir = self.saved_users_dir
+        self.temp_dir.cleanup()
+
+    def test_repeated_calls_are_remembered_until_a_check_off(self):
+        """
+        Ensures that asking again gives the remembered streaks, and that a check-off and a delete are never hidden by
+        the memo.
+        """
+        storage_saver.add_habit_to_catalog("Exercise", "daily", user_id="alice")
+        storage_saver.load_habits("alice")
+        before = dict(streak_memo.stats())
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 0)
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 0)
+        self.assertEqual(streak_memo.stats()["hits"], before["hits"] + 1)
+
+        storage_saver.user_check_off_many([("Exercise", datetime.now() - timedelta(days=1))], user_id="alice")
+        storage_saver.user_check_off("Exercise", user_id="alice")
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 2)
+        habit = storage_saver.find_habit("Exercise", user_id="alice")
+        self.assertEqual(_calculate_longest_streak(habit, "alice"), 2)
+        self.assertEqual(_calculate_longest_streak(habit, "alice"), 2)
+        with mock.patch.object(streak_memo, "longest_streak", return_value=2) as longest_streak:
+            _calculate_longest_streak(habit, "alice")
+        self.assertEqual(longest_streak.call_args[0][0][:2], ("alice", "Exercise"))
+        storage_saver.delete_habit("Exercise", user_id="alice")
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 0)
+
+    def test_expiry_and_bound(self):
+        """
+        Ensures that a current streak expires with the day (or the week for weekly habits) and that only the most
+        recently used habits are kept.
+        """
+        memo = StreakMemo(max_habits=2)
+        habit = {"name": "Read", "periodicity": "weekly", "days_list": ["2025-07-01"], "log_ins": []}
+        calls = []
+
+        def calculate():
+            calls.append(1)
+            return len(calls)
+
+        tuesday = date(2025, 7, 1).toordinal()
+        self.assertEqual(memo.current_streak(("u", "Read"), habit, calculate, tuesday), 1)
+        self.assertEqual(memo.current_streak(("u", "Read"), habit, calculate, tuesday + 5), 1)
+        self.assertEqual(memo.current_streak(("u", "Read"), habit, calculate, tuesday + 6), 2)
+        memo.current_streak(("u", "A"), habit, calculate, tuesday)
+        memo.current_streak(("u", "B"), habit, calculate, tuesday)
+        self.assertEqual(memo.stats()["habits"], 2)
+        self.assertEqual(memo.current_streak(("u", "Read"), habit, calculate, tuesday + 6), 5)
+
+
+class TestUserShards(unittest.TestCase):
+    """
+    Tests the per-user shards and their locks.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_users_dir = storage_saver.users_dir
+        storage_saver.users_dir = self.temp_dir.name
+
+    def tearDown(self):
+        storage_saver.users_dir = self.saved_users_dir
+        self.temp_dir.cleanup()
+
+    def test_users_are_isolated(self):
+        """
+        Ensures that every user has their own catalog and habits, and that a user id can not leave the users folder.
+        """
+        storage_saver.add_habit_to_catalog("Exercise", "daily", user_id="alice")
+        storage_saver.add_habit_to_catalog("Read", "weekly", user_id="bob")
+        storage_saver.append_habit_to_json(Habit("Exercise", "daily"), user_id="alice")
+        storage_saver.user_check_off("Exercise", user_id="alice")
+
+        self.assertEqual([h["name"] for h in storage_saver.load_habits("alice")], ["Exercise"])
+        self.assertEqual([h["name"] for h in storage_saver.load_habits("bob")], ["Read"])
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 1)
+        self.assertIsNone(storage_saver.find_habit("Exercise", user_id="bob"))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "alice", "habit_catalog.events.jsonl")))
+        for bad_id in ("..", "../alice", "a/b", ""):
+            with self.assertRaises(ValueError):
+                storage_saver.get_repository(bad_id)
+
+    def test_reads_do_not_create_a_user(self):
+        """
+        Ensures that reading the habits of a user who was never written to gives an empty answer and leaves no folder
+        behind, and that the first write creates it.
+        """
+        self.assertEqual(storage_saver.load_habits("nobody"), [])
+        self.assertIsNone(storage_saver.find_habit("Exercise", "nobody"))
+        self.assertIsNone(storage_saver.habit_summary("Exercise", "nobody"))
+        self.assertEqual(storage_saver.habit_summaries("nobody"), [])
+        self.assertEqual(storage_saver.habit_names_by_periodicity("daily", "nobody"), [])
+        self.assertEqual(storage_saver.user_streaks("Exercise", user_id="nobody"), 0)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+        storage_saver.add_habit_to_catalog("Exercise", "daily", user_id="nobody")
+        self.assertEqual(os.listdir(self.temp_dir.name), ["nobody"])
+
+    def test_concurrent_check_offs_are_not_lost(self):
+        """
+        Ensures that check-offs from many threads, on two repository objects of the same shard (like two programs)
+        and with frequent compactions, all end up in the store.
+        """
+        path = os.path.join(self.temp_dir.name, "habits.json")
+        repositories = [JsonRepository(path, compact_after=5), JsonRepository(path, compact_after=5)]
+        repositories[0].replace_all([])
+        repositories[0].add({"name": "Exercise", "periodicity": "daily", "time of creation": "2025-07-01T10:00:00",
+                             "streak": 0, "days_list": [], "log_ins": []})
+        start = datetime(2025, 7, 1, 8, 0)
+
+        def check_off(worker):
+            repository = repositories[worker % 2]
+            for i in range(25):
+                day = start + timedelta(days=worker * 25 + i)
+                repository.record_check_offs([("Exercise", day.isoformat(), 1)])
+
+        threads = [threading.Thread(target=check_off, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(JsonRepository(path).get("Exercise")["log_ins"]), 100)
+
+    def test_background_compaction_with_concurrent_churn(self):
+        """
+        Ensures that habits added, checked off and deleted from many threads, with the logs compacted in the
+        background, leave the catalog, the store and the summary index in step.
+        """
+        saved_limit = storage_saver.COMPACT_AFTER_EVENTS
+        storage_saver.COMPACT_AFTER_EVENTS = 7
+        compaction.set_background(True)
+        try:
+            storage_saver.add_habit_to_catalog("Exercise", "daily", user_id="alice")
+            storage_saver.load_habits("alice")
+
+            def churn(worker):
+                for i in range(10):
+                    name = f"habit {worker} {i}"
+                    storage_saver.add_habit_to_catalog(name, "weekly", user_id="alice")
+                    storage_saver.append_habit_to_json(Habit(name, "weekly"), user_id="alice")
+                    storage_saver.user_check_off(name, user_id="alice")
+                    if i % 2:
+                        delete_habit(name, user_id="alice")
+
+            threads = [threading.Thread(target=churn, args=(w,)) for w in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            storage_saver.flush()
+            compaction.wait()
+        finally:
+            compaction.set_background(False)
+            storage_saver.COMPACT_AFTER_EVENTS = saved_limit
+
+        expected = sorted(["Exercise"] + [f"habit {w} {i}" for w in range(4) for i in range(0, 10, 2)])
+        folder = os.path.join(self.temp_dir.name, "alice")
+        self.assertEqual(sorted(HabitCatalog(os.path.join(folder, "habit_catalog.json")).names()), expected)
+        repository = JsonRepository(os.path.join(folder, "habits.json"))
+        self.assertEqual(sorted(h["name"] for h in repository.load_all()), expected)
+        self.assertLess(len(repository.log), 7)
+        fresh_index = summary_index.SummaryIndex(None, repository)
+        self.assertEqual(storage_saver.get_summary_index("alice").summaries(), fresh_index.summaries())
+
+    def _check_off_in_another_program(self, name):
+        # Checks off one of alice's habits from a separate process, like a second program using the same store.
+        env = dict(os.environ, HABIT_TRACKER_USERS_DIR=self.temp_dir.name)
+        subprocess.run([sys.executable, "main.py", "--user", "alice", "check-off", name], env=env,
+                       cwd=os.path.join(os.path.dirname(__file__), ".."), capture_output=True, check=True)
+
+    def _saved_counts(self):
+        # The check-off counts of the summary index file, as the next program reads them.
+        folder = os.path.join(self.temp_dir.name, "alice")
+        index = summary_index.SummaryIndex(os.path.join(folder, "habits.summary.json"),
+                                           JsonRepository(os.path.join(folder, "habits.json")))
+        return {name: summary["count"] for name, summary in index.summaries().items()}
+
+    def test_write_behind_keeps_check_offs_of_other_programs(self):
+        """
+        Ensures that flushing deferred check-offs does not save the index over a check-off that another program
+        stored in the meantime.
+        """
+        for name in ("Exercise", "Read", "Walk"):
+            storage_saver.add_habit_to_catalog(name, "daily", user_id="alice")
+        storage_saver.load_habits("alice")
+        storage_saver.set_write_behind(True)
+        try:
+            storage_saver.user_check_off("Exercise", user_id="alice")
+            self._check_off_in_another_program("Read")
+            storage_saver.user_check_off("Walk", user_id="alice")
+        finally:
+            storage_saver.set_write_behind(False)
+        self.assertEqual(self._saved_counts(), {"Exercise": 1, "Read": 1, "Walk": 1})
+
+    def test_deferred_adds_keep_check_offs_of_other_programs(self):
+        """
+        Ensures that the index saved after habits were added and deleted (which defer the save) still has a check-off
+        that another program stored before the save.
+        """
+        for name in ("Exercise", "Read"):
+            storage_saver.add_habit_to_catalog(name, "daily", user_id="alice")
+        storage_saver.load_habits("alice")
+        storage_saver.flush()
+        storage_saver.add_habit_to_catalog("Walk", "daily", user_id="alice")
+        storage_saver.append_habit_to_json(Habit("Walk", "daily"), user_id="alice")
+        delete_habit("Exercise", user_id="alice")
+        self.assertTrue(storage_saver.get_summary_index("alice").dirty)
+        self._check_off_in_another_program("Read")
+        storage_saver.flush()
+        self.assertEqual(self._saved_counts(), {"Read": 1, "Walk": 0})
+
+    def test_write_behind_defers_and_flushes(self):
+        """
+        Ensures that deferred check-offs are seen by this program at once, reach the files only with the flush (or
+        when enough of them are waiting), and leave the summary index in step with the store.
+        """
+        for name in ("Exercise", "Read", "Walk"):
+            storage_saver.add_habit_to_catalog(name, "daily", user_id="alice")
+        storage_saver.load_habits("alice")
+        path = storage_saver.get_repository("alice").path
+        saved_limit = storage_saver.FLUSH_AFTER_EVENTS
+        storage_saver.FLUSH_AFTER_EVENTS = 3
+        storage_saver.set_write_behind(True)
+        try:
+            storage_saver.user_check_off("Exercise", user_id="alice")
+            storage_saver.user_check_off_many([("Read", None)], user_id="alice")
+            self.assertEqual(storage_saver.user_streaks("Exercise", user_id="alice"), 1)
+            self.assertEqual(storage_saver.habit_summary("Read", user_id="alice")["count"], 1)
+            self.assertEqual(JsonRepository(path).get("Exercise")["log_ins"], [])
+
+            storage_saver.user_check_off("Walk", user_id="alice")
+            # The third deferred check-off reaches the limit and all three are written.
+            self.assertEqual([len(h["log_ins"]) for h in JsonRepository(path).load_all()], [1, 1, 1])
+            storage_saver.user_check_off_many([("Exercise", datetime.now() - timedelta(days=1))], user_id="alice")
+            self.assertEqual(storage_saver.flush(), 1)
+            self.assertEqual(storage_saver.flush(), 0)
+        finally:
+            storage_saver.set_write_behind(False)
+            storage_saver.FLUSH_AFTER_EVENTS = saved_limit
+
+        self.assertEqual(len(JsonRepository(path).get("Exercise")["log_ins"]), 2)
+        fresh_index = summary_index.SummaryIndex(None, JsonRepository(path))
+        self.assertEqual(storage_saver.get_summary_index("alice").summaries(), fresh_index.summaries())
+
+
+class TestHttpServer(unittest.TestCase):
+    """
+    Tests the HTTP server on a free local port, with a temporary user store.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_users_dir = storage_saver.users_dir
+        storage_saver.users_dir = self.temp_dir.name
+
+    def tearDown(self):
+        storage_saver.users_dir = self.saved_users_dir
+        self.temp_dir.cleanup()
+
+    def test_endpoints_and_coalesced_check_offs(self):
+        """
+        Ensures that a habit can be added, checked off by many clients at once with fewer writes than requests, and
+        asked about (the streak under the user's own key), and that unknown habits give 404 and an invalid
+        Content-Length gives 400.
+        """
+        async def scenario():
+            server = await HabitServer(workers=2, batch_delay=0.01).start("127.0.0.1", 0)
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                for name in ("Exercise", "Read"):
+                    status, _ = await load_client.request(reader, writer, "POST", "/habits?user=alice",
+                                                          {"name": name, "periodicity": "daily"})
+                    self.assertEqual(status, 201)
+                status, body = await load_client.request(reader, writer, "POST", "/habits?user=alice", {"name": "x"})
+                self.assertEqual(status, 400)
+
+                result = await load_client.run_load("127.0.0.1", server.port, ["Exercise", "Read"], connections=10,
+                                                    requests=4, user_id="alice")
+                self.assertEqual(result["statuses"], {200: 40})
+                self.assertEqual(server.batcher.check_offs, 20)
+                self.assertLess(server.batcher.batches, 20)
+
+                answers = [await load_client.request(reader, writer, "GET", path) for path in (
+                    "/habits/Exercise/streak?user=alice",
+                    "/habits?periodicity=daily&user=alice",
+                    "/analytics/longest-streak/Read?user=alice",
+                    "/habits/Walk/streak?user=alice",
+                    "/habits/Walk/check-off?user=alice")]
+                writer.close()
+                for length in ("abc", "-5"):
+                    raw_reader, raw_writer = await asyncio.open_connection("127.0.0.1", server.port)
+                    raw_writer.write(f"POST /habits HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                    self.assertIn(b" 400 ", await raw_reader.readline())
+                    raw_writer.close()
+                return answers
+            finally:
+                await server.close()
+
+        streak, daily, longest, missing, wrong_method = asyncio.run(scenario())
+        self.assertEqual(streak, (200, {"name": "Exercise", "streak": 1}))
+        self.assertEqual(daily[1]["habits"], ["Exercise", "Read"])
+        self.assertEqual(longest[0], 200)
+        self.assertEqual(missing[0], 404)
+        self.assertEqual(wrong_method[0], 405)
+        self.assertEqual(len(storage_saver.find_habit("Exercise", "alice")["log_ins"]), 1)
+        with mock.patch.object(storage_saver.streak_memo, "current_streak", return_value=1) as current_streak:
+            HabitServer._streak("Exercise", "alice")
+        self.assertEqual(current_streak.call_args[0][0], ("alice", "Exercise"))
+        # The streak is remembered under the user's own key, not under the single-user store's.
+
+
+    def test_reads_of_an_unknown_user_create_nothing(self):
+        """
+        Ensures that the GET endpoints answer for a user who does not exist without creating a folder for them, and
+        without printing anything.
+        """
+        async def scenario():
+            server = await HabitServer(workers=2).start("127.0.0.1", 0)
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                answers = [await load_client.request(reader, writer, "GET", path) for path in (
+                    "/habits?periodicity=daily&user=anyone",
+                    "/habits/Exercise/streak?user=anyone",
+                    "/analytics/longest-streak?user=anyone",
+                    "/analytics/longest-streak/Exercise?user=anyone")]
+                writer.close()
+                return answers
+            finally:
+                await server.close()
+
+        with mock.patch("sys.stdout") as stdout:
+            daily, streak, longest_all, longest = asyncio.run(scenario())
+        stdout.write.assert_not_called()
+        # The analytics behind the endpoints do not print on the server.
+        self.assertEqual(daily, (200, {"periodicity": "daily", "habits": []}))
+        self.assertEqual(streak[0], 404)
+        self.assertEqual(longest_all, (200, {"name": None, "longest_streak": 0}))
+        self.assertEqual(longest[0], 404)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+    def test_oversized_headers_are_answered(self):
+        """
+        Ensures that a header line longer than the stream's limit, too many headers or a request line that is too long
+        get an answer (431 or 400) instead of a dropped connection.
+        """
+        async def send(head):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(head)
+            status_line = await reader.readline()
+            writer.close()
+            return status_line
+
+        async def scenario():
+            nonlocal server
+            server = await HabitServer(workers=1).start("127.0.0.1", 0)
+            try:
+                return [await send(head) for head in (
+                    b"GET /habits?periodicity=daily HTTP/1.1\r\nX-Long: " + b"a" * (70 * 1024) + b"\r\n\r\n",
+                    b"GET /habits?periodicity=daily HTTP/1.1\r\n" + b"X-Many: 1\r\n" * 200 + b"\r\n",
+                    b"GET /" + b"a" * (70 * 1024) + b" HTTP/1.1\r\n\r\n")]
+            finally:
+                await server.close()
+
+        server = None
+        long_line, many, long_request_line = asyncio.run(scenario())
+        self.assertIn(b" 431 ", long_line)
+        self.assertIn(b" 431 ", many)
+        self.assertIn(b" 400 ", long_request_line)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    A quick run of the benchmark harness on a tiny store, to make sure it keeps working.
+    """
+
+    def test_benchmarks_run_and_compare(self):
+        """
+        Ensures that every hot path is measured, that the real storage paths are restored and that a much slower run
+        is reported as a regression.
+        """
+        paths = (storage_saver.file_name, storage_saver.catalog_file)
+        results = hot_paths.run_benchmarks(habit_count=3, history=15, repeat=3)
+        self.assertEqual((storage_saver.file_name, storage_saver.catalog_file), paths)
+        for name in ("load_habits (cold)", "user_check_off", "user_streaks", "Habit.streaks", "longest_streak_all",
+                     "delete_habit"):
+            self.assertEqual(results[name]["calls"], 3)
+            self.assertGreaterEqual(results[name]["p99_ms"], results[name]["p50_ms"])
+        slower = {name: dict(r, p50_ms=r["p50_ms"] * 2) for name, r in results.items()}
+        self.assertEqual(hot_paths.compare(results, results, 1.25), [])
+        self.assertEqual(len(hot_paths.compare(slower, results, 1.25)), len(results))
+
+    def test_check_off_launch_imports_little(self):
+        """
+        Ensures that the command line check-off is parsed without argparse, that a missing import file or an invalid
+        user gives an exit code instead of a traceback, and that a launch does not import the menu, the analytics or
+        the SQLite backend.
+        """
+        self.assertEqual(main.parse_check_off(["check-off", "coding", "reading"]), (None, ["coding", "reading"]))
+        self.assertEqual(main.parse_check_off(["--user", "alice", "check-off", "coding"]), ("alice", ["coding"]))
+        self.assertEqual(main.parse_check_off(["--user=alice", "check-off", "coding"]), ("alice", ["coding"]))
+        self.assertIsNone(main.parse_check_off(["check-off", "--file", "a.csv"]))
+        self.assertIsNone(main.parse_check_off(["--help"]))
+        with mock.patch("sys.stderr"):
+            self.assertEqual(main.cli(["import", os.path.join(tempfile.gettempdir(), "no such file.csv")]), 2)
+            for user in ("../x", "a b"):
+                self.assertEqual(main.cli(["--user", user, "check-off", "coding"]), 2)
+                self.assertEqual(main.cli(["--user", user, "import", "-"]), 2)
+        result = startup.run_startup(runs=1)
+        self.assertIn("db.storage_saver", result["modules"])
+        for module in ("argparse", "sqlite3", "analytics.analytics", "csv"):
+            self.assertNotIn(module, result["modules"])
+        self.assertGreater(result["check_off_p50_ms"], 0)
+
+    def test_instrumentation_summary(self):
+        """
+        Ensures that the instrumentation leaves the functions as they are when it is off, and that a profiled
+        check-off records its calls, bytes and hydrated objects in the summary written at exit.
+        """
+        self.assertFalse(instrumentation.enabled)
+        self.assertFalse(hasattr(storage_saver.load_habits, "__wrapped__"))
+        with tempfile.TemporaryDirectory() as folder:
+            saved_users_dir = storage_saver.users_dir
+            storage_saver.users_dir = folder
+            try:
+                storage_saver.add_habit_to_catalog("Exercise", "daily", user_id="alice")
+                storage_saver.load_habits("alice")
+            finally:
+                storage_saver.users_dir = saved_users_dir
+            output = os.path.join(folder, "profile.txt")
+            env = dict(os.environ, HABIT_TRACKER_USERS_DIR=folder, HABIT_TRACKER_PROFILE="summary",
+                       HABIT_TRACKER_PROFILE_OUTPUT=output)
+            subprocess.run([sys.executable, "main.py", "--user", "alice", "check-off", "Exercise"], env=env,
+                           cwd=os.path.join(os.path.dirname(__file__), ".."), capture_output=True, check=True)
+            with open(output) as f:
+                rows = {line.split()[0]: line.split()[1:] for line in f.readlines()[1:]}
+        calls, _, _, read, written, hydrated = rows["db.storage_saver.user_check_off_many"]
+        self.assertEqual(calls, "1")
+        self.assertGreater(int(read), 0)
+        self.assertGreater(int(written), 0)
+        self.assertGreater(int(hydrated), 0)
+        self.assertIn("models.habit.Habit.streaks", rows)
+
 
 if __name__ == "__main__":
     unittest.main()